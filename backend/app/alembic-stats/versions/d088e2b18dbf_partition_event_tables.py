@@ -0,0 +1,114 @@
+"""Partition the activity and read event tables by month
+
+Revision ID: d088e2b18dbf
+Revises: 5394c1f09714
+Create Date: 2026-10-18 10:12:41.218305
+
+"""
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d088e2b18dbf"
+down_revision = "5394c1f09714"
+branch_labels = None
+depends_on = None
+
+# events from before this go to the default partition, rather than creating partitions for bogus client times
+FIRST_MONTH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+MONTHS_AHEAD = 2
+
+
+def columns(table: str) -> list[sa.Column]:
+    if table == "useractivity":
+        return [
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("activity_type", sa.SmallInteger(), nullable=False),
+            sa.Column("activity_start", sa.BigInteger(), nullable=False),
+            sa.Column("activity_end", sa.BigInteger(), nullable=False),
+            sa.Column("data", sa.String(length=2000), nullable=True),
+        ]
+    return [
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("content_id", sa.String(length=36), nullable=True),
+        sa.Column("href", sa.String(length=500), nullable=True),
+        sa.Column("model_id", sa.BigInteger(), nullable=False),
+        sa.Column("read_at", sa.Float(), nullable=False),
+        sa.Column("word_count", sa.Integer(), nullable=True),
+    ]
+
+
+# table name -> (partition column, units of the column per second, primary key)
+TABLES = {
+    "useractivity": ("activity_start", 1000, ["aid", "activity_start"]),
+    "contentmodelread": ("read_at", 1, ["aid", "user_id", "read_at"]),
+}
+UNPARTITIONED_PRIMARY_KEYS = {
+    "useractivity": ["aid"],
+    "contentmodelread": ["aid", "user_id"],
+}
+
+
+def add_months(month: datetime, nb_months: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + nb_months, 12)
+    return datetime(year, month_index + 1, 1, tzinfo=timezone.utc)
+
+
+def column_names(table: str) -> list[str]:
+    return ["aid"] + [c.name for c in columns(table)]
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    now = datetime.now(timezone.utc)
+    for table, (column, scale, primary_key) in TABLES.items():
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        op.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey")
+        # partitioned tables can't have identity columns before pg17, so use a plain sequence
+        op.execute(f"ALTER TABLE {table}_unpartitioned ALTER COLUMN aid DROP IDENTITY")
+        op.execute(f"CREATE SEQUENCE {table}_aid_seq AS integer")
+        op.create_table(
+            table,
+            sa.Column("aid", sa.Integer(), server_default=sa.text(f"nextval('{table}_aid_seq')"), nullable=False),
+            *columns(table),
+            sa.PrimaryKeyConstraint(*primary_key),
+            postgresql_partition_by=f"RANGE ({column})",
+        )
+        op.execute(f"ALTER SEQUENCE {table}_aid_seq OWNED BY {table}.aid")
+        op.create_index(f"ix_{table}_user_id_{column}", table, ["user_id", column])
+
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        oldest = conn.execute(sa.text(f"SELECT min({column}) FROM {table}_unpartitioned")).scalar()
+        month = datetime.fromtimestamp(oldest / scale, timezone.utc) if oldest else now
+        month = max(datetime(month.year, month.month, 1, tzinfo=timezone.utc), FIRST_MONTH)
+        while month <= add_months(now, MONTHS_AHEAD):
+            start, end = int(month.timestamp()) * scale, int(add_months(month, 1).timestamp()) * scale
+            op.execute(f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})")
+            month = add_months(month, 1)
+
+        names = column_names(table)
+        selected = [f"COALESCE({name}, 0)" if name == column else name for name in names]
+        op.execute(f"INSERT INTO {table} ({', '.join(names)}) SELECT {', '.join(selected)} FROM {table}_unpartitioned")
+        op.execute(f"SELECT setval('{table}_aid_seq', COALESCE((SELECT max(aid) FROM {table}), 0) + 1, false)")
+        op.drop_table(f"{table}_unpartitioned")
+
+
+def downgrade() -> None:
+    for table, (_column, _scale, _primary_key) in TABLES.items():
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+        op.create_table(
+            table,
+            sa.Column("aid", sa.Integer(), sa.Identity(always=False), nullable=False),
+            *columns(table),
+            sa.PrimaryKeyConstraint(*UNPARTITIONED_PRIMARY_KEYS[table]),
+        )
+        names = ", ".join(column_names(table))
+        op.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {table}_partitioned")
+        op.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'aid'), "
+            f"COALESCE((SELECT max(aid) FROM {table}), 0) + 1, false)"
+        )
+        op.drop_table(f"{table}_partitioned")
@@ -3,11 +3,9 @@
 from __future__ import annotations
 
 import hashlib
-import json
 import logging
 import mimetypes
 import os
-from email.utils import formatdate
 from typing import Annotated, Any, List
 
 import orjson
@@ -15,7 +13,9 @@ from aiokafka import AIOKafkaProducer
 from app import models, schemas, stats
 from app.api import deps
 from app.core.config import settings
+from app.data.data_files import GZIP_SUFFIX, accepts_gzip, data_files_stale, write_data_files
 from app.data.models import DATA_JS_SUFFIX, DATA_JSON_SUFFIX, ENRICH_JSON_SUFFIX, PARSE_JSON_SUFFIX
+from app.enrich.process_pool import run_in_process
 from app.models.user import SHARED_USER_ID, absolute_resources_path
 from fastapi import APIRouter, Depends, Header
 from fastapi.exceptions import HTTPException
@@ -96,16 +96,18 @@ async def user_events(
                     "target_sentence": e["data"].get("target_sentence"),
                 }
                 other.append(event)
+        # keyed by user, so all the events of a user go to the same partition, and are consumed in order
+        user_key = str(current_user.id).encode()
         if activities:
-            await aioproducer.send_and_wait(stats.ACTIVITY_EVENT_TOPIC_NAME, orjson.dumps(activities))
+            await aioproducer.send_and_wait(stats.ACTIVITY_EVENT_TOPIC_NAME, orjson.dumps(activities), key=user_key)
         if vocab:
-            await aioproducer.send_and_wait(stats.VOCAB_EVENT_TOPIC_NAME, orjson.dumps(vocab))
+            await aioproducer.send_and_wait(stats.VOCAB_EVENT_TOPIC_NAME, orjson.dumps(vocab), key=user_key)
         if card:
-            await aioproducer.send_and_wait(stats.CARD_EVENT_TOPIC_NAME, orjson.dumps(card))
+            await aioproducer.send_and_wait(stats.CARD_EVENT_TOPIC_NAME, orjson.dumps(card), key=user_key)
         if read:
-            await aioproducer.send_and_wait(stats.READ_EVENT_TOPIC_NAME, orjson.dumps(read))
+            await aioproducer.send_and_wait(stats.READ_EVENT_TOPIC_NAME, orjson.dumps(read), key=user_key)
         if other:
-            await aioproducer.send_and_wait(stats.ACTION_EVENT_TOPIC_NAME, orjson.dumps(other))
+            await aioproducer.send_and_wait(stats.ACTION_EVENT_TOPIC_NAME, orjson.dumps(other), key=user_key)
 
     except Exception as ex:  # pylint: disable=W0703  # FIXME:
         logger.exception(ex)
@@ -120,7 +122,13 @@ async def available_languages():
     return JSONResponse(list(settings.LANG_PAIRS.keys()))
 
 
-async def get_content_response(destination, resource_path, user_agent: str):
+async def get_content_response(
+    destination,
+    resource_path,
+    user_agent: str,
+    accept_encoding: str | None = None,
+    if_none_match: str | None = None,
+):
     destination_no_data_suffix = destination.removesuffix(DATA_JS_SUFFIX).removesuffix(DATA_JSON_SUFFIX)
     is_data_file_request = destination.endswith(DATA_JS_SUFFIX) or destination.endswith(DATA_JSON_SUFFIX)
 
@@ -152,43 +160,25 @@ async def get_content_response(destination, resource_path, user_agent: str):
             detail=f"Resource specified is not a file {resource_path=}",
         )
 
-    with open(parse_path, encoding="utf8") as parse_file:
-        combined = json.load(parse_file)
-
-        if os.path.isfile(enrich_path):
-            with open(enrich_path, encoding="utf8") as enrich_file:
-                enrich = json.load(enrich_file)
-                for parse_id, text_parse in combined.items():
-                    for sindex, sentence in enumerate(text_parse["s"]):
-                        if "l1" in enrich[parse_id]["s"][sindex]:
-                            sentence["l1"] = enrich[parse_id]["s"][sindex]["l1"]
-                        for tindex, token in enumerate(sentence["t"]):
-                            for prop, value in enrich[parse_id]["s"][sindex]["t"][tindex].items():
-                                token[prop] = value
-
-        if destination.endswith(DATA_JS_SUFFIX):
-            content = f'var transcrobesModel = {json.dumps(combined, separators=(",", ":"))};'
-            content_length = str(len(content))
-
-            # TODO: decide whether to keep this.
-            # Here we calculate the file stats from file dates, so normal browser caching works
-            # This may be dangerous/annoying but if we want to not cache at all then we'll need
-            # to get rid of these header in the FileResponse above, or they *will* get cached
-            # and this *won't*
-            mtime = os.path.getmtime(destination_no_data_suffix)
-            etag_base = str(mtime) + "-" + content_length
-            etag = hashlib.md5(etag_base.encode()).hexdigest()
-
-            resp = Response(
-                content=content,
-                media_type="text/javascript",
-            )
-            resp.headers.setdefault("content-length", content_length)
-            resp.headers.setdefault("last-modified", formatdate(mtime, usegmt=True))
-            resp.headers.setdefault("etag", etag)
-            return resp
-        else:
-            return JSONResponse(combined)
+    # the merged data files are normally written when the content is enriched, this is for older imports
+    if data_files_stale(destination_no_data_suffix, destination):
+        await run_in_process(write_data_files, destination_no_data_suffix)
+
+    headers = {"vary": "Accept-Encoding"}
+    path = destination
+    if accepts_gzip(accept_encoding):
+        path = f"{destination}{GZIP_SUFFIX}"
+        headers["content-encoding"] = "gzip"
+
+    # the same etag as starlette would use, so that we can also answer conditional requests
+    stat_result = os.stat(path)
+    etag = hashlib.md5(f"{stat_result.st_mtime}-{stat_result.st_size}".encode()).hexdigest()
+    headers["etag"] = f'"{etag}"'
+    if if_none_match and headers["etag"] in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = "text/javascript" if destination.endswith(DATA_JS_SUFFIX) else "application/json"
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
 
 
 @router.get("/sharedcontent/{resource_path:path}", name="serve_shared_content")
@@ -197,9 +187,11 @@ async def serve_shared_content(  # pylint: disable=R0914  # FIXME: consider redu
     # current_user: models.AuthUser = Depends(deps.get_current_good_user),
     current_user: models.AuthUser = Depends(deps.get_current_good_tokenpayload),
     user_agent: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     destination = absolute_resources_path(SHARED_USER_ID, resource_path)
-    return await get_content_response(destination, resource_path, user_agent)
+    return await get_content_response(destination, resource_path, user_agent, accept_encoding, if_none_match)
 
 
 @router.get("/content/{resource_path:path}", name="serve_content")
@@ -208,6 +200,8 @@ async def serve_content(  # pylint: disable=R0914  # FIXME: consider reducing
     # current_user: models.AuthUser = Depends(deps.get_current_good_user),
     current_user: models.AuthUser = Depends(deps.get_current_good_tokenpayload),
     user_agent: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     destination = absolute_resources_path(current_user.id, resource_path)
-    return await get_content_response(destination, resource_path, user_agent)
+    return await get_content_response(destination, resource_path, user_agent, accept_encoding, if_none_match)
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import contextlib
 import datetime
 import json
 import logging
@@ -24,16 +25,23 @@ from app.core.config import settings
 from app.data.context import get_broadcast
 from app.data.importer.common import process
 from app.enrich import TokenPhoneType, enrich_html_fragment, enrich_plain_to_html, latest_db_fragments_dir_path
-from app.enrich.cache import SQLITE_FILENAME, ensure_cached_definitions, regenerate_personal_db
+from app.enrich.cache import (
+    PERSONAL_DB_MANIFEST_FILENAME,
+    SQLITE_FILENAME,
+    ensure_cached_definitions,
+    regenerate_personal_db,
+)
 from app.enrich.data import EnrichmentManager, managers
+from app.enrich.db_chunks import CHUNK_FILENAME_REGEX
 from app.enrich.models import definitions, reload_definitions_cache
+from app.enrich.parse.cache import CachedParseProvider
 from app.fworker import import_process_topic, regenerate, regenerate_dbs
 from app.generative.openai.mcq import get_multiple_choice_qa_chat
 from app.models import CachedDefinition, Import
 from app.models.data import Content, FreeQuestion, Question
 from app.models.lookups import OpenAIApiLookup
 from app.models.user import absolute_imports_dir_path, absolute_imports_path, absolute_resources_path
-from app.ndutils import gather_with_concurrency
+from app.ndutils import as_completed_with_concurrency, gather_with_concurrency
 from app.schemas.cache import DataType, RegenerationType
 from app.schemas.files import ProcessData
 from app.subs import search_db_for_streamdetails
@@ -45,7 +53,7 @@ from pydantic.main import BaseModel
 from sqlalchemy import and_, func
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.sql.expression import select
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, StreamingResponse
 
 logger = logging.getLogger(__name__)
 
@@ -108,6 +116,22 @@ async def api_regenerate_hanzi(_current_user: models.AuthUser = Depends(deps.get
     return {"result": "success"}
 
 
+@router.get("/regenerate_snapshots")
+async def api_regenerate_snapshots(_current_user: models.AuthUser = Depends(deps.get_current_active_superuser)):
+    await regenerate(RegenerationType(data_type=DataType.snapshots))
+    return {"result": "success"}
+
+
+@router.get("/parse_cache_stats")
+async def parse_cache_stats(_current_user: models.AuthUser = Depends(deps.get_current_active_superuser)):
+    # per process, so only for the API process that answers the request
+    return {
+        lang_pair: manager.parser().stats()
+        for lang_pair, manager in managers.items()
+        if isinstance(manager.parser(), CachedParseProvider)
+    }
+
+
 @router.get("/ensure_definitions_cache")
 async def ensure_definitions_cache(db: AsyncSession = Depends(deps.get_db)):
     await load_definitions_cache(db)
@@ -132,14 +156,14 @@ async def db_export_urls(
     dbs_path = latest_db_fragments_dir_path(current_user.lang_pair, current_user.translation_providers)
     base_db_path = os.path.join(dbs_path, f"{SQLITE_FILENAME}")
     await regenerate_personal_db(base_db_path, current_user.id, current_user.lang_pair)
-    find_re = r"tc\.db\.\d{4}\.part"
     dbs_path = absolute_resources_path(current_user.id, SQLITE_FILENAME)
-    files = sorted(
-        [os.path.basename(f.path) for f in os.scandir(dbs_path) if f.is_file() and re.match(find_re, f.name)]
-    )
-
-    if files:
-        return files
+    manifest_path = os.path.join(dbs_path, PERSONAL_DB_MANIFEST_FILENAME)
+    with contextlib.suppress(FileNotFoundError):
+        async with aiofiles.open(manifest_path, encoding="utf8") as manifest_file:
+            files = json.loads(await manifest_file.read())
+        if files:
+            # the parts are named by the hash of their content, so clients only need to download the new ones
+            return files
 
     raise HTTPException(
         status_code=status.HTTP_501_NOT_IMPLEMENTED,
@@ -162,15 +186,21 @@ def db_export_part(
     current_user: schemas.TokenPayload = Depends(deps.get_current_good_tokenpayload),
 ):
     # FIXME: better perms checking for providers
-    destination = absolute_resources_path(current_user.id, SQLITE_FILENAME)
-    abspath = os.path.join(destination, resource_path)
+    if re.fullmatch(CHUNK_FILENAME_REGEX, resource_path):
+        # the parts are shared between users and their content never changes
+        abspath = os.path.join(settings.DB_CHUNKS_DIR, resource_path)
+        headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+    else:
+        destination = absolute_resources_path(current_user.id, SQLITE_FILENAME)
+        abspath = os.path.join(destination, resource_path)
+        headers = None
     if abspath != os.path.normpath(abspath) or not os.path.isfile(abspath):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid request",
         )
     # this fake media_type means it will get brotli compressed, which gives about a 4x compression!
-    return FileResponse(abspath, media_type="application/vnd.ms-fontobject")
+    return FileResponse(abspath, media_type="application/vnd.ms-fontobject", headers=headers)
 
 
 @router.post("/lemma_test", response_model=Any, name="lemma_test")
@@ -328,6 +358,36 @@ async def enrich_json(
     return outdata
 
 
+@router.post("/enrich_json_stream", name="enrich_json_stream")
+async def enrich_json_stream(
+    info_request: InfoRequest,
+    current_user: schemas.TokenPayload = Depends(deps.get_current_good_tokenpayload),
+):
+    """
+    Streaming version of `enrich_json`, as NDJSON. There is a `{"i": <index>, "s": <sentence>}` line for each
+    sentence as soon as it has been enriched, in no particular order, and the last line has the rest of the model
+    """
+    manager = managers.get(current_user.lang_pair)
+    text = info_request.data
+    if not text:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Incorrectly formed query, you must provide a JSON like { "data": "好" }"',
+        )
+
+    return ndjson_response(
+        manager.enricher().enrich_to_json_stream(
+            text,
+            manager,
+            translate_sentence=False,
+            best_guess=False,
+            phone_type=TokenPhoneType.NONE,
+            fill_id=True,
+            available_def_providers=current_user.translation_providers,
+        )
+    )
+
+
 @router.post("/translate", name="translate")
 async def translate(
     info_request: InfoRequest,
@@ -381,7 +441,21 @@ async def enrich_html_to_json(
         )
 
     html, slim_models = await enrich_html_fragment(text, manager)
-    model_futures = [
+    processed_files_list = await gather_with_concurrency(
+        settings.IMPORT_MAX_CONCURRENT_PARSER_QUERIES,
+        *(html_model_futures(slim_models, manager, current_user)),
+    )
+    processed_files_dict = dict(ChainMap(*processed_files_list))  # re-merge dicts from list
+
+    return {
+        "html": html,
+        "models": processed_files_dict,
+        "analysis": await html_analysis(processed_files_dict.values()),
+    }
+
+
+def html_model_futures(slim_models, manager: EnrichmentManager, current_user: schemas.TokenPayload):
+    return [
         manager.enricher().enrich_parse_to_aids_json(
             timestamp,
             model,
@@ -397,19 +471,54 @@ async def enrich_html_to_json(
         for timestamp, model in slim_models.items()
     ]
 
-    processed_files_list = await gather_with_concurrency(
-        settings.IMPORT_MAX_CONCURRENT_PARSER_QUERIES,
-        *(model_futures),
-    )
-    processed_files_dict = dict(ChainMap(*processed_files_list))  # re-merge dicts from list
-    models = processed_files_dict.values()
-    analysis = json.dumps(
+
+async def html_analysis(models) -> str:
+    return json.dumps(
         await process(models, Import.VOCABULARY_ONLY),
         ensure_ascii=False,
         separators=(",", ":"),
     )
 
-    return {"html": html, "models": processed_files_dict, "analysis": analysis}
+
+def ndjson_response(records) -> StreamingResponse:
+    async def lines():
+        async for record in records:
+            yield json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/enrich_html_to_json_stream", name="enrich_html_to_json_stream")
+async def enrich_html_to_json_stream(
+    info_request: InfoRequest,
+    current_user: schemas.TokenPayload = Depends(deps.get_current_good_tokenpayload),
+):
+    """
+    Streaming version of `enrich_html_to_json`, as NDJSON. The first line is `{"html": ...}`, then there is a
+    `{"models": {<timestamp>: <model>}}` line for each fragment as soon as it has been enriched, in no particular
+    order, and the last line is `{"analysis": ...}`
+    """
+    manager = managers.get(current_user.lang_pair)
+    text = info_request.data
+    if not text:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Incorrectly formed query, you must provide a JSON like { "data": "好" }"',
+        )
+
+    async def records():
+        html, slim_models = await enrich_html_fragment(text, manager)
+        yield {"html": html}
+        models = []
+        async for processed_file in as_completed_with_concurrency(
+            settings.IMPORT_MAX_CONCURRENT_PARSER_QUERIES,
+            *(html_model_futures(slim_models, manager, current_user)),
+        ):
+            models += processed_file.values()
+            yield {"models": processed_file}
+        yield {"analysis": await html_analysis(models)}
+
+    return ndjson_response(records())
 
 
 async def monthly_gen_quota_used(db, user_id):
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Iterable
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,13 @@ async def publish_message(channel: str, objects: Any, broadcast: Broadcast, user
     logger.info("publish_message: %s", channel)
 
 
+async def publish_messages(messages: Iterable[tuple[str, int | str]], broadcast: Broadcast):
+    """Publish `publish_message`s for each of the (channel, user_id) `messages`, in a single publish"""
+    events = [(f"changed{user_id}", channel) for channel, user_id in messages]
+    await broadcast.publish_many(events)
+    logger.info("publish_messages: %s messages", len(events))
+
+
 async def publish_readonly_collection(broadcast: Broadcast, readonly_collection: str):
     channel = f"changed{readonly_collection}"
     await broadcast.publish(channel=channel, message=readonly_collection)
@@ -11,6 +11,7 @@ from typing import Generic, Optional, TypeVar
 
 import strawberry
 from app import models
+from app.cache import decoded_definitions
 from app.db.session import async_session
 from app.etypes import KNOWLEDGE_UNSET
 from app.models.mixins import ActivatorMixin
@@ -182,15 +183,26 @@ class Definitions:
     synonyms: list[POSValuesSet] = field(default_factory=list)
     provider_translations: list[ProviderTranslations] = field(default_factory=list)
 
+    # the returned values come from `decoded_definitions` and are shared, so must not be modified. Full scans
+    # (like the exports and the syncs) should pass `cache=False` so they don't evict the hot words. Only the
+    # requested representation is cached, not also the `Definitions` that a dict is made from
     @staticmethod
-    def from_model_asdict(definition: models.CachedDefinition, providers: list[str]):
-        obj = Definitions.from_model(definition, providers)
+    def from_model_asdict(definition: models.CachedDefinition, providers: list[str], cache: bool = True):
+        key = (definition.word_id, definition.cached_date, tuple(providers), True)
+        if cache and (dict_obj := decoded_definitions.get(key)) is not None:
+            return dict_obj
+        obj = Definitions.from_model(definition, providers, cache=False)
         dict_obj = asdict_inner(obj)  # this doesn't work dict_obj = asdict(obj)
         del dict_obj["deleted"]
+        if cache:
+            decoded_definitions.put(key, dict_obj, len(definition.response_json))
         return dict_obj
 
     @staticmethod
-    def from_model(definition: models.CachedDefinition, providers: list[str]) -> Definitions:
+    def from_model(definition: models.CachedDefinition, providers: list[str], cache: bool = True) -> Definitions:
+        key = (definition.word_id, definition.cached_date, tuple(providers), False)
+        if cache and (out_definition := decoded_definitions.get(key)) is not None:
+            return out_definition
         stored = json.loads(definition.response_json)
 
         out_definition = Definitions(
@@ -213,6 +225,8 @@ class Definitions:
             for k2, v2 in stored["defs"][provider].items():
                 sd.pos_translations.append(POSValuesSet(pos_tag=k2, values=[entry["nt"] for entry in v2]))
             out_definition.provider_translations.append(sd)
+        if cache:
+            decoded_definitions.put(key, out_definition, len(definition.response_json))
         return out_definition
 
 
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Rows/second of `PersistenceProvider.load_to_db` vs `bulk_load_to_db` for a synthetic dictionary, loaded into the
+configured database in a transaction that is rolled back afterwards.
+
+Usage: python -m app.benchmarks.bulk_load [nb_entries]
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import sys
+import time
+
+from app.db.session import async_session
+from app.enrich.data import PersistenceProvider
+from app.models.lookups import EnZhhansABCLookup
+
+DEFAULT_NB_ENTRIES = 200_000
+
+
+class BenchmarkProvider(PersistenceProvider):
+    model_type = EnZhhansABCLookup
+
+    def _load(self):
+        return {}
+
+    @staticmethod
+    def name():
+        return "benchmark"
+
+
+def synthetic_dico(nb_entries: int) -> dict:
+    random.seed(42)
+    return {
+        f"benchmark-{i}": [{"hw": f"benchmark-{i}", "pos": "n.", "defs": ["一个", "两个"][: random.randint(1, 2)]}]
+        for i in range(nb_entries)
+    }
+
+
+async def main(nb_entries: int = DEFAULT_NB_ENTRIES):
+    dico = synthetic_dico(nb_entries)
+    provider = BenchmarkProvider({"inmem": False})
+    for name, loader in (("load_to_db", provider.load_to_db), ("bulk_load_to_db", provider.bulk_load_to_db)):
+        async with async_session() as db:
+            start = time.perf_counter()
+            await loader(db, dico)
+            elapsed = time.perf_counter() - start
+            await db.rollback()
+        print(f"{name:>16}: {elapsed:8.1f}s, {nb_entries / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NB_ENTRIES))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark comparing the previous nested-dict `cached_definitions` with the compact `DefinitionsStore`
+on a synthetic dictionary.
+
+Usage: python -m app.benchmarks.definitions_cache [nb_entries]
+"""
+from __future__ import annotations
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from app.cache.definitions import DefinitionsStore
+
+DEFAULT_NB_ENTRIES = 500_000
+HANZI = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+POS_TAGS = ["NOUN", "VERB", "ADJ", "ADV", "OTHER"]
+GLOSSES = [
+    "to go",
+    "person",
+    "big",
+    "small",
+    "to eat",
+    "water",
+    "good; well",
+    "country; nation",
+    "to study; to learn",
+    "time; period",
+    "again; once more",
+    "to think; to consider",
+]
+
+
+def synthetic_definition(word: str, word_id: int) -> str:
+    defs = {}
+    for provider in ("mst", "fbk", "abc", "ccc"):
+        defs[provider] = {
+            pos: [
+                {"upos": pos, "nt": random.choice(GLOSSES), "cf": round(random.random(), 4)}
+                for _ in range(random.randint(1, 3))
+            ]
+            for pos in random.sample(POS_TAGS, random.randint(1, 3))
+        }
+    definition = {
+        "w": word,
+        "id": word_id,
+        "defs": defs,
+        "syns": {"NOUN": [random.choice(HANZI) + random.choice(HANZI)]},
+        "p": " ".join(random.choice(["ni3", "hao3", "zhong1", "guo2", "ren2"]) for _ in word),
+        "metadata": {
+            "hsk": [{"pinyin": "ni3hao3", "hsk": random.randint(1, 6)}] if random.random() < 0.05 else [],
+            "frq": [{"wcpm": "12.3", "wcdp": "4.5", "pos": "n.v", "pos_freq": "10.2"}],
+        },
+    }
+    return json.dumps(definition, separators=(",", ":"))
+
+
+def synthetic_entries(nb_entries: int):
+    random.seed(42)
+    seen = set()
+    entries = []
+    ts = 1_600_000_000.0
+    while len(entries) < nb_entries:
+        word = "".join(random.choices(HANZI, k=random.randint(1, 4)))
+        if word in seen:
+            continue
+        seen.add(word)
+        ts += 0.01
+        entries.append((word, ts, synthetic_definition(word, len(entries) + 1), len(entries) + 1))
+    return entries
+
+
+def build_nested_dict(entries):
+    # this is what `update_cache` used to build
+    cache = defaultdict(tuple)
+    for source_text, ts, response_json, word_id in entries:
+        prev_dict = (cache.get(source_text.lower()) or (0, None))[1] or {}
+        prev_dict[source_text] = (ts, response_json, word_id)
+        cache.pop(source_text.lower(), None)
+        cache[source_text.lower()] = (ts, prev_dict)
+    return cache
+
+
+def build_store(entries):
+    store = DefinitionsStore()
+    for source_text, ts, response_json, word_id in entries:
+        store.add(source_text, ts, response_json, word_id)
+    return store
+
+
+def measure(builder, entries):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    # copy the strings, or the payloads referenced by `entries` are shared and not counted
+    structure = builder((w, ts, js.encode().decode(), wid) for w, ts, js, wid in entries)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, current, peak, elapsed
+
+
+def lookup_time(structure, words) -> float:
+    start = time.perf_counter()
+    for w in words:
+        structure.get(w)[1][w]  # pylint: disable=W0106
+    return (time.perf_counter() - start) / len(words)
+
+
+def main(nb_entries: int = DEFAULT_NB_ENTRIES):
+    print(f"Generating {nb_entries} synthetic definitions")
+    entries = synthetic_entries(nb_entries)
+    sample = [e[0] for e in random.sample(entries, min(10_000, nb_entries))]
+    payload_mb = sum(len(e[2]) for e in entries) / 1024 / 1024
+    print(f"Raw response_json total: {payload_mb:.1f} MiB")
+
+    for name, builder in (("nested dict", build_nested_dict), ("DefinitionsStore", build_store)):
+        structure, current, peak, elapsed = measure(builder, entries)
+        per_lookup = lookup_time(structure, sample)
+        print(
+            f"{name:>18}: retained {current / 1024 / 1024:8.1f} MiB, peak {peak / 1024 / 1024:8.1f} MiB, "
+            f"build {elapsed:6.1f}s, lookup {per_lookup * 1_000_000:6.1f}µs"
+        )
+        del structure
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NB_ENTRIES)
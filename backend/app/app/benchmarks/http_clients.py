@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Latency of CoreNLP-style parse and lemma lookup requests with a new client (and connection) per request, as the
+providers used to do, vs the pooled keep-alive clients from `app.enrich.http_clients`.
+
+By default the requests go to a local server that answers like CoreNLP, so the difference is only the connection
+setup. Pass the base url of a real CoreNLP to measure against it.
+
+Usage: python -m app.benchmarks.http_clients [base_url] [nb_requests] [concurrency]
+"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import sys
+import time
+
+from aiohttp import web
+from aiohttp_retry import ExponentialRetry, RetryClient
+from app.en.lemmatize import HTTPCoreNLPLemmatizer
+from app.enrich.http_clients import close_http_clients, http_client
+from app.enrich.parse import HTTPCoreNLPProvider
+
+DEFAULT_NB_REQUESTS = 2000
+DEFAULT_CONCURRENCY = 20
+LOCAL_PORT = 9071
+PARAMS = '{"annotators":"lemma","outputFormat":"json"}'
+TEXT = "The quick brown fox jumped over the lazy dog."
+
+
+async def fake_corenlp(request: web.Request) -> web.Response:
+    words = (await request.text()).split()
+    return web.json_response({"sentences": [{"index": 0, "tokens": [{"word": w, "lemma": w.lower()} for w in words]}]})
+
+
+async def unpooled(base_url: str, text: str) -> None:
+    retry_options = ExponentialRetry(attempts=5, max_timeout=300)
+    async with RetryClient(raise_for_status=False, retry_options=retry_options) as client:
+        async with client.post(base_url, data=text, params={"properties": PARAMS}) as response:
+            response.raise_for_status()
+            await response.json()
+
+
+async def timed(name: str, request, nb_requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(nb_requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{name:>18}: {nb_requests / elapsed:8.0f} req/s, mean {statistics.mean(latencies) * 1000:6.2f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.2f}ms"
+    )
+
+
+async def main(base_url: str = None, nb_requests: int = DEFAULT_NB_REQUESTS, concurrency: int = DEFAULT_CONCURRENCY):
+    runner = None
+    if not base_url:
+        server = web.Application()
+        server.router.add_post("/", fake_corenlp)
+        runner = web.AppRunner(server)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", LOCAL_PORT).start()
+        base_url = f"http://127.0.0.1:{LOCAL_PORT}/"
+
+    parser = HTTPCoreNLPProvider({"base_url": base_url, "params": PARAMS})
+    lemmatizer = HTTPCoreNLPLemmatizer({"base_url": base_url, "params": PARAMS})
+    try:
+        http_client(base_url)  # as on startup
+        await timed("unpooled parse", lambda: unpooled(base_url, TEXT), nb_requests, concurrency)
+        await timed("pooled parse", lambda: parser.parse(TEXT), nb_requests, concurrency)
+        await timed("unpooled lookup", lambda: unpooled(base_url, "jumped"), nb_requests, concurrency)
+        await timed("pooled lookup", lambda: lemmatizer.lemmatize("jumped"), nb_requests, concurrency)
+    finally:
+        await close_http_clients()
+        if runner:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            sys.argv[1] if len(sys.argv) > 1 else None,
+            int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_NB_REQUESTS,
+            int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_CONCURRENCY,
+        )
+    )
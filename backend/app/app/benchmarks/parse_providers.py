@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Latency and agreement of the in-process providers with CoreNLP, on the lines of a text file:
+- zh-Hans: `MaxMatchParseProvider` vs CoreNLP parses, with the precision/recall of the max-match token boundaries
+  and the agreement of the POS of the tokens both have
+- en: `RuleLemmatizer` vs `HTTPCoreNLPLemmatizer`, on the words of the CoreNLP parses of the lines
+
+Usage: python -m app.benchmarks.parse_providers zh-Hans|en path/to/text.txt [max_lines]
+"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import sys
+import time
+
+from app.core.config import settings
+from app.en.lemmatize import HTTPCoreNLPLemmatizer, RuleLemmatizer
+from app.enrich.http_clients import close_http_clients
+from app.enrich.parse import HTTPCoreNLPProvider
+from app.zhhans.parse import MaxMatchParseProvider
+
+DEFAULT_MAX_LINES = 500
+PARAMS = '{"annotators":"lemma","outputFormat":"json"}'
+LEMMATIZED_POS = ("NN", "VB", "JJ", "RB")  # prefixes of the en POS whose lemma matters
+
+
+def spans(model) -> dict[tuple[int, int], str]:
+    return {
+        (token["characterOffsetBegin"], token["characterOffsetEnd"]): token["pos"]
+        for sentence in model["sentences"]
+        for token in sentence["tokens"]
+    }
+
+
+async def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = await fn(*args)
+    return time.perf_counter() - start, result
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name:>12}: mean {statistics.mean(latencies) * 1000:8.2f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:8.2f}ms"
+    )
+
+
+async def compare_zh(lines: list[str]) -> None:
+    corenlp = HTTPCoreNLPProvider({"base_url": f"http://{settings.ZH_CORENLP_HOST}", "params": PARAMS})
+    maxmatch = MaxMatchParseProvider(
+        {
+            "dictionaries": [
+                {
+                    "classname": "app.zhhans_en.translate.abc.ZHHANS_EN_ABCDictTranslator",
+                    "config": {"path": settings.ZH_EN_ABC_DICT_PATH},
+                },
+                {
+                    "classname": "app.zhhans_en.translate.ccc.ZHHANS_EN_CCCedictTranslator",
+                    "config": {"path": settings.ZH_EN_CEDICT_PATH},
+                },
+            ]
+        }
+    )
+
+    corenlp_latencies, maxmatch_latencies = [], []
+    nb_reference = nb_segmented = nb_matching = nb_same_pos = 0
+    for line in lines:
+        corenlp_secs, reference = await timed(corenlp.parse, line)
+        maxmatch_secs, segmented = await timed(maxmatch.parse, line)
+        corenlp_latencies.append(corenlp_secs)
+        maxmatch_latencies.append(maxmatch_secs)
+        reference, segmented = spans(reference), spans(segmented)
+        matching = reference.keys() & segmented.keys()
+        nb_reference += len(reference)
+        nb_segmented += len(segmented)
+        nb_matching += len(matching)
+        nb_same_pos += sum(reference[span] == segmented[span] for span in matching)
+
+    report("corenlp", corenlp_latencies)
+    report("maxmatch", maxmatch_latencies)
+    precision, recall = nb_matching / (nb_segmented or 1), nb_matching / (nb_reference or 1)
+    print(
+        f"segmentation: precision {precision:.3f}, recall {recall:.3f}, "
+        f"f1 {2 * precision * recall / ((precision + recall) or 1):.3f}, "
+        f"same POS {nb_same_pos / (nb_matching or 1):.3f}"
+    )
+
+
+async def compare_en(lines: list[str]) -> None:
+    corenlp = HTTPCoreNLPProvider({"base_url": f"http://{settings.EN_CORENLP_HOST}", "params": PARAMS})
+    http_lemmatizer = HTTPCoreNLPLemmatizer({"base_url": f"http://{settings.EN_CORENLP_HOST}", "params": PARAMS})
+    rule_lemmatizer = RuleLemmatizer(
+        {
+            "dictionary": {
+                "classname": "app.en_zhhans.translate.abc.EN_ZHHANS_ABCDictTranslator",
+                "config": {"path": settings.EN_ZH_ABC_DICT_PATH},
+            }
+        }
+    )
+
+    words = {}
+    for line in lines:
+        for sentence in (await corenlp.parse(line))["sentences"]:
+            for token in sentence["tokens"]:
+                if token["pos"].startswith(LEMMATIZED_POS):
+                    words[token["originalText"].lower()] = token["lemma"].lower()
+
+    http_latencies, rule_latencies = [], []
+    nb_same = 0
+    for word, reference in words.items():
+        http_secs, _lemmas = await timed(http_lemmatizer.lemmatize, word)
+        rule_secs, lemmas = await timed(rule_lemmatizer.lemmatize, word)
+        http_latencies.append(http_secs)
+        rule_latencies.append(rule_secs)
+        nb_same += reference in lemmas
+
+    report("corenlp", http_latencies)
+    report("rules", rule_latencies)
+    print(f"lemmas: {len(words)} words, same lemma as in the CoreNLP parses {nb_same / (len(words) or 1):.3f}")
+
+
+async def main(lang: str, path: str, max_lines: int = DEFAULT_MAX_LINES) -> None:
+    with open(path, encoding="utf8") as text_file:
+        lines = [line.strip() for line in text_file if line.strip()][:max_lines]
+    try:
+        await (compare_zh(lines) if lang == "zh-Hans" else compare_en(lines))
+    finally:
+        await close_http_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_MAX_LINES))
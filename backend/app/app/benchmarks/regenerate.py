@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Wall time and peak RSS of the definitions exports, run against the configured database.
+
+Each export is run in a fresh process, so the peak RSS of one doesn't hide that of the next.
+
+Usage: python -m app.benchmarks.regenerate [from_lang] [to_lang]
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import resource
+import sys
+import time
+
+from app.enrich.cache import regenerate_definitions_jsons_multi, regenerate_sqlite
+
+EXPORTS = {
+    "sqlite": regenerate_sqlite,
+    "jsons": regenerate_definitions_jsons_multi,
+}
+
+
+def run_export(name: str, from_lang: str, to_lang: str, results) -> None:
+    start = time.perf_counter()
+    asyncio.run(EXPORTS[name](from_lang=from_lang, to_lang=to_lang))
+    # ru_maxrss is in KiB on linux
+    results[name] = (time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def main(from_lang: str = "zh-Hans", to_lang: str = "en"):
+    with multiprocessing.Manager() as manager:
+        results = manager.dict()
+        for name in EXPORTS:
+            process = multiprocessing.Process(target=run_export, args=(name, from_lang, to_lang, results))
+            process.start()
+            process.join()
+            if name not in results:
+                print(f"{name:>8}: failed with exit code {process.exitcode}")
+                continue
+            elapsed, peak_rss = results[name]
+            print(f"{name:>8}: wall {elapsed:8.1f}s, peak RSS {peak_rss:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the stats worker consuming one message at a time (as it used to) vs merging windows of messages, with
+an in-memory stand-in for Kafka and a stats DB session that just waits a fixed latency per statement and commit.
+
+Usage: python -m app.benchmarks.stats_consumer [nb_messages] [db_latency_ms]
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import sys
+import time
+from dataclasses import dataclass
+
+import orjson
+from app.core.config import settings
+from app.stats import ACTION_EVENT_TOPIC_NAME, CARD_EVENT_TOPIC_NAME, VOCAB_EVENT_TOPIC_NAME
+from app.sworker import consume
+from sqlalchemy.dialects import postgresql
+
+DEFAULT_NB_MESSAGES = 5000
+DEFAULT_DB_LATENCY_MS = 2
+NB_USERS = 50
+WORDS = [chr(c) + chr(c + 1) for c in range(0x4E00, 0x4E00 + 2000)]
+
+
+@dataclass
+class Message:
+    topic: str
+    partition: int
+    offset: int
+    key: bytes | None
+    value: bytes
+    timestamp: int
+
+
+def fake_messages(nb_messages: int) -> list[Message]:
+    messages = []
+    for offset in range(nb_messages):
+        user_id = random.randint(1, NB_USERS)
+        topic = random.choice(
+            [VOCAB_EVENT_TOPIC_NAME, VOCAB_EVENT_TOPIC_NAME, CARD_EVENT_TOPIC_NAME, ACTION_EVENT_TOPIC_NAME]
+        )
+        if topic == VOCAB_EVENT_TOPIC_NAME:
+            events = [
+                {
+                    "user_id": user_id,
+                    "data": {
+                        word: [random.randint(1, 3), int(random.random() < 0.1)] for word in random.sample(WORDS, 20)
+                    },
+                }
+            ]
+        elif topic == CARD_EVENT_TOPIC_NAME:
+            events = [{"user_id": user_id, "target_word": random.choice(WORDS), "grade": random.randint(1, 4)}]
+        else:
+            events = [{"user_id": user_id, "target_word": random.choice(WORDS)}]
+        messages.append(Message(topic, 0, offset, None, orjson.dumps(events), int(time.time() * 1000)))
+    return messages
+
+
+class FakeConsumer:
+    def __init__(self, messages: list[Message]):
+        self._messages = messages
+        self.nb_commits = 0
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int | None = None):
+        await asyncio.sleep(0)
+        batch, self._messages = self._messages[:max_records], self._messages[max_records:]
+        return {0: batch} if batch else {}
+
+    async def commit(self):
+        self.nb_commits += 1
+
+    def empty(self) -> bool:
+        return not self._messages
+
+
+class FakeSession:
+    nb_statements = 0
+    nb_transactions = 0
+
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, stmt):
+        stmt.compile(dialect=postgresql.dialect())  # the statements still need building, and that isn't free
+        FakeSession.nb_statements += 1
+        await asyncio.sleep(self._latency)
+
+    async def commit(self):
+        FakeSession.nb_transactions += 1
+        await asyncio.sleep(self._latency)
+
+
+async def run(name: str, messages: list[Message], max_records: int, latency: float) -> None:
+    FakeSession.nb_statements = FakeSession.nb_transactions = 0
+    consumer = FakeConsumer(list(messages))
+    start = time.perf_counter()
+    while not consumer.empty():
+        await consume(consumer, 0, max_records, lambda: FakeSession(latency), notify=False, max_windows=1)
+    secs = time.perf_counter() - start
+    print(
+        f"{name:>12}: {len(messages) / secs:10.0f} msg/s, {FakeSession.nb_transactions} transactions, "
+        f"{FakeSession.nb_statements} statements, {consumer.nb_commits} offset commits"
+    )
+
+
+async def main(nb_messages: int = DEFAULT_NB_MESSAGES, db_latency_ms: float = DEFAULT_DB_LATENCY_MS) -> None:
+    messages = fake_messages(nb_messages)
+    await run("one by one", messages, 1, db_latency_ms / 1000)
+    await run("windowed", messages, settings.KAFKA_MAX_POLL_RECORDS, db_latency_ms / 1000)
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NB_MESSAGES,
+            float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_DB_LATENCY_MS,
+        )
+    )
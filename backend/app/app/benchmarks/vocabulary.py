@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the vocabulary analysis of imports (`process`), comparing the previous counter-per-model-then-sum
+version with the current single pass, on the CoreNLP models of the `*.parse.json` files of imported content (or of
+any json files of CoreNLP models).
+
+Usage: python -m app.benchmarks.vocabulary path/to/processed/content [repeats]
+"""
+from __future__ import annotations
+
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+from app.data.importer.common import VocabularyCounter, get_sentences_from_model, process, vocabulary_lemmas
+from app.data.models import PARSE_JSON_SUFFIX
+from app.models.data import Import
+
+DEFAULT_REPEATS = 5
+
+
+def load_models(path: str) -> list:
+    pattern = f"**/*{PARSE_JSON_SUFFIX}"
+    if not glob.glob(os.path.join(path, pattern), recursive=True):
+        pattern = "**/*.json"
+    models = []
+    for fname in sorted(glob.glob(os.path.join(path, pattern), recursive=True)):
+        with open(fname, encoding="utf8") as model_file:
+            file_models = json.load(model_file)
+        models += file_models.values() if "sentences" not in file_models else [file_models]
+    return models
+
+
+async def previous_process(flat_models) -> dict:
+    sentence_lengths = []
+    vocabulary = []
+    for model in flat_models:
+        model_vocabulary = VocabularyCounter()
+        for sentence in get_sentences_from_model(model):
+            tokens = sentence.get("t") or sentence["tokens"]
+            sentence_lengths.append(len(tokens))
+            for word in vocabulary_lemmas(tokens):
+                model_vocabulary[word] += 1
+        vocabulary.append(model_vocabulary)
+    merged_vocabulary = sum(vocabulary, VocabularyCounter())
+
+    frequency_buckets = defaultdict(list)
+    for k, v in sorted(merged_vocabulary.items()):
+        frequency_buckets[v].append(k)
+    frequency_counts = Counter({k: len(v) for k, v in frequency_buckets.items()})
+    return {
+        "sentenceLengths": sentence_lengths,
+        "vocabulary": {"buckets": frequency_buckets, "counts": frequency_counts},
+    }
+
+
+async def timed(fn, models, repeats: int) -> tuple[float, dict]:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = await fn(models)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+async def main(path: str, repeats: int = DEFAULT_REPEATS) -> None:
+    models = load_models(path)
+    nb_tokens = sum(len(s.get("t") or s["tokens"]) for m in models for s in get_sentences_from_model(m))
+    print(f"{len(models)} models, {nb_tokens} tokens, best of {repeats}")
+
+    previous_secs, previous = await timed(previous_process, models, repeats)
+    current_secs, current = await timed(lambda m: process(m, Import.VOCABULARY_ONLY), models, repeats)
+    assert previous == current, "the analyses differ"
+
+    print(f"{'previous':>10}: {previous_secs * 1000:10.2f}ms")
+    print(f"{'current':>10}: {current_secs * 1000:10.2f}ms ({previous_secs / current_secs:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REPEATS))
@@ -22,5 +22,9 @@ class BroadcastBackend:
     async def publish(self, channel: str, message: Any) -> None:
         raise NotImplementedError()
 
+    async def publish_many(self, events: list[tuple[str, Any]]) -> None:
+        for channel, message in events:
+            await self.publish(channel, message)
+
     async def next_published(self) -> Event:
         raise NotImplementedError()
@@ -1,3 +1,4 @@
+import asyncio
 import typing
 from urllib.parse import urlparse
 
@@ -32,6 +33,11 @@ class KafkaBackend(BroadcastBackend):
     async def publish(self, channel: str, message: typing.Any) -> None:
         await self._producer.send_and_wait(channel, message.encode("utf8"))
 
+    async def publish_many(self, events: typing.List[typing.Tuple[str, typing.Any]]) -> None:
+        # queue them all so the producer can batch them, then wait for them all to be delivered
+        futures = [await self._producer.send(channel, message.encode("utf8")) for channel, message in events]
+        await asyncio.gather(*futures)
+
     async def next_published(self) -> Event:
         message = await self._consumer.getone()
         return Event(channel=message.topic, message=message.value.decode("utf8"))
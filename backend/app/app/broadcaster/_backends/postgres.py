@@ -48,6 +48,18 @@ class PostgresBackend(BroadcastBackend):
             logger.debug(f"sending event: {channel} {message}")
             await conn.execute("SELECT pg_notify($1, $2);", channel, message)
 
+    async def publish_many(self, events: list[tuple[str, str]]) -> None:
+        if not events:
+            return
+        await self.ensure_pool()
+        channels, messages = map(list, zip(*events))
+        async with self._pool.acquire() as conn:
+            logger.debug(f"sending {len(events)} events")
+            # a single statement, so a single round-trip and transaction for all the notifications
+            await conn.execute(
+                "SELECT pg_notify(c, m) FROM unnest($1::text[], $2::text[]) AS t(c, m);", channels, messages
+            )
+
     def _listener(self, *args: Any) -> None:
         _connection, _pid, channel, payload = args
         event = Event(channel=channel, message=payload)
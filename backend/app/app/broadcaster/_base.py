@@ -1,6 +1,6 @@
 import asyncio
 from contextlib import asynccontextmanager
-from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 
@@ -74,6 +74,9 @@ class Broadcast:
     async def publish(self, channel: str, message: Any) -> None:
         await self._backend.publish(channel, message)
 
+    async def publish_many(self, events: List[Tuple[str, Any]]) -> None:
+        await self._backend.publish_many(events)
+
     @asynccontextmanager
     async def subscribe(self, channel: str) -> AsyncIterator["Subscriber"]:
         queue: asyncio.Queue = asyncio.Queue()
@@ -1,6 +1,8 @@
 import logging
 from collections import defaultdict
 
+from app.cache.decoded import DecodedDefinitionsCache
+from app.cache.definitions import DefinitionsStore
 from app.ndutils import get_from_lang, within_char_limit
 
 logger = logging.getLogger(__name__)
@@ -10,7 +12,9 @@ cache_loading = {}
 TimeStampedDef = tuple[float, str, int]
 TimestampedDict = tuple[float, dict[str, TimeStampedDef]]
 
-cached_definitions = defaultdict(lambda: defaultdict(TimestampedDict))
+cached_definitions: defaultdict[str, DefinitionsStore] = defaultdict(DefinitionsStore)
+# `types.Definitions` (and their dict versions) already decoded from a CachedDefinition, for all lang pairs
+decoded_definitions = DecodedDefinitionsCache()
 
 
 class SimpleCache(dict):
@@ -37,8 +41,8 @@ def add_word_ids(user_words: list, lang_pair: str, allow_missing: bool = False,
             # logger.error(x)
             continue
 
-        val = (cached_definitions[lang_pair].get(x[0].lower()) or [None, {}])[1].get(x[0])
-        if not val:
+        val = cached_definitions[lang_pair].word_id(x[0])
+        if val is None:
             if not allow_missing:
                 logger.error(x)
                 raise MissingCacheValueException(
@@ -47,7 +51,7 @@ def add_word_ids(user_words: list, lang_pair: str, allow_missing: bool = False,
             else:
                 x.append(None)
         else:
-            x.append(id_format_fn(val[2]))
+            x.append(id_format_fn(val))
 
         filtered_words.append(x)
 
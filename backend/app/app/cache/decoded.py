@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+DECODED_MAX_ENTRIES = 50_000
+DECODED_MAX_BYTES = 128 * 1024 * 1024
+# rough size of the decoded python objects relative to the response_json they were decoded from
+DECODED_SIZE_FACTOR = 8
+
+
+class DecodedDefinitionsCache:
+    """
+    LRU of definitions that have already been decoded from their `response_json`, bounded both by number of entries
+    and by (estimated) memory. Keys must start with the word_id so all the entries for a word can be invalidated
+    when its definition changes. The cached values are shared, so must not be modified.
+    """
+
+    __slots__ = ("max_entries", "max_bytes", "_entries", "_by_word_id", "_bytes", "hits", "misses")
+
+    def __init__(self, max_entries: int = DECODED_MAX_ENTRIES, max_bytes: int = DECODED_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[Any, int]] = OrderedDict()  # key -> (value, size)
+        self._by_word_id: dict[int, set[tuple]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nb_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: tuple[int, Hashable, ...]) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: tuple[int, Hashable, ...], value: Any, json_length: int) -> None:
+        size = json_length * DECODED_SIZE_FACTOR
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, size)
+        self._by_word_id.setdefault(key[0], set()).add(key)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        keys = self._by_word_id[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._by_word_id[key[0]]
+
+    def invalidate(self, word_id: int) -> None:
+        for key in list(self._by_word_id.get(word_id, ())):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_word_id.clear()
+        self._bytes = 0
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from typing import Iterator
+
+# the zlib preset dictionary is taken from the first payloads added to a store. Definitions for a language pair
+# all share the same json skeleton (keys, providers, POS tags, metadata), so even short payloads compress well
+# when they are individually compressed against it, and we can still decode a single entry on demand
+ZDICT_MAX_BYTES = 2048
+ZDICT_SAMPLE_ENTRIES = 16
+# rewrite the payload buffer when more than this proportion of it is taken up by replaced entries
+COMPACT_GARBAGE_RATIO = 0.5
+
+# snapshot layout: header, zdict, "\0"-separated graphs, padding to 8 bytes, then the word_ids, timestamps,
+# offsets and lengths columns and finally the payloads. The columns and payloads are used directly from the mmap
+SNAPSHOT_MAGIC = b"TCDEFS01"
+SNAPSHOT_HEADER = struct.Struct("<8sQQQd")  # magic, nb_entries, zdict length, graphs length, max_timestamp
+SNAPSHOT_COLUMNS = (("q", 8), ("d", 8), ("Q", 8), ("I", 4))  # word_ids, timestamps, offsets, lengths
+
+
+class SnapshotFormatException(Exception):
+    pass
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class DefinitionsStore:
+    """
+    Compact in-process store for the `CachedDefinition` entries of a single language pair.
+
+    Keeps the lookup semantics of the previous nested `dict[str, TimestampedDict]`: entries are grouped by lowercased
+    graph, and `get` returns a `(max_timestamp, {graph: (timestamp, response_json, word_id)})` tuple, but the values
+    are held in parallel arrays and a single (zlib compressed) payload buffer, and only decoded when looked up.
+
+    A store can be started from a snapshot file (see `save` and `load`), in which case the snapshot entries are read
+    straight from the read-only mmap, shared between all the processes of a node, and only entries added afterwards
+    are held in the process.
+    """
+
+    __slots__ = (
+        "_graphs",
+        "_word_ids",
+        "_timestamps",
+        "_offsets",
+        "_lengths",
+        "_payloads",
+        "_garbage",
+        "_index",
+        "_groups",
+        "_zdict",
+        "_zdict_sample",
+        "_base",
+        "_base_size",
+        "max_timestamp",
+    )
+
+    def __init__(self) -> None:
+        self._graphs: list[str] = []
+        self._word_ids = array("q")
+        self._timestamps = array("d")
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._payloads = bytearray()
+        self._garbage = 0
+        self._index: dict[str, int] = {}  # graph -> entry number
+        self._groups: dict[str, int | tuple[int, ...]] = {}  # lowercased graph -> entry number(s)
+        self._zdict: bytes | None = None
+        self._zdict_sample: list[bytes] = []
+        # entry numbers below _base_size are in the snapshot, the others in the arrays above
+        self._base: tuple[memoryview, ...] | None = None  # word_ids, timestamps, offsets, lengths, payloads
+        self._base_size = 0
+        self.max_timestamp: float = 0
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._groups
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._groups)
+
+    @property
+    def nb_entries(self) -> int:
+        return len(self._index)
+
+    @property
+    def payload_bytes(self) -> int:
+        return len(self._payloads)
+
+    def _encode(self, response_json: str) -> bytes:
+        raw = response_json.encode("utf8")
+        if self._zdict is None:
+            self._zdict_sample.append(raw)
+            if len(self._zdict_sample) < ZDICT_SAMPLE_ENTRIES:
+                return raw
+            self._zdict = b"".join(self._zdict_sample)[-ZDICT_MAX_BYTES:]
+            self._zdict_sample = []
+            # everything stored so far is uncompressed and the zdict is now fixed, so recompress
+            self._compact()
+        return self._compress(raw)
+
+    def _compress(self, raw: bytes) -> bytes:
+        compressor = zlib.compressobj(level=6, zdict=self._zdict)
+        return compressor.compress(raw) + compressor.flush()
+
+    def _raw_payload(self, i: int) -> bytes | memoryview:
+        if i < self._base_size:
+            start = self._base[2][i]
+            return self._base[4][start : start + self._base[3][i]]  # noqa: E203
+        i -= self._base_size
+        start = self._offsets[i]
+        return self._payloads[start : start + self._lengths[i]]  # noqa: E203
+
+    def _word_id(self, i: int) -> int:
+        return self._base[0][i] if i < self._base_size else self._word_ids[i - self._base_size]
+
+    def _timestamp(self, i: int) -> float:
+        return self._base[1][i] if i < self._base_size else self._timestamps[i - self._base_size]
+
+    def _decode(self, i: int) -> str:
+        raw = self._raw_payload(i)
+        if self._zdict is not None:
+            decompressor = zlib.decompressobj(zdict=self._zdict)
+            raw = decompressor.decompress(raw) + decompressor.flush()
+        return bytes(raw).decode("utf8")
+
+    def _compact(self) -> None:
+        # drops the payloads of replaced entries, and compresses any that were added before the zdict existed
+        payloads = bytearray()
+        for i in range(len(self._offsets)):
+            start = self._offsets[i]
+            raw = bytes(self._payloads[start : start + self._lengths[i]])  # noqa: E203
+            if self._zdict is not None and self._is_uncompressed(raw):
+                raw = self._compress(raw)
+            self._offsets[i] = len(payloads)
+            self._lengths[i] = len(raw)
+            payloads += raw
+        self._payloads = payloads
+        self._garbage = 0
+
+    @staticmethod
+    def _is_uncompressed(raw: bytes) -> bool:
+        # response_json is always a json object, and a zlib stream never starts with "{"
+        return raw[:1] == b"{"
+
+    def _append(self, graph: str, timestamp: float, payload: bytes, word_id: int) -> int:
+        i = self._base_size + len(self._offsets)
+        self._graphs.append(graph)
+        self._word_ids.append(word_id)
+        self._timestamps.append(timestamp)
+        self._offsets.append(len(self._payloads))
+        self._lengths.append(len(payload))
+        self._index[graph] = i
+        return i
+
+    def _group(self, key: str, i: int, replaced: int | None = None) -> None:
+        existing = self._groups.get(key)
+        if existing is None:
+            self._groups[key] = i
+        elif isinstance(existing, int):
+            self._groups[key] = i if existing == replaced else (existing, i)
+        elif replaced is not None:
+            self._groups[key] = tuple(i if e == replaced else e for e in existing)
+        else:
+            self._groups[key] = existing + (i,)
+
+    def add(self, graph: str, timestamp: float, response_json: str, word_id: int) -> None:
+        payload = self._encode(response_json)
+        i = self._index.get(graph)
+        if i is None:
+            graph = sys.intern(graph)
+            self._group(graph.lower(), self._append(graph, timestamp, payload, word_id))
+        elif i < self._base_size:
+            # snapshot entries are read-only, so the new version is added and replaces it in the lookups
+            self._group(graph.lower(), self._append(self._graphs[i], timestamp, payload, word_id), replaced=i)
+        else:
+            i -= self._base_size
+            self._garbage += self._lengths[i]
+            self._word_ids[i] = word_id
+            self._timestamps[i] = timestamp
+            self._offsets[i] = len(self._payloads)
+            self._lengths[i] = len(payload)
+        self._payloads += payload
+        self.max_timestamp = max(self.max_timestamp, timestamp)
+
+        if self._garbage > len(self._payloads) * COMPACT_GARBAGE_RATIO:
+            self._compact()
+
+    def _entries(self, key: str) -> tuple[int, ...]:
+        entries = self._groups.get(key)
+        if entries is None:
+            return ()
+        if isinstance(entries, int):
+            return (entries,)
+        return entries
+
+    def get(self, key: str, default=None):
+        entries = self._entries(key)
+        if not entries:
+            return default
+        defs = {}
+        for i in entries:
+            defs[self._graphs[i]] = (self._timestamp(i), self._decode(i), self._word_id(i))
+        return (max(self._timestamp(i) for i in entries), defs)
+
+    def word_id(self, graph: str) -> int | None:
+        i = self._index.get(graph)
+        return None if i is None else self._word_id(i)
+
+    def save(self, path: str) -> None:
+        """
+        Write all the current entries to a snapshot file that can be opened with `load`. The file is written to
+        a temporary file and then moved into place, so processes that have the previous version open are unaffected
+        """
+        if self._zdict_sample:  # too few entries to have a zdict yet, but snapshots are always compressed
+            self._zdict = b"".join(self._zdict_sample)[-ZDICT_MAX_BYTES:]
+            self._zdict_sample = []
+            self._compact()
+
+        live = sorted(self._index.values())
+        word_ids, timestamps, offsets, lengths = (array(typecode) for typecode, _size in SNAPSHOT_COLUMNS)
+        graphs = "\0".join(self._graphs[i] for i in live).encode("utf8")
+        zdict = self._zdict or b""
+
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path) or ".", delete=False) as fh:
+            try:
+                header_length = SNAPSHOT_HEADER.size + len(zdict) + len(graphs)
+                fh.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(live), len(zdict), len(graphs), self.max_timestamp))
+                fh.write(zdict)
+                fh.write(graphs)
+                fh.write(b"\0" * (_padded(header_length) - header_length))
+
+                payload_offset = 0
+                for i in live:
+                    word_ids.append(self._word_id(i))
+                    timestamps.append(self._timestamp(i))
+                    offsets.append(payload_offset)
+                    length = len(self._raw_payload(i))
+                    lengths.append(length)
+                    payload_offset += length
+                for column in (word_ids, timestamps, offsets, lengths):
+                    column.tofile(fh)
+                fh.write(b"\0" * (_padded(len(lengths) * 4) - len(lengths) * 4))
+                for i in live:
+                    fh.write(self._raw_payload(i))
+            except BaseException:
+                os.remove(fh.name)
+                raise
+        os.replace(fh.name, path)
+
+    @classmethod
+    def load(cls, path: str) -> DefinitionsStore:
+        with open(path, "rb") as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, nb_entries, zdict_length, graphs_length, max_timestamp = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotFormatException(f"{path} is not a definitions snapshot")
+
+        view = memoryview(mapped)
+        store = cls()
+        position = SNAPSHOT_HEADER.size
+        store._zdict = bytes(view[position : position + zdict_length]) or None  # noqa: E203
+        position += zdict_length
+        graphs = bytes(view[position : position + graphs_length]).decode("utf8")  # noqa: E203
+        position = _padded(position + graphs_length)
+
+        base = []
+        for typecode, size in SNAPSHOT_COLUMNS:
+            base.append(view[position : position + nb_entries * size].cast(typecode))  # noqa: E203
+            position = _padded(position + nb_entries * size)
+        base.append(view[position:])
+        store._base = tuple(base)
+        store._base_size = nb_entries
+        store.max_timestamp = max_timestamp
+
+        if nb_entries:
+            for i, graph in enumerate(graphs.split("\0")):
+                graph = sys.intern(graph)
+                store._graphs.append(graph)
+                store._index[graph] = i
+                store._group(graph.lower(), i)
+        return store
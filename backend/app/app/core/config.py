@@ -174,6 +174,22 @@ class Settings(BaseSettings):
     KAFKA_CONSUMER_TIMEOUT_MS: int = 5000
     KAFKA_STATS_LOOP_SLEEP_SECS: int = 10
     KAFKA_MAX_POLL_RECORDS: int = 500
+    # The stats worker merges all the events it gets within this window (of at most KAFKA_MAX_POLL_RECORDS
+    # messages) into a single write per table
+    KAFKA_STATS_BATCH_WINDOW_MS: int = 500
+    # The number of processes consuming the stats topics, each owning a share of their partitions. Topics that don't
+    # exist yet are created with STATS_TOPICS_PARTITIONS partitions, which is the max useful number of consumers
+    # (over all the sworker replicas)
+    STATS_WORKER_CONSUMERS: int = 1
+    STATS_TOPICS_PARTITIONS: int = 8
+    STATS_TOPICS_REPLICATION_FACTOR: int = 1
+    # Notifications of stats changes to clients are coalesced per user and collection over this window, and all
+    # those of a window are sent in a single publish
+    STATS_NOTIFY_DEBOUNCE_MS: int = 500
+    # The activity and read event tables are partitioned by month, and the stats worker creates the partitions this
+    # many months ahead. Partitions with events all older than STATS_EVENTS_RETENTION_MONTHS get dropped, 0 keeps all
+    STATS_EVENTS_PARTITIONS_AHEAD: int = 2
+    STATS_EVENTS_RETENTION_MONTHS: int = 0
 
     FAUST_HOST: str = "faustworker"
     FAUST_PRODUCER_MAX_REQUEST_SIZE: int = 10000000  # default is 1MB, which is small for us
@@ -183,12 +199,28 @@ class Settings(BaseSettings):
     def DB_CACHE_DIR(self) -> str:
         return os.path.join(self.MEDIA_ROOT, "db_cache")
 
+    @property
+    def DB_CHUNKS_DIR(self) -> str:
+        return os.path.join(self.MEDIA_ROOT, "db_chunks")
+
+    DB_CHUNKS_MAX_AGE_DAYS: int = 7
+
     @property
     def DEFINITIONS_CACHE_DIR(self) -> str:
         return os.path.join(self.MEDIA_ROOT, "definitions_json")
 
     DEFINITIONS_PER_CACHE_FILE: int = 5000
 
+    @property
+    def DEFINITIONS_SNAPSHOT_DIR(self) -> str:
+        return os.path.join(self.MEDIA_ROOT, "definitions_snapshot")
+
+    @property
+    def PARSE_CACHE_DIR(self) -> str:
+        return os.path.join(self.MEDIA_ROOT, "parse_cache")
+
+    PARSE_CACHE_MAX_AGE_DAYS: int = 30
+
     @property
     def HANZI_CACHE_DIR(self) -> str:
         return os.path.join(self.MEDIA_ROOT, "hanzi_json")
@@ -221,6 +253,18 @@ class Settings(BaseSettings):
     IMPORT_PARSE_CHUNK_SIZE_BYTES: int = 20000
     IMPORT_DETECT_CHUNK_SIZE_BYTES: int = 5000
     IMPORT_MAX_CONCURRENT_PARSER_QUERIES: int = 10
+    # The number of processes for the CPU-bound parts of enriching imports (decoding definitions, best guesses, etc.)
+    ENRICH_PROCESS_POOL_WORKERS: int = max(1, (os.cpu_count() or 2) - 1)
+    # The max number of DB sessions (so pooled connections) used at a time to enrich a single model (chapter, etc.)
+    ENRICH_MAX_SESSIONS_PER_MODEL: int = 2
+    # The max number of characters of (html or plain text) fragments that are sent to the parser in a single
+    # document, with the same caveats as for IMPORT_PARSE_CHUNK_SIZE_BYTES
+    PARSE_BATCH_MAX_CHARS: int = 20000
+
+    # Pooled (keep-alive) connections to each of the HTTP backends (CoreNLP, Bing, etc.), per process
+    HTTP_CLIENT_LIMIT_PER_HOST: int = 20  # also the max of the adaptive concurrency limit of requests per backend
+    HTTP_CLIENT_INITIAL_CONCURRENCY: int = 10
+    HTTP_CLIENT_KEEPALIVE_SECS: int = 30
 
     OPENAI_API_KEY: str = "a_good_key"
     OPENAI_PROMPT_VERSION: int = 3
@@ -243,6 +287,8 @@ class Settings(BaseSettings):
     ZH_SUBTLEX_FREQ_INMEM: bool = False
     ZH_HSK_LISTS_INMEM: bool = False
     ZH_CORENLP_HOST: str = "corenlpzh:9001"
+    ZH_CORENLP_VERSION: str = "1"  # change to invalidate the parse cache
+    ZH_PARSER: str = "corenlp"  # or "maxmatch" for the in-process dictionary segmenter
 
     EN_ZH_ABC_DICT_PATH: str = "/data/abc_en_zh_dict.txt"
     EN_SUBTLEX_FREQ_PATH: str = "/data/subtlex-en-us.utf8.txt"
@@ -251,6 +297,8 @@ class Settings(BaseSettings):
     EN_SUBTLEX_FREQ_INMEM: bool = False
     EN_CMU_DICT_INMEM: bool = False
     EN_CORENLP_HOST: str = "corenlpen:9001"
+    EN_CORENLP_VERSION: str = "1"  # change to invalidate the parse cache
+    EN_WORD_LEMMATIZER: str = "corenlp"  # or "rules" for the in-process dictionary and suffix rules lemmatizer
 
     @property
     def ALL_HOSTS(self) -> List[str]:
@@ -262,19 +310,37 @@ class Settings(BaseSettings):
             "en:zh-Hans": {
                 "enrich": {"classname": "app.en.CoreNLP_EN_Enricher", "config": {}},
                 "parse": {
-                    "classname": "app.enrich.parse.HTTPCoreNLPProvider",
+                    "classname": "app.enrich.parse.cache.CachedParseProvider",
                     "config": {
-                        "base_url": f"http://{self.EN_CORENLP_HOST}",
-                        "params": '{"annotators":"lemma","outputFormat":"json"}',
-                    },
-                },
-                "word_lemmatizer": {
-                    "classname": "app.en.lemmatize.HTTPCoreNLPLemmatizer",
-                    "config": {
-                        "base_url": f"http://{self.EN_CORENLP_HOST}",
-                        "params": '{"annotators":"lemma","outputFormat":"json"}',
+                        "classname": "app.enrich.parse.HTTPCoreNLPProvider",
+                        "config": {
+                            "base_url": f"http://{self.EN_CORENLP_HOST}",
+                            "params": '{"annotators":"lemma","outputFormat":"json"}',
+                            "max_batch_chars": self.PARSE_BATCH_MAX_CHARS,
+                        },
+                        "path": os.path.join(self.PARSE_CACHE_DIR, "en"),
+                        "version": self.EN_CORENLP_VERSION,
                     },
                 },
+                "word_lemmatizer": (
+                    {
+                        "classname": "app.en.lemmatize.RuleLemmatizer",
+                        "config": {
+                            "dictionary": {
+                                "classname": "app.en_zhhans.translate.abc.EN_ZHHANS_ABCDictTranslator",
+                                "config": {"path": self.EN_ZH_ABC_DICT_PATH},
+                            },
+                        },
+                    }
+                    if self.EN_WORD_LEMMATIZER == "rules"
+                    else {
+                        "classname": "app.en.lemmatize.HTTPCoreNLPLemmatizer",
+                        "config": {
+                            "base_url": f"http://{self.EN_CORENLP_HOST}",
+                            "params": '{"annotators":"lemma","outputFormat":"json"}',
+                        },
+                    }
+                ),
                 "default": {
                     "classname": "app.enrich.translate.bing.BingTranslator",
                     "config": {
@@ -325,13 +391,38 @@ class Settings(BaseSettings):
                     "max_word_length_chars": 10,
                 },
                 "enrich": {"classname": "app.zhhans.CoreNLP_ZHHANS_Enricher", "config": {}},
-                "parse": {
-                    "classname": "app.enrich.parse.HTTPCoreNLPProvider",
-                    "config": {
-                        "base_url": f"http://{self.ZH_CORENLP_HOST}",
-                        "params": '{"annotators":"lemma","outputFormat":"json"}',
-                    },
-                },
+                "parse": (
+                    {
+                        "classname": "app.zhhans.parse.MaxMatchParseProvider",
+                        "config": {
+                            "dictionaries": [
+                                {
+                                    "classname": "app.zhhans_en.translate.abc.ZHHANS_EN_ABCDictTranslator",
+                                    "config": {"path": self.ZH_EN_ABC_DICT_PATH},
+                                },
+                                {
+                                    "classname": "app.zhhans_en.translate.ccc.ZHHANS_EN_CCCedictTranslator",
+                                    "config": {"path": self.ZH_EN_CEDICT_PATH},
+                                },
+                            ],
+                            "max_word_length": 10,
+                        },
+                    }
+                    if self.ZH_PARSER == "maxmatch"
+                    else {
+                        "classname": "app.enrich.parse.cache.CachedParseProvider",
+                        "config": {
+                            "classname": "app.enrich.parse.HTTPCoreNLPProvider",
+                            "config": {
+                                "base_url": f"http://{self.ZH_CORENLP_HOST}",
+                                "params": '{"annotators":"lemma","outputFormat":"json"}',
+                                "max_batch_chars": self.PARSE_BATCH_MAX_CHARS,
+                            },
+                            "path": os.path.join(self.PARSE_CACHE_DIR, "zh"),
+                            "version": self.ZH_CORENLP_VERSION,
+                        },
+                    }
+                ),
                 "word_lemmatizer": {
                     "classname": "app.enrich.lemmatize.no_op.NoOpWordLemmatizer",
                     "config": {},
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+
+import orjson
+from app.data.models import DATA_JS_SUFFIX, DATA_JSON_SUFFIX, ENRICH_JSON_SUFFIX, PARSE_JSON_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+GZIP_SUFFIX = ".gz"
+DATA_JS_PREFIX = b"var transcrobesModel = "
+DATA_JS_POSTFIX = b";"
+
+
+def merge_parse_and_enrich(parse_path: str, enrich_path: str) -> dict:
+    """The parse models of a content file, with the properties from its enrich models added to each token"""
+    with open(parse_path, "rb") as parse_file:
+        combined = orjson.loads(parse_file.read())
+    with open(enrich_path, "rb") as enrich_file:
+        enrich = orjson.loads(enrich_file.read())
+
+    for parse_id, text_parse in combined.items():
+        for sindex, sentence in enumerate(text_parse["s"]):
+            if "l1" in enrich[parse_id]["s"][sindex]:
+                sentence["l1"] = enrich[parse_id]["s"][sindex]["l1"]
+            for tindex, token in enumerate(sentence["t"]):
+                token.update(enrich[parse_id]["s"][sindex]["t"][tindex])
+    return combined
+
+
+def _write_atomically(path: str, content: bytes) -> None:
+    # concurrent writers for the same file all write the same content, so last one wins is fine
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_data_files(base_path: str) -> None:
+    """
+    Merge the parse and enrich files of the content file at `base_path` and write the result as the `.data.json`
+    and `.data.js` files served to clients, each with a gzipped copy, so serving them needs no JSON work at all.
+    Called when an import is enriched, and lazily for content imported before these files existed.
+    """
+    combined = orjson.dumps(
+        merge_parse_and_enrich(f"{base_path}{PARSE_JSON_SUFFIX}", f"{base_path}{ENRICH_JSON_SUFFIX}")
+    )
+    for suffix, content in (
+        (DATA_JSON_SUFFIX, combined),
+        (DATA_JS_SUFFIX, DATA_JS_PREFIX + combined + DATA_JS_POSTFIX),
+    ):
+        _write_atomically(f"{base_path}{suffix}{GZIP_SUFFIX}", gzip.compress(content, mtime=0))
+        _write_atomically(f"{base_path}{suffix}", content)
+    logger.debug("Wrote the data files for %s", base_path)
+
+
+def data_files_stale(base_path: str, data_path: str) -> bool:
+    """Whether the data file (or its gzipped copy) at `data_path` is missing or older than what it is made from"""
+    try:
+        data_mtime = min(os.path.getmtime(data_path), os.path.getmtime(f"{data_path}{GZIP_SUFFIX}"))
+    except FileNotFoundError:
+        return True
+    return data_mtime < max(
+        os.path.getmtime(f"{base_path}{PARSE_JSON_SUFFIX}"), os.path.getmtime(f"{base_path}{ENRICH_JSON_SUFFIX}")
+    )
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """Whether an `Accept-Encoding` header allows gzip, i.e. names it (or `*`, if it isn't named) with a q-value > 0"""
+    qvalues = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        qvalue = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[name.lower()] = qvalue
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0
@@ -88,12 +88,9 @@ async def filter_word_model_stats(
         updates = add_word_ids(lines, lang_pair)
     except MissingCacheValueException:
         # This happens because broadcaster actually doesn't work... sigh... encode...
-        logger.error("Missing cache value, updating cache", len(cached_definitions[lang_pair].values()))
+        logger.error("Missing cache value, updating cache from %s entries", len(cached_definitions[lang_pair]))
         async with async_session() as db:
-            if cached_definitions and cached_definitions[lang_pair] and len(cached_definitions[lang_pair].values()) > 0:
-                cached_max_timestamp = next(reversed(cached_definitions[lang_pair].values()))[0]
-            else:
-                cached_max_timestamp = 0
+            cached_max_timestamp = cached_definitions[lang_pair].max_timestamp
             await update_cache(db, get_from_lang(lang_pair), get_to_lang(lang_pair), cached_max_timestamp)
         updates = add_word_ids(lines, lang_pair)
 
@@ -233,7 +230,7 @@ async def filter_student_word_model_stats(
     except MissingCacheValueException:
         # This happens because broadcaster actually doesn't work... sigh... encode...
         async with async_session() as db:
-            cached_max_timestamp = next(reversed(cached_definitions[lang_pair].values()))[0]
+            cached_max_timestamp = cached_definitions[lang_pair].max_timestamp
             await update_cache(db, get_from_lang(lang_pair), get_to_lang(lang_pair), cached_max_timestamp)
         updates = add_word_ids(lines, lang_pair)
 
@@ -474,7 +471,7 @@ async def filter_cached_definitions(
         # stmt = stmt.order_by(text("cached_date desc, word_id desc")).limit(limit)
         result = await db.execute(stmt)
         try:
-            return [types.Definitions.from_model(result.scalar_one(), providers)]
+            return [types.Definitions.from_model(result.scalar_one(), providers, cache=False)]
         except Exception:
             logger.exception(
                 f"Error getting DefinitionSet for {str(stmt)=}, {latest_cached_date=}, {latest_word_id=},"
@@ -498,7 +495,7 @@ async def filter_cached_definitions(
     stmt = stmt.order_by(text("cached_date, word_id")).limit(limit)
     try:
         result = await db.execute(stmt)
-        defs = [types.Definitions.from_model(word, providers) for word in result.scalars().all()]
+        defs = [types.Definitions.from_model(word, providers, cache=False) for word in result.scalars().all()]
     except Exception:
         logger.exception(f"Error getting DefinitionSet for {stmt=}")
         raise
@@ -4,13 +4,14 @@ from __future__ import annotations
 import asyncio
 import csv
 import glob
+import importlib
 import json  # import orjson as json
 import logging
 import os
 import posixpath
 import re
 import shutil
-from collections import ChainMap, Counter, defaultdict
+from collections import Counter, defaultdict
 from copy import deepcopy
 from datetime import datetime
 from itertools import chain
@@ -27,6 +28,7 @@ from app.api.api_v1 import types
 from app.api.api_v1.subs import publish_message
 from app.core.config import settings
 from app.data.context import get_broadcast
+from app.data.data_files import write_data_files
 from app.data.importer import get_or_create_content
 from app.data.importer.subs import process_subs
 from app.data.models import (
@@ -43,9 +45,10 @@ from app.data.models import (
     VTT_EXTENSION,
 )
 from app.db.session import async_session
-from app.enrich import TokenPhoneType, enrich_html_to_html
+from app.enrich import Enricher, TokenPhoneType, enrich_html_to_html
 from app.enrich.data import EnrichmentManager, managers
-from app.enrich.models import ensure_cache_preloaded
+from app.enrich.models import definitions_many, ensure_cache_preloaded
+from app.enrich.process_pool import run_in_process
 from app.generative.openai.mcq import get_multiple_choice_qa_chat
 from app.models.data import Content, ContentQuestion, Import, UserList
 from app.models.user import absolute_imports_path, absolute_resources_path
@@ -444,28 +447,20 @@ class GrammarRuleCounter(Counter):  # pylint: disable=W0223
     pass
 
 
-async def vocabulary_from_model(model):
+def vocabulary_lemmas(tokens):
     # TODO: consider removing the first and last word if settings.IMPORT_PARSE_CHUNK_SIZE_BYTES
     # as it might have got half of a character (which can be more than one byte and we split on
     # bytes, not chars, at least for now!
 
-    # this allows analysing pure CoreNLP models and enriched models
-    sentences = get_sentences_from_model(model)
-    pos_tag = "pos"
-    vocabulary = VocabularyCounter()
-    for sentence in sentences:
-        for token in sentence.get("t") or sentence["tokens"]:
-            # WARNING!!!
-            # this has the effect of removing LOTS of Chinese time and number words/expressions
-            # At the moment this looks like a good idea because we really don't want "words" like
-            # 千万分之一, which is a "word" according to CoreNLP. It is entirely predictable from
-            # the parts, and we definitely don't need to consider this something that might need
-            # to be added to Anki, or that it should be included in known word counts, considered
-            # when calculating difficulty, etc.
-            # TODO: consider making this configurable
-            if pos_tag in token and token[pos_tag] not in CORENLP_ZH_IGNORABLE_POS:
-                vocabulary[lemma(token)] += 1
-    return vocabulary
+    # WARNING!!!
+    # this has the effect of removing LOTS of Chinese time and number words/expressions
+    # At the moment this looks like a good idea because we really don't want "words" like
+    # 千万分之一, which is a "word" according to CoreNLP. It is entirely predictable from
+    # the parts, and we definitely don't need to consider this something that might need
+    # to be added to Anki, or that it should be included in known word counts, considered
+    # when calculating difficulty, etc.
+    # TODO: consider making this configurable
+    return (lemma(token) for token in tokens if "pos" in token and token["pos"] not in CORENLP_ZH_IGNORABLE_POS)
 
 
 async def grammar_rules_from_model(_model):
@@ -487,16 +482,6 @@ async def model_from_chunk(
     return model
 
 
-async def analysis_from_model(model, process_type):
-    awaitables = []
-    if process_type in [Import.VOCABULARY_ONLY, Import.VOCABULARY_GRAMMAR]:
-        awaitables.append(vocabulary_from_model(model))
-    if process_type in [Import.GRAMMAR_ONLY, Import.VOCABULARY_GRAMMAR]:
-        awaitables.append(grammar_rules_from_model(model))
-
-    return await asyncio.gather(*awaitables)
-
-
 def get_sentences_from_model(model):
     sentences = model.get("s") or model.get("sentences")
     if not sentences:
@@ -505,31 +490,28 @@ def get_sentences_from_model(model):
 
 
 async def process(flat_models, process_type):
-    vocabulary = []
-    grammar_rules = []
-    model_stats = []
+    # single pass over all the sentences of all the models, with the lemmas counted as they go by, rather than a
+    # counter per model that all then need merging
+    do_vocabulary = process_type in [Import.VOCABULARY_ONLY, Import.VOCABULARY_GRAMMAR]
+    do_grammar = process_type in [Import.GRAMMAR_ONLY, Import.VOCABULARY_GRAMMAR]
     sentenceLengths = []
+    merged_vocabulary = VocabularyCounter()
+    merged_grammar_rules = GrammarRuleCounter()
     for model in flat_models:
-        sentences = get_sentences_from_model(model)
-        for s in sentences:
-            sentenceLengths.append(len(s.get("t") or s["tokens"]))
-        model_stats.append(await analysis_from_model(model, process_type))
-    for model_stat in model_stats:
-        for stat in model_stat:
-            if isinstance(stat, VocabularyCounter):
-                vocabulary.append(stat)
-            elif isinstance(stat, GrammarRuleCounter):
-                grammar_rules.append(stat)
-    merged_vocabulary = sum(vocabulary or [], VocabularyCounter())
-    merged_grammar_rules = sum(grammar_rules or [], GrammarRuleCounter())
+        for sentence in get_sentences_from_model(model):
+            tokens = sentence.get("t") or sentence["tokens"]
+            sentenceLengths.append(len(tokens))
+            if do_vocabulary:
+                merged_vocabulary.update(vocabulary_lemmas(tokens))
+        if do_grammar:
+            merged_grammar_rules.update(await grammar_rules_from_model(model) or {})
 
     analysis = {"sentenceLengths": sentenceLengths}
 
-    if process_type in [Import.VOCABULARY_ONLY, Import.VOCABULARY_GRAMMAR]:
-        # TODO: optimise
+    if do_vocabulary:
         frequency_buckets = defaultdict(list)
-        for k, v in sorted(merged_vocabulary.items()):
-            frequency_buckets[v].append(k)
+        for k in sorted(merged_vocabulary):
+            frequency_buckets[merged_vocabulary[k]].append(k)
 
         frequency_counts = Counter({k: len(v) for k, v in frequency_buckets.items()})
 
@@ -537,48 +519,91 @@ async def process(flat_models, process_type):
             "buckets": frequency_buckets,
             "counts": frequency_counts,
         }
-    if process_type in [Import.GRAMMAR_ONLY, Import.VOCABULARY_GRAMMAR]:
+    if do_grammar:
         analysis["grammar_rules"] = merged_grammar_rules
 
     return analysis
 
 
+_enrichers: dict[str, Enricher] = {}
+
+
+def _process_enricher(enrich_config: dict) -> Enricher:
+    # enrichers only hold their config (and maybe a converter), so each worker process makes its own
+    classname = enrich_config["classname"]
+    if classname not in _enrichers:
+        module_name, class_name = classname.rsplit(".", 1)
+        _enrichers[classname] = getattr(importlib.import_module(module_name), class_name)(enrich_config["config"])
+    return _enrichers[classname]
+
+
+def prepare_parse_file(fname: str, lang: str, enrich_config: dict) -> set[tuple[str, str]]:
+    """
+    Run in a worker process: create the QA base file for a parse file and return the lookups of all the tokens
+    that need definitions, so the parse file itself never has to be decoded in the event loop
+    """
+    create_qa_base_file(fname, fname.replace(MCQ_QAG_INFILE_SUFFIX, MCQ_QAG_OUTFILE_SUFFIX), lang)
+    enricher = _process_enricher(enrich_config)
+    with open(fname, encoding="utf8") as file_contents:
+        file_models = json.load(file_contents)
+    return set().union(*(enricher.enrichable_lookups(model) for model in file_models.values()))
+
+
+def enrich_parse_file(
+    fname: str,
+    enrich_config: dict,
+    available_def_providers: list[str],
+    model_definitions: dict[tuple[str, str], dict],
+) -> None:
+    """
+    Run in a worker process: enrich all the models of a parse file, write them to its enrich file and write the
+    merged data files that are served to clients
+    """
+    enricher = _process_enricher(enrich_config)
+    with open(fname, encoding="utf8") as file_contents:
+        file_models = json.load(file_contents)
+    enriched = {}
+    for timestamp, model in file_models.items():
+        sentences = [
+            enricher.enrich_slim_tokens(
+                sentence,
+                phone_type=TokenPhoneType.NONE,
+                best_guess=True,
+                fill_id=True,
+                available_def_providers=available_def_providers,
+                model_definitions=model_definitions,
+            )
+            for sentence in (model["s"] if isinstance(model, dict) else model)
+        ]
+        enriched[timestamp] = enricher.aids_model(sentences)
+    with open(re.sub(f"{PARSE_JSON_SUFFIX}$", ENRICH_JSON_SUFFIX, fname), "w+", encoding="utf8") as file_contents:
+        file_contents.write(orjson.dumps(enriched).decode("utf8"))
+    write_data_files(fname.removesuffix(PARSE_JSON_SUFFIX))
+
+
 async def enrich_parse(content: Content, manager: EnrichmentManager, available_def_providers: list[str]):
+    """
+    Enrich all the parse files of a content concurrently. The files are read, enriched and written in the
+    process pool and only the definitions are got in the event loop, a file at a time from a budget shared
+    by all the files
+    """
     logger.info("Enriching parse for content %s on path %s", content, content.processed_path())
-    # TODO: think about doing all files in parallel, not just all fragments
-    for fname in glob.glob(
-        os.path.join(content.processed_path(), f"**/*{PARSE_JSON_SUFFIX}"),
-        recursive=True,
-    ):
-        logger.debug("Enriching content file %s", fname)
-        with open(fname, encoding="utf8") as file_contents:
-            base_outfile = fname.replace(MCQ_QAG_INFILE_SUFFIX, MCQ_QAG_OUTFILE_SUFFIX)
-            # print("going to do", fname, base_outfile)
-            create_qa_base_file(fname, base_outfile, content.created_by.from_lang)
-            file_models = json.load(file_contents)
-            model_futures = [
-                manager.enricher().enrich_parse_to_aids_json(
-                    timestamp,
-                    model,
-                    manager,
-                    translate_sentence=False,
-                    best_guess=True,
-                    phone_type=TokenPhoneType.NONE,
-                    fill_id=True,
-                    available_def_providers=available_def_providers,
-                )
-                for timestamp, model in file_models.items()
-            ]
+    enrich_config = manager.config["enrich"]
+    budget = asyncio.Semaphore(settings.IMPORT_MAX_CONCURRENT_PARSER_QUERIES)
 
-        processed_files_list = await gather_with_concurrency(
-            settings.IMPORT_MAX_CONCURRENT_PARSER_QUERIES,
-            *(model_futures),
+    async def enrich_file(fname: str):
+        logger.debug("Enriching content file %s", fname)
+        lookups = await run_in_process(prepare_parse_file, fname, content.created_by.from_lang, enrich_config)
+        async with budget, async_session() as db:
+            model_definitions = await definitions_many(db, manager, [{"w": ot, "l": lem} for ot, lem in lookups])
+        await run_in_process(enrich_parse_file, fname, enrich_config, available_def_providers, model_definitions)
+
+    await asyncio.gather(
+        *(
+            enrich_file(fname)
+            for fname in glob.glob(os.path.join(content.processed_path(), f"**/*{PARSE_JSON_SUFFIX}"), recursive=True)
         )
-
-        processed_files_dict = dict(ChainMap(*processed_files_list))  # re-merge dicts from list
-
-        with open(re.sub(f"{PARSE_JSON_SUFFIX}$", ENRICH_JSON_SUFFIX, fname), "w+", encoding="utf8") as file_contents:
-            json.dump(processed_files_dict, file_contents, separators=(",", ":"))
+    )
 
 
 async def models_from_import(db: AsyncSession, an_import: Import, manager: EnrichmentManager):
@@ -835,6 +860,12 @@ async def process_qag(qag_event: ProcessData):
             logger.info("Finished running qag %s", qag_event.id)
 
 
+def qag_trigger_model_ids(qags: list[dict]) -> set[str]:
+    """The ids of the models whose reading triggers generating the question of each of the `qags`: their last one"""
+    # FIXME: use a const for the "-"
+    return {qag["modelIds"].split("-")[-1] for qag in qags}
+
+
 def create_qa_base_file(infile, outfile, lang):
     Path(os.path.dirname(outfile)).mkdir(parents=True, exist_ok=True)
     if os.path.exists(outfile):
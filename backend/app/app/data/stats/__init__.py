@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import logging
 
-from app.api.api_v1.subs import publish_message
+from app.api.api_v1.subs import publish_messages
+from app.core.config import settings
 from app.data.context import get_broadcast
 from app.db.session import engine
 from sqlalchemy import text
@@ -24,14 +26,48 @@ def sync_push_user_stats_update_to_clients(user_ids: list[str], channel: str) ->
         logger.error(ex)
 
 
-async def push_user_stats_update_to_clients(user_ids: list[str], channel: str) -> None:
-    try:
-        broadcast = await get_broadcast()
+class StatsNotifier:
+    """
+    Coalesces the notifications of stats changes to clients per (user, channel) over `debounce_secs`, and sends all
+    those of a window in a single publish. Clients still get one "changed" signal per collection, just not one per
+    batch of events that touched it.
+    """
 
-        logger.info(f"Sending {channel} updates to client for {user_ids=}")
-        for user_id in user_ids:
-            logger.debug(f"Sending {channel} update to client for {user_id=}")
-            await publish_message(channel, None, broadcast, user_id=str(user_id))
-    except Exception:  # pylint: disable=W0703
-        logger.exception(f"Failed to publish changes to {channel} for {user_ids=}")
-        logger.error(broadcast)
+    def __init__(self, debounce_secs: float):
+        self.debounce_secs = debounce_secs
+        self._pending: set[tuple[str, str]] = set()
+        self._flush_task: asyncio.Task | None = None
+
+    def notify(self, user_ids: list[str], channel: str) -> None:
+        self._pending.update((channel, str(user_id)) for user_id in user_ids)
+        if self._pending and not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.debounce_secs)
+        # anything notified while flushing gets a new window
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        # an explicit flush sends everything, so the delayed one (if it isn't what's calling) has nothing left to do
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        logger.info(f"Sending {len(pending)} stats updates to clients")
+        try:
+            await publish_messages(sorted(pending), await get_broadcast())
+        except Exception:  # pylint: disable=W0703
+            logger.exception(f"Failed to publish {len(pending)} stats updates to clients")
+
+
+stats_notifier = StatsNotifier(settings.STATS_NOTIFY_DEBOUNCE_MS / 1000)
+
+
+async def push_user_stats_update_to_clients(user_ids: list[str], channel: str) -> None:
+    """Notify the clients of `user_ids` that their `channel` stats changed, within STATS_NOTIFY_DEBOUNCE_MS"""
+    logger.debug(f"Queueing {channel} updates to client for {user_ids=}")
+    stats_notifier.notify(user_ids, channel)
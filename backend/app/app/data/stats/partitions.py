@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.db.session import async_stats_session
+from app.models.stats import ContentModelRead, UserActivity
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# The append-only event tables are range partitioned by month of their event time (UTC), so reading a user's events
+# for a period only touches the partitions for that period, and retention is dropping whole partitions. Each table
+# also has a default partition, for events with times outside of those of the existing partitions.
+# table name -> (partition column, units of the column per second)
+PARTITIONED_EVENT_TABLES = {
+    UserActivity.__tablename__: ("activity_start", 1000),
+    ContentModelRead.__tablename__: ("read_at", 1),
+}
+PARTITION_MAINTENANCE_INTERVAL_SECS = 6 * 60 * 60
+
+PARTITION_NAME_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def add_months(month: datetime, nb_months: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + nb_months, 12)
+    return datetime(year, month_index + 1, 1, tzinfo=timezone.utc)
+
+
+def month_start(when: datetime) -> datetime:
+    return datetime(when.year, when.month, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_bounds(table: str, month: datetime) -> tuple[int, int]:
+    _column, scale = PARTITIONED_EVENT_TABLES[table]
+    return int(month.timestamp()) * scale, int(add_months(month, 1).timestamp()) * scale
+
+
+def create_partition_sql(table: str, month: datetime) -> str:
+    start, end = partition_bounds(table, month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ({start}) TO ({end})"
+    )
+
+
+def create_partition_statements(table: str, month: datetime) -> list[str]:
+    """
+    The statements to run in a single transaction to create the partition of `table` for `month`. Events for it
+    that were received before (from clients with their clock in the future) are in the default partition, which
+    postgres refuses to create a partition for, so they are moved to the new partition
+    """
+    column, _scale = PARTITIONED_EVENT_TABLES[table]
+    start, end = partition_bounds(table, month)
+    moved = f"{partition_name(table, month)}_moved"
+    return [
+        f"CREATE TEMPORARY TABLE {moved} (LIKE {table}) ON COMMIT DROP",
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= {start} AND {column} < {end} RETURNING *) "
+        f"INSERT INTO {moved} SELECT * FROM moved",
+        create_partition_sql(table, month),
+        f"INSERT INTO {table} SELECT * FROM {moved}",
+    ]
+
+
+def expired_partitions(table: str, partitions: list[str], now: datetime, retention_months: int) -> list[str]:
+    """The monthly `partitions` of `table` whose events are all older than `retention_months` (0 keeps everything)"""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(now), -retention_months)
+    expired = []
+    for name in partitions:
+        match = PARTITION_NAME_RE.search(name)
+        if name.startswith(f"{table}_") and match:
+            month = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+            if add_months(month, 1) <= cutoff:
+                expired.append(name)
+    return sorted(expired)
+
+
+async def _execute(session_maker, *statements: str) -> None:
+    # one transaction per change, so one failure doesn't prevent the rest of the maintenance
+    try:
+        async with session_maker() as db:
+            for sql in statements:
+                await db.execute(text(sql))
+            await db.commit()
+    except Exception:  # pylint: disable=W0703
+        # most likely another worker did it first
+        logger.exception(f"Failed to execute partition maintenance {statements=}")
+
+
+async def _partitions(session_maker, table: str) -> list[str]:
+    async with session_maker() as db:
+        result = await db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table"
+            ),
+            {"table": table},
+        )
+        return list(result.scalars())
+
+
+async def maintain_event_partitions(session_maker=async_stats_session, now: datetime | None = None) -> None:
+    """
+    Create the partitions of the event tables for this month and the next STATS_EVENTS_PARTITIONS_AHEAD months, and
+    drop those older than STATS_EVENTS_RETENTION_MONTHS
+    """
+    now = now or datetime.now(timezone.utc)
+    for table in PARTITIONED_EVENT_TABLES:
+        await _execute(session_maker, f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+        partitions = await _partitions(session_maker, table)
+        for i in range(settings.STATS_EVENTS_PARTITIONS_AHEAD + 1):
+            month = add_months(month_start(now), i)
+            # only for new partitions, as moving the events scans the default partition
+            if partition_name(table, month) not in partitions:
+                await _execute(session_maker, *create_partition_statements(table, month))
+
+        for name in expired_partitions(table, partitions, now, settings.STATS_EVENTS_RETENTION_MONTHS):
+            logger.info(f"Dropping the expired event partition {name}")
+            await _execute(session_maker, f"DROP TABLE IF EXISTS {name}")
+
+
+async def maintain_event_partitions_forever(session_maker=async_stats_session) -> None:
+    while True:
+        try:
+            await maintain_event_partitions(session_maker)
+        except Exception:  # pylint: disable=W0703
+            logger.exception("Failed to maintain the event partitions")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL_SECS)
@@ -1,3 +1,6 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from app.core.config import settings
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -21,6 +24,49 @@ async_session: sessionmaker = sessionmaker(
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_SYNC_URI), echo=False, future=True)
 
+
+class SessionPool:
+    """
+    Lends at most `size` sessions to concurrent tasks, opening them only when first needed, so that fanning out
+    over the sentences of a model can't check out more than `size` connections from the engine's pool.
+    Use as `async with SessionPool(n) as sessions: ... async with sessions.session() as db: ...`
+    """
+
+    def __init__(self, size: int, maker: sessionmaker = async_session):
+        self._maker = maker
+        self._available = asyncio.Semaphore(size)
+        self._idle: list[AsyncSession] = []
+        self._opened: list[AsyncSession] = []
+
+    @asynccontextmanager
+    async def session(self):
+        async with self._available:
+            if self._idle:
+                db = self._idle.pop()
+            else:
+                db = self._maker()
+                self._opened.append(db)
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            finally:
+                self._idle.append(db)
+
+    async def close(self):
+        for db in self._opened:
+            await db.close()
+        self._idle.clear()
+        self._opened.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
 async_stats_engine = create_async_engine(
     str(settings.STATS_SQLALCHEMY_DATABASE_URI),
     pool_pre_ping=True,
@@ -3,4 +3,4 @@
 # flake8: noqa
 # pylint: disable=W0611
 from app.db.base_class import StatsBase
-from app.models.stats import UserActivity, UserDay, UserWord
+from app.models.stats import ContentModelRead, UserActivity, UserDay, UserWord
@@ -1,29 +1,113 @@
+import importlib
 import logging
+import re
 
-from aiohttp_retry import ExponentialRetry, RetryClient
+from aiohttp_retry import ExponentialRetry
+from app.enrich.http_clients import backend_limiter, http_client
 from app.enrich.lemmatize import WordLemmatizer
 
 logger = logging.getLogger(__name__)
 
+# (suffix, replacement) of regular inflections, tried in order
+SUFFIX_RULES = (
+    ("ies", "y"),
+    ("ves", "f"),
+    ("ves", "fe"),
+    ("es", ""),
+    ("s", ""),
+    ("ied", "y"),
+    ("ed", ""),
+    ("ed", "e"),
+    ("ing", ""),
+    ("ing", "e"),
+    ("ier", "y"),
+    ("iest", "y"),
+    ("er", ""),
+    ("er", "e"),
+    ("est", ""),
+    ("est", "e"),
+)
+# suffixes that double a final consonant (stopped, running, bigger)
+DOUBLING_SUFFIXES = ("ed", "ing", "er", "est")
+# "es" is only a plural/3rd person ending after these (boxes, wishes, goes), elsewhere the e is the stem's (notes)
+ES_STEM_ENDINGS = ("s", "x", "z", "ch", "sh", "o")
+# a stem ending in a single vowel and consonant would have had it doubled (hopped), so when the stem with an e is also
+# a headword, that is the lemma (hoped -> hope, caring -> care), whereas singing is still sing
+SINGLE_FINAL_CONSONANT_RE = re.compile(r"[aeiou][^aeiouwxy]$")
+
 
 class HTTPCoreNLPLemmatizer(WordLemmatizer):
     # override Lemmatizer
     async def lemmatize(self, lword) -> set[str]:
-        max_attempts: int = (5,)
-        max_wait_between_attempts: int = (300,)
+        max_attempts: int = 5
+        max_wait_between_attempts: int = 300
 
         retry_options = ExponentialRetry(attempts=max_attempts, max_timeout=max_wait_between_attempts)
-        async with RetryClient(raise_for_status=False, retry_options=retry_options) as client:
-            logger.debug("Starting HTTPCoreNLPProvider aparse of: %s", lword)
-            params = {"properties": self._config["params"]}
-            async with client.post(self._config["base_url"], data=lword, params=params) as response:
-                response.raise_for_status()
-                logger.debug("Finished getting model from CoreNLP via http for lemmatisation")
-                sents = (await response.json()).get("sentences", [])
-                if not sents:
-                    raise Exception("No sentences in response")
-                else:
-                    return {sents[0]["tokens"][0]["lemma"]}
+        client = http_client(self._config["base_url"])
+        logger.debug("Starting HTTPCoreNLPProvider aparse of: %s", lword)
+        params = {"properties": self._config["params"]}
+        async with (
+            backend_limiter(self._config["base_url"]).slot(len(lword)),
+            client.post(self._config["base_url"], data=lword, params=params, retry_options=retry_options) as response,
+        ):
+            response.raise_for_status()
+            logger.debug("Finished getting model from CoreNLP via http for lemmatisation")
+            sents = (await response.json()).get("sentences", [])
+            if not sents:
+                raise Exception("No sentences in response")
+            else:
+                return {sents[0]["tokens"][0]["lemma"]}
+
+
+class RuleLemmatizer(WordLemmatizer):
+    """
+    In-process lemmatizer for en. Irregular forms are looked up in the inflections of the configured dictionary
+    (the EN_ZHHANS_ABCDictTranslator has them) and regular ones are found by stripping suffixes until what is left
+    is a headword of the dictionary. Words that can't be lemmatized are their own lemma.
+
+    Config: {"dictionary": {"classname": <PersistenceProvider>, "config": <its config>}}
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        module_name, class_name = config["dictionary"]["classname"].rsplit(".", 1)
+        provider = getattr(importlib.import_module(module_name), class_name)(
+            {**config["dictionary"]["config"], "inmem": True}
+        )
+        self._headwords: set[str] = set()
+        self._inflections: dict[str, str] = {}
+        for headword, entries in provider.dico.items():
+            headword = headword.lower()
+            self._headwords.add(headword)
+            for entry in entries:
+                for inflection in entry.get("infls", []):
+                    self._inflections.setdefault(inflection[0]["hw"].lower(), headword)
+        logger.info("Loaded %s headwords and %s inflections", len(self._headwords), len(self._inflections))
+
+    def _candidates(self, word: str):
+        for suffix, replacement in SUFFIX_RULES:
+            if word.endswith(suffix) and len(word) > len(suffix) + 1:
+                stem = word[: -len(suffix)]
+                if suffix == "es" and not stem.endswith(ES_STEM_ENDINGS):
+                    continue
+                yield stem + replacement
+                if not replacement and suffix in DOUBLING_SUFFIXES and len(stem) > 2 and stem[-1] == stem[-2]:
+                    yield stem[:-1]
+
+    # override Lemmatizer
+    async def lemmatize(self, lword) -> set[str]:
+        word = lword.lower()
+        if word in self._inflections:
+            return {self._inflections[word]}
+        if word in self._headwords:
+            return {word}
+        lemmas = [candidate for candidate in self._candidates(word) if candidate in self._headwords]
+        if not lemmas:
+            return {word}
+        lemma = lemmas[0]
+        if f"{lemma}e" in lemmas and SINGLE_FINAL_CONSONANT_RE.search(lemma):
+            lemma = f"{lemma}e"
+        return {lemma}
 
 
 # import spacy
@@ -15,11 +15,11 @@ from typing import TYPE_CHECKING
 from app.cache import TimeStampedDef
 from app.core.config import settings
 from app.data.models import DATA_JS_SUFFIX
-from app.db.session import async_session
+from app.db.session import SessionPool, async_session
 from app.enrich.transliterate import Transliterator
-from app.etypes import LANG_PAIR_SEPARATOR, AnyToken, Sentence
+from app.etypes import LANG_PAIR_SEPARATOR, AnyToken, Model, Sentence
 from app.models import AuthUser
-from app.ndutils import lemma, orig_text, to_enrich
+from app.ndutils import as_completed_with_concurrency, lemma, orig_text, to_enrich
 from bs4 import BeautifulSoup
 from jinja2 import Template
 from sqlalchemy.ext.asyncio.session import AsyncSession
@@ -284,6 +284,10 @@ class Enricher(ABC):
             available_def_providers,
         )
 
+        return {timestamp: self.aids_model(combined, clean)}
+
+    @staticmethod
+    def aids_model(combined, clean: bool = True):
         # Here we are still using the old way of generating which adds new properties in-place
         # so we split to multiple files
         aids_model = {"s": []}
@@ -306,8 +310,17 @@ class Enricher(ABC):
                 if "l1" in sentence:
                     new_sentence["l1"] = sentence["l1"]
                 aids_model["s"].append(new_sentence)
+        return aids_model
 
-        return {timestamp: aids_model}
+    def enrichable_lookups(self, slim_model) -> set[tuple[str, str]]:
+        """The `(orig_text, lemma)` of the tokens of a slim model that need definitions"""
+        model = slim_model["s"] if isinstance(slim_model, dict) else slim_model
+        return {
+            (orig_text(token), lemma(token))
+            for sentence in model
+            for token in sentence["t"]
+            if self.is_clean(token) and self.needs_enriching(token) and lemma(token)
+        }
 
     async def enrich_to_json(
         self,
@@ -326,17 +339,36 @@ class Enricher(ABC):
         model = {
             "s": await self.enrich_slim_model(
                 parsed_slim_model, manager, translate_sentence, best_guess, phone_type, fill_id, available_def_providers
-            )
+            ),
+            **_outer_whitespace(text),
         }
-        match = re.match(r"^\s+", text)
-        if match:
-            model["sws"] = match.group(0)
-        match = re.search(r"\s+$", text)
-        if match:
-            model["ews"] = match.group(0)
         model["id"] = time.time_ns()
         return model
 
+    async def enrich_to_json_stream(
+        self,
+        text: str,
+        manager: EnrichmentManager,
+        translate_sentence: bool,
+        best_guess: bool,
+        phone_type: TokenPhoneType,
+        fill_id: bool,
+        available_def_providers: list[str],
+    ):
+        """
+        As `enrich_to_json`, but yields the model a piece at a time: `{"i": <index>, "s": <sentence>}` for each
+        sentence as soon as it has been enriched, then the rest of the model (`sws`, `ews` and `id`)
+        """
+        logger.debug("Attempting to async stream enrich: '%s'", text)
+        ctext = self.clean_text(text)
+        raw_model = await manager.parser().parse(ctext)
+        parsed_slim_model = manager.enricher().slim_parse(raw_model)
+        async for index, sentence in self.enrich_slim_model_iter(
+            parsed_slim_model, manager, translate_sentence, best_guess, phone_type, fill_id, available_def_providers
+        ):
+            yield {"i": index, "s": sentence}
+        yield {**_outer_whitespace(text), "id": time.time_ns()}
+
     async def enrich_to_json_phat(
         self,
         text: str,
@@ -506,17 +538,80 @@ class Enricher(ABC):
     ):
         # FIXME: clean later
         model = slim_model["s"] if isinstance(slim_model, dict) else slim_model
-        return await asyncio.gather(
-            *[
-                self._enrich_slim_sentence(
-                    sentence, manager, translate_sentence, best_guess, phone_type, fill_id, available_def_providers
-                )
-                for sentence in model
-            ],
-        )
+
+        enriched = [None] * len(model)
+        async for index, sentence in self.enrich_slim_model_iter(
+            model, manager, translate_sentence, best_guess, phone_type, fill_id, available_def_providers, prefetch=True
+        ):
+            enriched[index] = sentence
+        return enriched
+
+    async def enrich_slim_model_iter(
+        self,
+        slim_model,
+        manager: EnrichmentManager,
+        translate_sentence: bool,
+        best_guess: bool,
+        phone_type: TokenPhoneType,
+        fill_id: bool,
+        available_def_providers: list[str],
+        prefetch: bool = False,
+    ):
+        """
+        Yields `(index, sentence)` for each sentence of the model as soon as it has been enriched. With `prefetch`,
+        the definitions missing from the cache are got for the whole model in one go before starting, which is the
+        fastest way to get the whole model, otherwise each sentence gets its own, so the first ones don't have to
+        wait for the rest
+        """
+        # FIXME: find out how to put this in the header without a circular dep
+        from app.enrich.models import cached_definitions_many, definitions_many  # pylint: disable=C0415
+
+        model = slim_model["s"] if isinstance(slim_model, dict) else slim_model
+
+        async def indexed(index, sentence_future):
+            return index, await sentence_future
+
+        tokens = [
+            token
+            for sentence in model
+            for token in sentence["t"]
+            if self.is_clean(token) and self.needs_enriching(token)
+        ]
+        # the sentences are done concurrently but share a few sessions, so a long chapter only ever holds
+        # ENRICH_MAX_SESSIONS_PER_MODEL connections, and most sentences need none at all
+        async with SessionPool(settings.ENRICH_MAX_SESSIONS_PER_MODEL) as sessions:
+            if prefetch:
+                # get (or create) the definitions for the whole model in one go, rather than a DB round-trip per token
+                async with sessions.session() as db:
+                    model_definitions = await definitions_many(db, manager, tokens)
+            else:
+                # only those already in memory, the sentences look up their own misses concurrently
+                model_definitions = cached_definitions_many(manager, tokens)
+            async for index, sentence in as_completed_with_concurrency(
+                len(model),
+                *[
+                    indexed(
+                        index,
+                        self._enrich_slim_sentence(
+                            sessions,
+                            sentence,
+                            manager,
+                            translate_sentence,
+                            best_guess,
+                            phone_type,
+                            fill_id,
+                            available_def_providers,
+                            model_definitions,
+                        ),
+                    )
+                    for index, sentence in enumerate(model)
+                ],
+            ):
+                yield index, sentence
 
     async def _enrich_slim_sentence(
         self,
+        sessions: SessionPool,
         sentence,
         manager: EnrichmentManager,
         translate_sentence: bool,
@@ -524,11 +619,26 @@ class Enricher(ABC):
         phone_type: TokenPhoneType,
         fill_id: bool,
         available_def_providers: list[str],
+        model_definitions: dict[tuple[str, str], dict[str, TimeStampedDef]] | None = None,
     ):
         # FIXME: find out how to put this in the header without a circular dep
         from app.enrich.models import definitions  # pylint: disable=C0415
 
-        async with async_session() as db:
+        model_definitions = model_definitions or {}
+        missing = [
+            token
+            for token in sentence["t"]
+            if self.is_clean(token)
+            and self.needs_enriching(token)
+            and not model_definitions.get((orig_text(token), lemma(token)))
+        ]
+        if phone_type != TokenPhoneType.DEEP and not translate_sentence and not missing:
+            # everything was got from the cache, or in one go for the model
+            return self.enrich_slim_tokens(
+                sentence, phone_type, best_guess, fill_id, available_def_providers, model_definitions
+            )
+
+        async with sessions.session() as db:
             if phone_type == TokenPhoneType.DEEP:
                 # transliterate the sentence as a whole - this will almost always hit the external API and
                 # the lift in accuracy is likely only for a few well known words - deep is definitely better
@@ -546,55 +656,106 @@ class Enricher(ABC):
                 # sentence["os"] = original_sentence  # used to be _cleaned_sentence
 
             logger.debug("Looking for tokens to translate in %s", sentence)
-            for token in sentence["t"]:
-                if not self.is_clean(token) or not self.needs_enriching(token):
-                    continue
+            if missing:
+                # the model's definitions are shared by all its sentences, so only this one's are added to a copy
+                model_definitions = dict(model_definitions)
+            for token in missing:
                 # calling definition also ensures the token is properly in the db, so is required
-                token_definitions = await definitions(db, manager, token)
-                token_definition = best_surface_def(token, token_definitions)
-                if fill_id:
-                    token["id"] = token_definition["id"]
-                    if len(token_definitions) > 1:
-                        token["oids"] = [
-                            def_id for _a, _b, def_id in token_definitions.values() if def_id != token["id"]
-                        ]
-                if phone_type == TokenPhoneType.DEFAULT:
-                    token["p"] = token_definition["p"].split()
-                if best_guess:
-                    # no longer used, as we have this info in the client
-                    # token["np"] = self.get_simple_pos(token)  # Normalised POS
-                    self._set_slim_best_guess(
-                        sentence, token, token_definitions, token_definition["p"], available_def_providers
-                    )
+                model_definitions[(orig_text(token), lemma(token))] = await definitions(db, manager, token)
+        return self.enrich_slim_tokens(
+            sentence, phone_type, best_guess, fill_id, available_def_providers, model_definitions
+        )
+
+    def enrich_slim_tokens(
+        self,
+        sentence,
+        phone_type: TokenPhoneType,
+        best_guess: bool,
+        fill_id: bool,
+        available_def_providers: list[str],
+        model_definitions: dict[tuple[str, str], dict[str, TimeStampedDef]],
+    ):
+        """
+        Add the definition ids, phones and best guesses to the tokens of a slim sentence from the definitions that
+        have already been got for them. This is pure CPU (mostly decoding the definitions), so can be run in a
+        worker process
+        """
+        for token in sentence["t"]:
+            if not self.is_clean(token) or not self.needs_enriching(token):
+                continue
+            token_definitions = model_definitions[(orig_text(token), lemma(token))]
+            token_definition = best_surface_def(token, token_definitions)
+            if fill_id:
+                token["id"] = token_definition["id"]
+                if len(token_definitions) > 1:
+                    token["oids"] = [def_id for _a, _b, def_id in token_definitions.values() if def_id != token["id"]]
+            if phone_type == TokenPhoneType.DEFAULT:
+                token["p"] = token_definition["p"].split()
+            if best_guess:
+                # no longer used, as we have this info in the client
+                # token["np"] = self.get_simple_pos(token)  # Normalised POS
+                self._set_slim_best_guess(
+                    sentence, token, token_definitions, token_definition["p"], available_def_providers
+                )
         return sentence
 
 
-async def enrich_html_fragment(xhtml, manager: EnrichmentManager):
-    soup = BeautifulSoup(xhtml, "html.parser")  # it appears only html.parser doesn't fail when there are BOM :-(
-    text_nodes = soup.find_all(text=True)
-    slim_models = {}
+def _outer_whitespace(text: str) -> dict:
+    whitespace = {}
+    match = re.match(r"^\s+", text)
+    if match:
+        whitespace["sws"] = match.group(0)
+    match = re.search(r"\s+$", text)
+    if match:
+        whitespace["ews"] = match.group(0)
+    return whitespace
+
+
+def _slim_fragment_model(text: str, parse: Model, manager: EnrichmentManager) -> dict:
+    return {"s": manager.enricher().slim_parse(parse), **_outer_whitespace(text)}
+
+
+def _fragment_ids(count: int) -> list[int]:
+    # the ids are nanosecond timestamps, which must stay unique when a batch of fragments is built in one go
+    ids = []
+    last = 0
+    for _ in range(count):
+        last = max(time.time_ns(), last + 1)
+        ids.append(last)
+    return ids
+
+
+async def _enrich_text_nodes(soup, text_nodes, manager: EnrichmentManager, log_key: str = None):
+    """
+    Replace the text nodes that need enriching with enriched-text-fragment tags, parsing all their texts in as few
+    requests to the parser as possible, and return the slim models by fragment id
+    """
+    to_parse = []
     for text_node in text_nodes:
         text = manager.enricher().clean_text(str(text_node))
         if not re.search(r"\S+", text) or not to_enrich(text, manager.from_lang):
             continue
+        to_parse.append((text_node, text))
 
-        parse = await manager.parser().parse(text)
-        parsed_slim_model = {"s": manager.enricher().slim_parse(parse)}
+    if log_key:
+        logger.debug(f"Starting parse for {log_key}: {len(to_parse)} fragments")
+    parses = await manager.parser().parse_many([text for _node, text in to_parse])
 
-        match = re.match(r"^\s+", text)
-        if match:
-            parsed_slim_model["sws"] = match.group(0)
-        match = re.search(r"\s+$", text)
-        if match:
-            parsed_slim_model["ews"] = match.group(0)
-
-        timestamp = time.time_ns()
+    slim_models = {}
+    for (text_node, text), parse, timestamp in zip(to_parse, parses, _fragment_ids(len(to_parse))):
         text_fragment = soup.new_tag("enriched-text-fragment")
         text_fragment["id"] = timestamp
         text_fragment.string = text
-        slim_models[timestamp] = parsed_slim_model
+        slim_models[timestamp] = _slim_fragment_model(text, parse, manager)
         text_node.replace_with(text_fragment)
 
+    return slim_models
+
+
+async def enrich_html_fragment(xhtml, manager: EnrichmentManager):
+    soup = BeautifulSoup(xhtml, "html.parser")  # it appears only html.parser doesn't fail when there are BOM :-(
+    slim_models = await _enrich_text_nodes(soup, soup.find_all(text=True), manager)
+
     return str(soup), slim_models
 
 
@@ -608,60 +769,37 @@ async def enrich_html_to_html(chapter_id, xhtml, manager: EnrichmentManager):
     data_json["src"] = f"{os.path.basename(chapter_id)}{DATA_JS_SUFFIX}"
     soup.head.append(data_json)
 
-    text_nodes = soup.body.find_all(text=True)
-    slim_models = {}
-    for text_node in text_nodes:
-        text = manager.enricher().clean_text(str(text_node))
-
-        if not re.search(r"\S+", text) or not to_enrich(text, manager.from_lang):
-            continue
-
-        logger.debug(f"Starting parse for {chapter_id}: {text[:100]}")
-        parse = await manager.parser().parse(text)
-        parsed_slim_model = {"s": manager.enricher().slim_parse(parse)}
-
-        match = re.match(r"^\s+", text)
-        if match:
-            parsed_slim_model["sws"] = match.group(0)
-        match = re.search(r"\s+$", text)
-        if match:
-            parsed_slim_model["ews"] = match.group(0)
-
-        timestamp = time.time_ns()
-        text_fragment = soup.new_tag("enriched-text-fragment")
-        text_fragment["id"] = timestamp
-        text_fragment.string = text
-        slim_models[timestamp] = parsed_slim_model
-        text_node.replace_with(text_fragment)
+    slim_models = await _enrich_text_nodes(soup, soup.body.find_all(text=True), manager, chapter_id)
 
     return chapter_id, str(soup), slim_models
 
 
 async def enrich_plain_to_html(unique_key, start_text, manager: EnrichmentManager, force_parse: bool = False):
-    lines = ""
     slim_models = {}
     text_node = manager.enricher().clean_text(str(start_text))
 
+    line_texts = []
+    to_parse = []
     for raw_line in text_node.splitlines():
         text = "".join(c for c in raw_line.strip() if c.isprintable())
+        if re.search(r"\S+", text) and (to_enrich(text, manager.from_lang) or force_parse):
+            to_parse.append(text)
+        line_texts.append(text)
+
+    logger.debug(f"Starting parse for {unique_key}: {len(to_parse)} lines")
+    parses = iter(await manager.parser().parse_many(to_parse))
+    timestamps = iter(_fragment_ids(len(to_parse)))
+
+    lines = ""
+    for text in line_texts:
         if not re.search(r"\S+", text):
             template_string = text.strip()
         elif not to_enrich(text, manager.from_lang) and not force_parse:
             template_string = text.strip()
         else:
-            logger.debug(f"Starting parse for {unique_key}: {text[:100]}")
-            parsed_slim_model = {"s": manager.enricher().slim_parse(await manager.parser().parse(text))}
-
-            match = re.match(r"^\s+", text)
-            if match:
-                parsed_slim_model["sws"] = match.group(0)
-            match = re.search(r"\s+$", text)
-            if match:
-                parsed_slim_model["ews"] = match.group(0)
-
-            timestamp = time.time_ns()
+            timestamp = next(timestamps)
             template_string = f"<enriched-text-fragment id='{timestamp}'>{text}</enriched-text-fragment>"
-            slim_models[timestamp] = parsed_slim_model
+            slim_models[timestamp] = _slim_fragment_model(text, next(parses), manager)
 
         lines += f"<br>{template_string}" if (lines and text.startswith("-")) else template_string  # + "&nbsp;"
 
@@ -7,7 +7,8 @@ import uuid
 from abc import ABC
 
 import aiohttp
-from aiohttp_retry import ExponentialRetry, RetryClient
+from aiohttp_retry import ExponentialRetry
+from app.enrich.http_clients import backend_limiter, http_client
 
 URL_SCHEME = "https://"
 
@@ -46,30 +47,32 @@ class BingAPI(ABC):
         }
         # the max_timeout option is horribly named, it is the wait between attempts, not timeout at all...
         retry_options = ExponentialRetry(attempts=max_attempts, max_timeout=max_wait_between_attempts)
+        client = http_client(self._api_host)
         conn_retries = 5
         while True:
-            async with RetryClient(
-                raise_for_status=True,
-                retry_options=retry_options,
-                connector=aiohttp.TCPConnector(enable_cleanup_closed=True, force_close=True),
-            ) as client:
-                try:
-                    logger.info(f"Bing API request {path=} {content=}")
-                    async with client.post(
+            try:
+                logger.info(f"Bing API request {path=} {content=}")
+                async with (
+                    backend_limiter(self._api_host).slot(len(content)),
+                    client.post(
                         f"{URL_SCHEME}{self._api_host}{path}",
                         data=req_json.encode("utf-8"),
                         params=params,
                         headers=headers,
-                    ) as response:
-                        text = await response.text()
-                        logger.debug("Received '%s' back from Bing", text[:100])
-                        return text
-                except aiohttp.client_exceptions.ClientOSError as ex:
-                    logger.error("Failure to send to Bing API with ClientOSError: %s", content)
-                    logger.exception(ex)
-                    conn_retries -= 1
-                    if conn_retries <= 0:
-                        raise
-                except aiohttp.client_exceptions.ClientConnectorError:
-                    logger.error("Failure to send to Bing API: %s", content)
+                        retry_options=retry_options,
+                        raise_for_status=True,
+                    ) as response,
+                ):
+                    text = await response.text()
+                    logger.debug("Received '%s' back from Bing", text[:100])
+                    return text
+            except aiohttp.client_exceptions.ClientOSError as ex:
+                # can happen when a pooled connection has been closed by the server, the retry gets a new one
+                logger.error("Failure to send to Bing API with ClientOSError: %s", content)
+                logger.exception(ex)
+                conn_retries -= 1
+                if conn_retries <= 0:
                     raise
+            except aiohttp.client_exceptions.ClientConnectorError:
+                logger.error("Failure to send to Bing API: %s", content)
+                raise
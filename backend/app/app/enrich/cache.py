@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import base64
 import contextlib
 import datetime
-import gc
 import json  # import orjson as json
 import logging
 import os
@@ -22,10 +22,12 @@ from app.data.filter import filter_cards, filter_day_model_stats, filter_standar
 from app.db.session import async_session
 from app.enrich import hanzi_json_local_paths, lang_prefix, latest_character_json_dir_path
 from app.enrich.data import managers
+from app.enrich.db_chunks import write_chunks
 from app.enrich.models import definitions, ensure_cache_preloaded
 from app.enrich.sqlite_definitions import (
     CARDS_CREATE,
     CARDS_INDEX_WORD_ID_CARD_TYPE_UPDATED_AT,
+    CARDS_INDEX_WORD_ID_CARD_TYPE_UPDATED_AT_DROP,
     CARDS_INSERT,
     CHARACTERS_CREATE,
     CHARACTERS_INSERT,
@@ -41,6 +43,7 @@ from app.enrich.sqlite_definitions import (
     FREE_QUESTONS_INSERT,
     IMPORT_WORDS_CREATE,
     IMPORT_WORDS_INDEX_ID,
+    IMPORT_WORDS_INDEX_ID_DROP,
     IMPORT_WORDS_INSERT,
     IMPORTS_CREATE,
     IMPORTS_INSERT,
@@ -58,6 +61,7 @@ from app.enrich.sqlite_definitions import (
     WORDLISTS_CREATE,
     WORDLISTS_INSERT,
 )
+from app.enrich.sqlite_writer import SqliteWriter
 from app.etypes import LANG_PAIR_SEPARATOR
 from app.models.lookups import BingApiLookup
 from app.models.mixins import ActivatorMixin
@@ -72,8 +76,10 @@ from .lzstring import LZString
 logger = logging.getLogger(__name__)
 
 FLUSH_BUFFER_SIZE = 30000
+DEFINITIONS_YIELD_PER = 5000
 SQLITE_FILENAME = "tc.db"
 SQLITE_FILENAME_SQL = "tc.sql"
+PERSONAL_DB_MANIFEST_FILENAME = f"{SQLITE_FILENAME}.manifest.json"
 
 
 async def all_cached_definitions(db: AsyncSession, from_lang: str, to_lang: str) -> List[models.CachedDefinition]:
@@ -165,7 +171,7 @@ def flatten(matrix):
     return flat_list
 
 
-async def fill_sqlite_userlists(db: AsyncSession, con, user_id: int, from_lang: str) -> bool:
+async def fill_sqlite_userlists(db: AsyncSession, con: SqliteWriter, user_id: int, from_lang: str) -> bool:
     stmt = (
         select(models.UserListWord, models.UserList)
         .join(models.UserList)
@@ -203,12 +209,12 @@ async def fill_sqlite_userlists(db: AsyncSession, con, user_id: int, from_lang:
             )
         )
         if i >= FLUSH_BUFFER_SIZE:
-            con.executemany(LIST_WORDS_INSERT, buffer)
+            await con.executemany(LIST_WORDS_INSERT, buffer)
             buffer = []
             i = 0
         i += 1
     if len(buffer) > 0:
-        con.executemany(LIST_WORDS_INSERT, buffer)
+        await con.executemany(LIST_WORDS_INSERT, buffer)
         buffer = []
 
     for v in all_user_lists.values():
@@ -220,10 +226,10 @@ async def fill_sqlite_userlists(db: AsyncSession, con, user_id: int, from_lang:
                 v.updated_at.timestamp(),
             )
         )
-    con.executemany(WORDLISTS_INSERT, buffer)
+    await con.executemany(WORDLISTS_INSERT, buffer)
 
 
-async def fill_sqlite_imports(db: AsyncSession, con: sqlite3.Connection, user_id: int, lang_pair: str) -> bool:
+async def fill_sqlite_imports(db: AsyncSession, con: SqliteWriter, user_id: int, lang_pair: str) -> bool:
     from_lang = get_from_lang(lang_pair)
     to_lang = get_to_lang(lang_pair)
 
@@ -258,18 +264,18 @@ async def fill_sqlite_imports(db: AsyncSession, con: sqlite3.Connection, user_id
             continue
         buffer.append(v)
         if i >= FLUSH_BUFFER_SIZE:
-            con.executemany(IMPORT_WORDS_INSERT, buffer)
+            await con.executemany(IMPORT_WORDS_INSERT, buffer)
             buffer = []
             i = 0
         i += 1
     if len(buffer) > 0:
-        con.executemany(IMPORT_WORDS_INSERT, buffer)
+        await con.executemany(IMPORT_WORDS_INSERT, buffer)
         buffer = []
 
-    con.executemany(IMPORTS_INSERT, import_sentences)
+    await con.executemany(IMPORTS_INSERT, import_sentences)
 
 
-async def fill_sqlite_stats(con: sqlite3.Connection, user_id: int, lang_pair: str) -> bool:
+async def fill_sqlite_stats(con: SqliteWriter, user_id: int, lang_pair: str) -> bool:
     buffer = []
     wstats = []
     for w in await filter_word_model_stats(user_id, lang_pair, -1):
@@ -291,12 +297,12 @@ async def fill_sqlite_stats(con: sqlite3.Connection, user_id: int, lang_pair: st
     for v in wstats:
         buffer.append(v)
         if i >= FLUSH_BUFFER_SIZE:
-            con.executemany(WORD_MODEL_STATS_INSERT, buffer)
+            await con.executemany(WORD_MODEL_STATS_INSERT, buffer)
             buffer = []
             i = 0
         i += 1
     if len(buffer) > 0:
-        con.executemany(WORD_MODEL_STATS_INSERT, buffer)
+        await con.executemany(WORD_MODEL_STATS_INSERT, buffer)
         buffer = []
 
     day_model_stats = await filter_day_model_stats(user_id, 10000000)  # unlimited
@@ -313,12 +319,12 @@ async def fill_sqlite_stats(con: sqlite3.Connection, user_id: int, lang_pair: st
             )
         )
         if i >= FLUSH_BUFFER_SIZE:
-            con.executemany(DAY_MODEL_STATS_INSERT, buffer)
+            await con.executemany(DAY_MODEL_STATS_INSERT, buffer)
             buffer = []
             i = 0
         i += 1
     if len(buffer) > 0:
-        con.executemany(DAY_MODEL_STATS_INSERT, buffer)
+        await con.executemany(DAY_MODEL_STATS_INSERT, buffer)
         buffer = []
 
 
@@ -367,7 +373,7 @@ def cards_to_sqlite3(cards):
     return cards_buffer
 
 
-async def fill_sqlite_content_questions(db: AsyncSession, con: sqlite3.Connection, user_id: int) -> bool:
+async def fill_sqlite_content_questions(db: AsyncSession, con: SqliteWriter, user_id: int) -> bool:
     buffer = []
     content_questions = (
         await filter_standard(
@@ -389,10 +395,10 @@ async def fill_sqlite_content_questions(db: AsyncSession, con: sqlite3.Connectio
             )
         )
     if len(buffer) > 0:
-        con.executemany(CONTENT_QUESTONS_INSERT, buffer)
+        await con.executemany(CONTENT_QUESTONS_INSERT, buffer)
 
 
-async def fill_sqlite_questions(db: AsyncSession, con: sqlite3.Connection, user_id: int) -> bool:
+async def fill_sqlite_questions(db: AsyncSession, con: SqliteWriter, user_id: int) -> bool:
     buffer = []
     free_questions = (
         await filter_standard(
@@ -415,10 +421,10 @@ async def fill_sqlite_questions(db: AsyncSession, con: sqlite3.Connection, user_
             )
         )
     if len(buffer) > 0:
-        con.executemany(QUESTONS_INSERT, buffer)
+        await con.executemany(QUESTONS_INSERT, buffer)
 
 
-async def fill_sqlite_free_questions(db: AsyncSession, con: sqlite3.Connection, user_id: int) -> bool:
+async def fill_sqlite_free_questions(db: AsyncSession, con: SqliteWriter, user_id: int) -> bool:
     buffer = []
     free_questions = (
         await filter_standard(
@@ -438,17 +444,16 @@ async def fill_sqlite_free_questions(db: AsyncSession, con: sqlite3.Connection,
             )
         )
     if len(buffer) > 0:
-        con.executemany(FREE_QUESTONS_INSERT, buffer)
+        await con.executemany(FREE_QUESTONS_INSERT, buffer)
 
 
-async def fill_sqlite_cards(db: AsyncSession, con: sqlite3.Connection, user_id: int) -> bool:
+async def fill_sqlite_cards(db: AsyncSession, con: SqliteWriter, user_id: int) -> bool:
     cards = await filter_cards(db, user_id, 1000000)
     cards_buffer = cards_to_sqlite3(cards)
-    con.executemany(CARDS_INSERT, cards_buffer)
-    con.execute(CARDS_INDEX_WORD_ID_CARD_TYPE_UPDATED_AT)
+    await con.executemany(CARDS_INSERT, cards_buffer)
 
 
-async def fill_sqlite_userdictionaries(db: AsyncSession, user_id: int, con: sqlite3.Connection) -> bool:
+async def fill_sqlite_userdictionaries(db: AsyncSession, user_id: int, con: SqliteWriter) -> bool:
     buffer = []
     userdictionaries = (
         await filter_standard(
@@ -491,41 +496,55 @@ async def fill_sqlite_userdictionaries(db: AsyncSession, user_id: int, con: sqli
                 )
             )
             if i >= FLUSH_BUFFER_SIZE:
-                con.executemany(USER_DEFINITIONS_INSERT, buffer)
+                await con.executemany(USER_DEFINITIONS_INSERT, buffer)
                 buffer = []
                 i = 0
             i += 1
     if len(buffer) > 0:
-        con.executemany(USER_DEFINITIONS_INSERT, buffer)
+        await con.executemany(USER_DEFINITIONS_INSERT, buffer)
 
     # now fill userdictionaries table
     if len(udvals) > 0:
-        con.executemany(USERDICTIONARIES_INSERT, udvals)
+        await con.executemany(USERDICTIONARIES_INSERT, udvals)
 
 
 async def regenerate_personal_db(base_db_path: str, user_id: int, lang_pair: str) -> str:  # pylint: disable=R0914
     from_lang = get_from_lang(lang_pair)
     logger.info("Filling sqlite3 db with personal values for %s", user_id)
-    async with async_session() as db:
-        tmpdirpath = tempfile.mkdtemp()
+
+    tmpdirpath = tempfile.mkdtemp()
+    try:
         tmpsqldb = os.path.join(tmpdirpath, SQLITE_FILENAME)
-        shutil.copyfile(base_db_path, tmpsqldb)
-        con = sqlite3.connect(tmpsqldb)
-
-        await fill_sqlite_userdictionaries(db, user_id, con)
-        await fill_sqlite_userlists(db, con, user_id, from_lang)
-        await fill_sqlite_imports(db, con, user_id, lang_pair)
-        await fill_sqlite_stats(con, user_id, lang_pair)
-        # await fill_sqlite_surveys(db, con, lang_pair)
-        await fill_sqlite_cards(db, con, user_id)
-        await fill_sqlite_content_questions(db, con, user_id)
-        await fill_sqlite_free_questions(db, con, user_id)
-        await fill_sqlite_questions(db, con, user_id)
-        # FIXME: missing the student_* tables
-        # FIXME: missing the persons table
-
-        con.execute(IMPORT_WORDS_INDEX_ID)
-        con.commit()
+        await asyncio.to_thread(shutil.copyfile, base_db_path, tmpsqldb)
+        con = SqliteWriter(tmpsqldb)
+
+        async def in_session(filler):
+            async with async_session() as db:
+                await filler(db)
+
+        try:
+            # the indexes are built once all the rows are in
+            await con.execute(IMPORT_WORDS_INDEX_ID_DROP)
+            await con.execute(CARDS_INDEX_WORD_ID_CARD_TYPE_UPDATED_AT_DROP)
+            # each filler fetches on its own session, and they all feed the same sqlite writer thread
+            await asyncio.gather(
+                in_session(lambda db: fill_sqlite_userdictionaries(db, user_id, con)),
+                in_session(lambda db: fill_sqlite_userlists(db, con, user_id, from_lang)),
+                in_session(lambda db: fill_sqlite_imports(db, con, user_id, lang_pair)),
+                fill_sqlite_stats(con, user_id, lang_pair),
+                # in_session(lambda db: fill_sqlite_surveys(db, con, lang_pair)),
+                in_session(lambda db: fill_sqlite_cards(db, con, user_id)),
+                in_session(lambda db: fill_sqlite_content_questions(db, con, user_id)),
+                in_session(lambda db: fill_sqlite_free_questions(db, con, user_id)),
+                in_session(lambda db: fill_sqlite_questions(db, con, user_id)),
+            )
+            # FIXME: missing the student_* tables
+            # FIXME: missing the persons table
+
+            await con.execute(IMPORT_WORDS_INDEX_ID)
+            await con.execute(CARDS_INDEX_WORD_ID_CARD_TYPE_UPDATED_AT)
+        finally:
+            await con.close()
 
         destdir = absolute_resources_path(user_id, SQLITE_FILENAME)
         with contextlib.suppress(FileNotFoundError, IsADirectoryError):
@@ -533,36 +552,26 @@ async def regenerate_personal_db(base_db_path: str, user_id: int, lang_pair: str
         shutil.rmtree(destdir, ignore_errors=True)
         pathlib.Path(destdir).mkdir(parents=True, exist_ok=True)
 
-        # tmpsqldb_sql = os.path.join(destdir, SQLITE_FILENAME_SQL)
-        # with open(tmpsqldb_sql, "w") as f:
-        #     for line in con.iterdump():
-        #         f.write("%s\n" % line)
+        # the chunks are shared between all users, and mostly with the base db, so only the manifest is personal
+        pathlib.Path(settings.DB_CHUNKS_DIR).mkdir(parents=True, exist_ok=True)
+        chunk_names = await asyncio.to_thread(write_chunks, tmpsqldb, settings.DB_CHUNKS_DIR)
+        tmpmanifest = os.path.join(destdir, f"{PERSONAL_DB_MANIFEST_FILENAME}.tmp")
+        with open(tmpmanifest, "w", encoding="utf8") as manifest_file:
+            json.dump(chunk_names, manifest_file)
+        os.replace(tmpmanifest, os.path.join(destdir, PERSONAL_DB_MANIFEST_FILENAME))
+    finally:
+        shutil.rmtree(tmpdirpath, ignore_errors=True)
+    return True
 
-        con.close()
-        await db.close()
 
-        CHUNK_SIZE = 10_485_760  # 32768*320 this will get compressed over the wire, so isn't really ~10MB
-        file_number = 0
-        with open(tmpsqldb, "rb") as f:
-            chunk = f.read(CHUNK_SIZE)
-            while chunk:
-                with open(
-                    os.path.join(destdir, f"{SQLITE_FILENAME}.{str(file_number).zfill(4)}.part"), "wb"
-                ) as chunk_file:
-                    chunk_file.write(chunk)
-                file_number += 1
-                chunk = f.read(CHUNK_SIZE)
-        # shutil.move(tmpsqldb, os.path.join(destdir, SQLITE_FILENAME))
-        shutil.rmtree(tmpdirpath, ignore_errors=True)
+def fallback_only_translations(provider_translations: list[dict]) -> bool:
+    for pt in provider_translations:
+        if pt["provider"] != "fbk" and len(pt["posTranslations"]) > 0:
+            return False
     return True
 
 
 def def_dict_to_sqlite3(adef: dict) -> None:
-    fallback_only = True
-    for pt in adef["providerTranslations"]:
-        if pt["provider"] != "fbk" and len(pt["posTranslations"]) > 0:
-            fallback_only = False
-            break
     return (
         adef["id"],
         adef["graph"],
@@ -574,61 +583,91 @@ def def_dict_to_sqlite3(adef: dict) -> None:
         adef["frequency"].get("pos", None),
         adef["frequency"].get("posFreq", None),
         json.dumps(adef["hsk"]) if adef["hsk"] else None,
-        fallback_only,
+        fallback_only_translations(adef["providerTranslations"]),
         adef["updatedAt"],
     )
 
 
-async def fill_sqlite_definitions(
-    db: AsyncSession, con: sqlite3.Connection, providers: list[str], from_lang: str, to_lang: str
-) -> bool:
-    # FIXME: the DefinitionSet DEFINITELY shouldn't be in the graphql module...
-    from app.api.api_v1.graphql import Definitions  # pylint: disable=C0415
+def def_dict_to_sqlite3_orderings(adef: dict, orderings: list[list[str]]) -> list[tuple]:
+    """
+    The `def_dict_to_sqlite3` values for each of the provider `orderings`, in the same order. `adef` must have been
+    created with (at least) all the providers present in `orderings`, as only the provider translations differ
+    between orderings, and the other columns are only serialised once
+    """
+    common = def_dict_to_sqlite3({**adef, "providerTranslations": []})
+    by_provider = {pt["provider"]: pt for pt in adef["providerTranslations"]}
+    rows = []
+    for providers in orderings:
+        provider_translations = [by_provider[p] for p in providers if p in by_provider]
+        rows.append(
+            common[:4]
+            + (json.dumps(provider_translations),)
+            + common[5:10]
+            + (fallback_only_translations(provider_translations),)
+            + common[11:]
+        )
+    return rows
 
-    # WARNING Do NOT delete - memory will explode otherwise
-    gc.collect()
 
-    buffer = []
-    stmt = (
-        select(models.CachedDefinition)
-        .filter_by(from_lang=from_lang, to_lang=to_lang)
+def definitions_export_select(from_lang: str, to_lang: str):
+    # only the columns Definitions.from_model needs, streamed with a server-side cursor, so that the exports
+    # use a constant amount of memory however many definitions there are
+    return (
+        select(
+            models.CachedDefinition.word_id,
+            models.CachedDefinition.source_text,
+            models.CachedDefinition.cached_date,
+            models.CachedDefinition.response_json,
+        )
+        .where(models.CachedDefinition.from_lang == from_lang, models.CachedDefinition.to_lang == to_lang)
         .order_by("cached_date", "word_id")
+        .execution_options(yield_per=DEFINITIONS_YIELD_PER)
     )
-    result = await db.execute(stmt)
-    file_cached_definitions = result.scalars().all()
-
-    export = [Definitions.from_model_asdict(ds, providers) for ds in file_cached_definitions]
-    if len(export) == 0:  # don't create empty files
-        return
-    logger.info("Loaded all definitions for %s, flushing to files", providers)
 
-    last_new_definition = export[-1]
-    ua = last_new_definition["updatedAt"]
-    wid = last_new_definition["id"]
-    provs = "-".join(providers)
-    outfile_dir = f"{lang_prefix(f'{from_lang}{LANG_PAIR_SEPARATOR}{to_lang}')}db-{ua}-{wid}-{provs}_sqlite"
 
-    new_files_dir_path = os.path.join(
-        settings.DB_CACHE_DIR,
-        outfile_dir,
-    )
+async def fill_sqlite_definitions(
+    db: AsyncSession, cons: dict[str, sqlite3.Connection], from_lang: str, to_lang: str
+) -> dict[str, str]:
+    """
+    Fill the definitions table of each of the `cons`, keyed by comma-separated provider ordering, with a single
+    scan of the definitions, and return the directory each of the dbs should be published to
+    """
+    # FIXME: the DefinitionSet DEFINITELY shouldn't be in the graphql module...
+    from app.api.api_v1.graphql import Definitions  # pylint: disable=C0415
 
-    buffer = []
-    i = 0
-    for adef in export:
-        buffer.append(def_dict_to_sqlite3(adef))
-        if i >= FLUSH_BUFFER_SIZE:
+    orderings = [tc.split(",") for tc in cons]
+    all_providers = list(dict.fromkeys(p for providers in orderings for p in providers))
+    buffers = [[] for _ in orderings]
+    last_new_definition = None
+    result = await db.stream(definitions_export_select(from_lang, to_lang))
+    async for cached_definition in result:
+        last_new_definition = Definitions.from_model_asdict(cached_definition, all_providers, cache=False)
+        for buffer, row in zip(buffers, def_dict_to_sqlite3_orderings(last_new_definition, orderings)):
+            buffer.append(row)
+        if len(buffers[0]) >= FLUSH_BUFFER_SIZE:
+            for con, buffer in zip(cons.values(), buffers):
+                con.executemany(DEFINITIONS_INSERT, buffer)
+            buffers = [[] for _ in orderings]
+    if len(buffers[0]) > 0:
+        for con, buffer in zip(cons.values(), buffers):
             con.executemany(DEFINITIONS_INSERT, buffer)
-            buffer = []
-            i = 0
-        i += 1
-    if len(buffer) > 0:
-        con.executemany(DEFINITIONS_INSERT, buffer)
 
-    con.execute(DEFINITIONS_INDEX_ID_GRAPH)
-    con.execute(DEFINITIONS_INDEX_ID_UPDATED_AT)
+    if last_new_definition is None:  # don't create empty files
+        return {}
+    logger.info("Flushed all definitions for %s to the sqlite dbs", list(cons))
+
+    ua = last_new_definition["updatedAt"]
+    wid = last_new_definition["id"]
+    new_files_dir_paths = {}
+    for tc, con in cons.items():
+        provs = "-".join(tc.split(","))
+        outfile_dir = f"{lang_prefix(f'{from_lang}{LANG_PAIR_SEPARATOR}{to_lang}')}db-{ua}-{wid}-{provs}_sqlite"
+        new_files_dir_paths[tc] = os.path.join(settings.DB_CACHE_DIR, outfile_dir)
+
+        con.execute(DEFINITIONS_INDEX_ID_GRAPH)
+        con.execute(DEFINITIONS_INDEX_ID_UPDATED_AT)
 
-    return new_files_dir_path
+    return new_files_dir_paths
 
 
 async def fill_sqlite_characters(con: sqlite3.Connection) -> bool:
@@ -668,17 +707,21 @@ async def regenerate_sqlite(from_lang: str = "zh-Hans", to_lang: str = "en") ->
     async with async_session() as db:
         result = await db.execute(select(distinct(AuthUser.dictionary_ordering)))
 
+        # all the orderings are filled from a single scan of the definitions, they only differ by which providers
+        # end up in the provider translations
+        tmppaths = {}
+        cons = {}
         for tc in result.scalars().all():
-            providers = tc.split(",")
-            tmppath = tempfile.mkdtemp(dir=settings.DB_CACHE_DIR)
-            tmpsqldb = os.path.join(tmppath, SQLITE_FILENAME)
-            con = sqlite3.connect(tmpsqldb)
+            tmppaths[tc] = tempfile.mkdtemp(dir=settings.DB_CACHE_DIR)
+            con = sqlite3.connect(os.path.join(tmppaths[tc], SQLITE_FILENAME))
             con.execute("PRAGMA page_size=32768;")
             con.execute("VACUUM;")
             con.commit()
             con.execute(DEFINITIONS_CREATE)
-            new_files_dir_path = await fill_sqlite_definitions(db, con, providers, from_lang, to_lang)
+            cons[tc] = con
+        new_files_dir_paths = await fill_sqlite_definitions(db, cons, from_lang, to_lang)
 
+        for tc, con in cons.items():
             con.execute(CHARACTERS_CREATE)
             if (from_lang, to_lang) == ("zh-Hans", "en"):
                 await fill_sqlite_characters(con)
@@ -706,13 +749,17 @@ async def regenerate_sqlite(from_lang: str = "zh-Hans", to_lang: str = "en") ->
 
             con.commit()
             con.close()
+            new_files_dir_path = new_files_dir_paths.get(tc)
+            if not new_files_dir_path:  # no definitions for the pair, don't publish empty dbs
+                shutil.rmtree(tmppaths[tc], ignore_errors=True)
+                continue
             shutil.rmtree(new_files_dir_path, ignore_errors=True)
-            shutil.move(tmppath, new_files_dir_path)
+            shutil.move(tmppaths[tc], new_files_dir_path)
 
             logger.info(
                 "Flushed all definitions for %s to file %s",
-                from_lang,
-                providers,
+                tc,
+                new_files_dir_path,
             )
         await db.close()
     return True
@@ -732,26 +779,30 @@ async def regenerate_definitions_jsons_multi(  # pylint: disable=R0914
         result = await db.execute(select(distinct(models.AuthUser.dictionary_ordering)))
 
         for tc in result.scalars().all():
-            # WARNING Do NOT delete - we set these values to None and gc.collect, or memory use will explode
-            file_cached_definitions = None
-            export = None
-            gc.collect()
-
             providers = tc.split(",")
-            stmt = (
-                select(models.CachedDefinition)
-                .filter_by(from_lang=from_lang, to_lang=to_lang)
-                .order_by("cached_date", "word_id")
-            )
-            result = await db.execute(stmt.limit(fakelimit)) if fakelimit > 0 else await db.execute(stmt)
+            stmt = definitions_export_select(from_lang, to_lang)
+            if fakelimit > 0:
+                stmt = stmt.limit(fakelimit)
 
-            file_cached_definitions = result.scalars().all()
-            export = [Definitions.from_model_asdict(ds, providers) for ds in file_cached_definitions]
-            if len(export) == 0:  # don't create empty files
+            tmppath = tempfile.mkdtemp(dir=settings.DEFINITIONS_CACHE_DIR)
+            block = []
+            nb_chunks = 0
+            last_new_definition = None
+            async for cached_definition in await db.stream(stmt):
+                last_new_definition = Definitions.from_model_asdict(cached_definition, providers, cache=False)
+                block.append(last_new_definition)
+                if len(block) >= settings.DEFINITIONS_PER_CACHE_FILE:
+                    write_definitions_json_chunk(tmppath, nb_chunks, block)
+                    nb_chunks += 1
+                    block = []
+            if len(block) > 0:
+                write_definitions_json_chunk(tmppath, nb_chunks, block)
+
+            if last_new_definition is None:  # don't create empty files
+                shutil.rmtree(tmppath, ignore_errors=True)
                 continue
-            logger.info("Loaded all definitions for %s, flushing to files", providers)
+            logger.info("Flushed all definitions for %s to chunk files", providers)
 
-            last_new_definition = export[-1]
             ua = last_new_definition["updatedAt"]
             wid = last_new_definition["id"]
             provs = "-".join(providers)
@@ -759,13 +810,6 @@ async def regenerate_definitions_jsons_multi(  # pylint: disable=R0914
                 settings.DEFINITIONS_CACHE_DIR,
                 f"{lang_prefix(f'{from_lang}{LANG_PAIR_SEPARATOR}{to_lang}')}definitions-{ua}-{wid}-{provs}_json",
             )
-            tmppath = tempfile.mkdtemp(dir=settings.DEFINITIONS_CACHE_DIR)
-            for i, block in enumerate(chunks(export, settings.DEFINITIONS_PER_CACHE_FILE)):
-                chunkpath = os.path.join(tmppath, f"{i:03d}.json")
-                logger.info("Saving chunk to file %s", chunkpath)
-                with open(chunkpath, "w", encoding="utf8") as definitions_file:
-                    json.dump(block, definitions_file)
-
             shutil.rmtree(new_files_dir_path, ignore_errors=True)
             shutil.move(tmppath, new_files_dir_path)
 
@@ -778,6 +822,13 @@ async def regenerate_definitions_jsons_multi(  # pylint: disable=R0914
     return True
 
 
+def write_definitions_json_chunk(dirpath: str, chunk_number: int, block: list[dict]) -> None:
+    chunkpath = os.path.join(dirpath, f"{chunk_number:03d}.json")
+    logger.info("Saving chunk to file %s", chunkpath)
+    with open(chunkpath, "w", encoding="utf8") as definitions_file:
+        json.dump(block, definitions_file)
+
+
 def get_blob_content(repo, path_name, branch="master"):
     # first get the branch reference
     ref = repo.get_git_ref(f"heads/{branch}")
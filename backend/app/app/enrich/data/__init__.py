@@ -4,6 +4,7 @@ from __future__ import annotations
 import importlib
 import inspect
 import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Any, List
 
@@ -17,7 +18,7 @@ from app.enrich.translate import DefaultTranslator, Translator
 from app.enrich.transliterate import Transliterator
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlalchemy.sql.expression import select
+from sqlalchemy.sql.expression import select, text
 from sqlalchemy.sql.functions import func
 
 logger = logging.getLogger(__name__)
@@ -57,11 +58,54 @@ class PersistenceProvider(ABC):
                 await self._flush_to_db(db, dico_rows)
                 dico_rows = []
 
-            dico_rows.append({"source_text": lword, "response_json": json.dumps(entry, ensure_ascii=False)})
+            dico_rows.append({"source_text": lword, "response_json": json.dumps(entry).decode("utf8")})
 
         if len(dico_rows) > 0:
             await self._flush_to_db(db, dico_rows)
 
+    async def bulk_load_to_db(self, db: AsyncSession, dico, replace: bool = False) -> int:
+        """
+        Load all of `dico` with a COPY into a temporary staging table and then upsert it in a single statement,
+        so loading a whole dictionary is limited by I/O rather than by round-trips. Existing entries are only
+        updated if `replace`. Returns the number of entries loaded.
+        """
+        table = self.model_type.__tablename__
+        staging = f"{table}_staging"
+        conflict = "DO UPDATE SET response_json = EXCLUDED.response_json" if replace else "DO NOTHING"
+        start = time.perf_counter()
+
+        # gone at the end of the transaction (commit or rollback), so a failed load never leaves it on the connection
+        await db.execute(
+            text(f"CREATE TEMPORARY TABLE {staging} (source_text text, response_json text) ON COMMIT DROP")
+        )
+        connection = await (await db.connection()).get_raw_connection()
+        nb_rows = 0
+        async with connection.driver_connection.cursor() as cursor:
+            async with cursor.copy(f"COPY {staging} (source_text, response_json) FROM STDIN") as copy:
+                for lword, entry in dico.items():
+                    await copy.write_row((lword, json.dumps(entry).decode("utf8")))
+                    nb_rows += 1
+        copied = time.perf_counter()
+        # this isn't a real upsert, but it's good enough for our purposes
+        await db.execute(
+            text(
+                f"INSERT INTO {table} (source_text, response_json) SELECT source_text, response_json FROM {staging}"
+                f" ON CONFLICT (source_text) {conflict}"
+            )
+        )
+        await db.execute(text(f"DROP TABLE {staging}"))
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Bulk loaded %s entries into %s in %.1fs (copy %.1fs), %.0f rows/s",
+            nb_rows,
+            table,
+            elapsed,
+            copied - start,
+            nb_rows / elapsed if elapsed else 0,
+        )
+        return nb_rows
+
     async def entry(self, db: AsyncSession, lword: str) -> Any:
         if self._inmem:
             return self.dico.get(lword)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+
+# The sqlite dbs are chunked on page boundaries, and a chunk ends after a page whose hash matches CHUNK_BOUNDARY_MASK,
+# so the boundaries depend on the content of the pages and not on their position in the file. Adding the personal
+# values to a copy of the base db only changes the pages they are in, so most of the chunks of a personal db are the
+# same as those of the base db and those of the other users of the same base db, and only need to be stored and
+# downloaded once. The page size must be the same as the `PRAGMA page_size` of the base dbs
+CHUNK_PAGE_SIZE = 32768
+CHUNK_MIN_PAGES = 16
+CHUNK_MAX_PAGES = 320  # 32768*320 this will get compressed over the wire, so isn't really ~10MB
+CHUNK_BOUNDARY_MASK = 0x3F  # on average a boundary every 64 pages after CHUNK_MIN_PAGES
+CHUNK_FILENAME_SUFFIX = ".part"
+CHUNK_FILENAME_REGEX = r"[0-9a-f]{64}\.part"
+
+
+def chunk_boundaries(path: str) -> list[tuple[int, int]]:
+    """(offset, length) of the content-defined chunks of the file at `path`"""
+    boundaries = []
+    start = 0
+    nb_pages = 0
+    position = 0
+    with open(path, "rb") as fh:
+        while page := fh.read(CHUNK_PAGE_SIZE):
+            position += len(page)
+            nb_pages += 1
+            if nb_pages < CHUNK_MIN_PAGES:
+                continue
+            digest = hashlib.blake2b(page, digest_size=8).digest()
+            if nb_pages >= CHUNK_MAX_PAGES or not int.from_bytes(digest, "little") & CHUNK_BOUNDARY_MASK:
+                boundaries.append((start, position - start))
+                start = position
+                nb_pages = 0
+    if position > start:
+        boundaries.append((start, position - start))
+    return boundaries
+
+
+def chunk_filename(chunk: bytes) -> str:
+    return hashlib.sha256(chunk).hexdigest() + CHUNK_FILENAME_SUFFIX
+
+
+def write_chunks(path: str, chunks_dir: str) -> list[str]:
+    """
+    Split the file at `path` into content-defined chunks stored in `chunks_dir`, named by the hash of their content,
+    and return the chunk names in order. Chunks that are already in `chunks_dir` are not rewritten but have their
+    mtime updated, so unused chunks can be found by `prune_chunks`
+    """
+    names = []
+    with open(path, "rb") as fh:
+        for offset, length in chunk_boundaries(path):
+            fh.seek(offset)
+            chunk = fh.read(length)
+            name = chunk_filename(chunk)
+            chunk_path = os.path.join(chunks_dir, name)
+            try:
+                os.utime(chunk_path)
+            except FileNotFoundError:
+                with tempfile.NamedTemporaryFile("wb", dir=chunks_dir, delete=False) as chunk_file:
+                    chunk_file.write(chunk)
+                os.replace(chunk_file.name, chunk_path)
+            names.append(name)
+    return names
+
+
+def prune_chunks(chunks_dir: str, max_age_secs: float) -> int:
+    """Delete the chunks that haven't been written or referenced by `write_chunks` for `max_age_secs`"""
+    nb_pruned = 0
+    if not os.path.isdir(chunks_dir):
+        return nb_pruned
+    oldest = time.time() - max_age_secs
+    for entry in os.scandir(chunks_dir):
+        if entry.name.endswith(CHUNK_FILENAME_SUFFIX) and entry.stat().st_mtime < oldest:
+            os.remove(entry.path)
+            nb_pruned += 1
+    return nb_pruned
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import aiohttp
+from aiohttp_retry import RetryClient
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LIMITER_FAST_ALPHA = 0.2  # weight of each request in the recent latency
+LIMITER_SLOW_ALPHA = 0.01  # weight of each request in the long-term latency
+LIMITER_TOLERANCE = 2.0  # recent latency up to this times the long-term is still considered flat
+LIMITER_BACKOFF = 0.7  # multiplier of the limit on a timeout or server error
+LIMITER_SIZE_CLASS_BASE = 4  # latencies are compared between requests whose sizes are within a power of this
+
+_clients: dict[str, RetryClient] = {}
+_limiters: dict[str, AdaptiveLimiter] = {}
+
+
+def http_client(backend: str) -> RetryClient:
+    """
+    Get the long-lived client for `backend` (normally its base url or host), whose session keeps a pool of
+    keep-alive connections, so requests don't each pay for a new TCP (and TLS) connection. There is one client per
+    backend per process, created on first use and closed by `close_http_clients` on shutdown. Retry options and
+    `raise_for_status` are given per request, and the client must never be closed by its users.
+    """
+    client = _clients.get(backend)
+    if client is None:
+        logger.info("Creating pooled http client for %s", backend)
+        connector = aiohttp.TCPConnector(
+            limit=0,  # the per host limit is the one that matters, each client only talks to one host
+            limit_per_host=settings.HTTP_CLIENT_LIMIT_PER_HOST,
+            keepalive_timeout=settings.HTTP_CLIENT_KEEPALIVE_SECS,
+            enable_cleanup_closed=True,
+        )
+        client = RetryClient(client_session=aiohttp.ClientSession(connector=connector), raise_for_status=False)
+        _clients[backend] = client
+    return client
+
+
+def configured_backends(config) -> set[str]:
+    """The backends (`base_url`s and `api_host`s) used by the providers in a (LANG_PAIRS) config"""
+    backends = set()
+    if isinstance(config, dict):
+        for key, value in config.items():
+            if key in ("base_url", "api_host") and isinstance(value, str):
+                backends.add(value)
+            else:
+                backends |= configured_backends(value)
+    elif isinstance(config, list):
+        for value in config:
+            backends |= configured_backends(value)
+    return backends
+
+
+async def start_http_clients() -> None:
+    """Create the clients for all the configured backends, must be called from the process' event loop"""
+    for backend in sorted(configured_backends(settings.LANG_PAIRS)):
+        http_client(backend)
+
+
+async def close_http_clients() -> None:
+    while _clients:
+        backend, client = _clients.popitem()
+        logger.info("Closing pooled http client for %s", backend)
+        await client.close()
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of concurrent requests to a backend, adapting the limit to what the backend can take: it grows
+    by about one per round-trip while the recent latency stays close to the long-term latency, shrinks by one when it
+    doesn't and backs off multiplicatively on timeouts and server errors.
+
+    The latencies are tracked per size class of the requests (the powers of LIMITER_SIZE_CLASS_BASE of their `size`),
+    so a batch of many texts isn't taken for the backend slowing down compared to single words. The limit is per
+    process, waiting requests get their slots in order.
+    """
+
+    def __init__(self, name: str, initial: int, max_limit: int, min_limit: int = 1) -> None:
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.inflight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # size class -> (recent latency, long-term latency)
+        self._latencies: dict[int, tuple[float, float]] = {}
+
+    @staticmethod
+    def size_class(size: int) -> int:
+        size_class = 0
+        while size >= LIMITER_SIZE_CLASS_BASE:
+            size //= LIMITER_SIZE_CLASS_BASE
+            size_class += 1
+        return size_class
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> None:
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():  # the slot was given just before being cancelled
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def on_success(self, latency: float, size: int = 1) -> None:
+        size_class = self.size_class(size)
+        if size_class not in self._latencies:
+            self._latencies[size_class] = (latency, latency)
+            return
+        recent_latency, long_latency = self._latencies[size_class]
+        recent_latency += LIMITER_FAST_ALPHA * (latency - recent_latency)
+        long_latency += LIMITER_SLOW_ALPHA * (latency - long_latency)
+        self._latencies[size_class] = (recent_latency, long_latency)
+        if recent_latency > long_latency * LIMITER_TOLERANCE:
+            self.limit = max(self.min_limit, self.limit - 1)
+        elif self.inflight + 1 >= int(self.limit):  # only grow when (almost) all the slots are being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_overload(self) -> None:
+        self.limit = max(self.min_limit, self.limit * LIMITER_BACKOFF)
+        logger.warning("Backend %s overloaded, concurrency limit reduced to %s", self.name, int(self.limit))
+
+    @asynccontextmanager
+    async def slot(self, size: int = 1):
+        """A slot for a request of `size` (e.g. the characters sent), only compared to the latency of similar ones"""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except (asyncio.TimeoutError, aiohttp.ServerTimeoutError):
+            self.on_overload()
+            raise
+        except aiohttp.ClientResponseError as ex:
+            if ex.status >= 500:
+                self.on_overload()
+            raise
+        else:
+            self.on_success(time.perf_counter() - start, size)
+        finally:
+            self.release()
+
+
+def backend_limiter(backend: str) -> AdaptiveLimiter:
+    """
+    Get the process-wide concurrency limiter for `backend`, to wrap every request to it with `limiter.slot(size)`.
+    """
+    limiter = _limiters.get(backend)
+    if limiter is None:
+        limiter = _limiters[backend] = AdaptiveLimiter(
+            backend, settings.HTTP_CLIENT_INITIAL_CONCURRENCY, settings.HTTP_CLIENT_LIMIT_PER_HOST
+        )
+    return limiter
@@ -1,20 +1,33 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import datetime
 import json
 import logging
+import os
+import pathlib
 import re
-from collections import defaultdict
-from typing import TYPE_CHECKING, Tuple
+from itertools import batched
+from typing import TYPE_CHECKING, Iterable, Tuple
 
 import sqlalchemy
-from app.cache import TimestampedDict, cache_loading, cached_definitions  # noqa:F401
-from app.etypes import Token
+from app.cache import (  # noqa:F401
+    TimeStampedDef,
+    TimestampedDict,
+    cache_loading,
+    cached_definitions,
+    decoded_definitions,
+)
+from app.cache.definitions import DefinitionsStore, SnapshotFormatException
+from app.core.config import settings
+from app.db.session import SessionPool
+from app.etypes import LANG_PAIR_SEPARATOR, Token
 from app.models.data import CachedDefinition
 from app.models.lookups import BingApiLookup
 from app.ndutils import clean_definitions, lemma, orig_text
 from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.future import select
 from zhon import hanzi
@@ -26,7 +39,68 @@ logger = logging.getLogger(__name__)
 hanzi_chars = re.compile("[{}]".format(hanzi.characters))
 
 
-async def reload_definitions_cache(db: AsyncSession, from_lang: str, to_lang: str) -> TimestampedDict:
+SNAPSHOT_YIELD_PER = 10000
+# 5000 rows * 6 columns (word_id, source_text, from_lang, to_lang, response_json, cached_date) = 30000 params keeps
+# us under the params limit of 32k
+DEFINITIONS_MANY_BATCH_SIZE = 5000
+
+
+def definitions_snapshot_path(from_lang: str, to_lang: str) -> str:
+    return os.path.join(settings.DEFINITIONS_SNAPSHOT_DIR, f"{from_lang}{LANG_PAIR_SEPARATOR}{to_lang}.definitions")
+
+
+def load_definitions_snapshot(from_lang: str, to_lang: str) -> DefinitionsStore | None:
+    snapshot_path = definitions_snapshot_path(from_lang, to_lang)
+    try:
+        return DefinitionsStore.load(snapshot_path)
+    except FileNotFoundError:
+        logger.info("No definitions snapshot found at %s, loading from the DB", snapshot_path)
+    except (SnapshotFormatException, ValueError):
+        logger.exception("Unable to load the definitions snapshot %s, loading from the DB", snapshot_path)
+    return None
+
+
+def cached_definitions_select(from_lang: str, to_lang: str, cached_max_timestamp: float):
+    # only get the columns we need, loading full ORM objects for the whole table uses huge amounts of memory
+    return (
+        select(
+            CachedDefinition.source_text,
+            CachedDefinition.cached_date,
+            CachedDefinition.response_json,
+            CachedDefinition.word_id,
+        )
+        .filter(
+            CachedDefinition.from_lang == from_lang,
+            CachedDefinition.to_lang == to_lang,
+            CachedDefinition.cached_date >= datetime.datetime.utcfromtimestamp(cached_max_timestamp),
+        )
+        .order_by("cached_date")
+    )
+
+
+async def write_definitions_snapshot(db: AsyncSession, from_lang: str, to_lang: str) -> str:
+    store = DefinitionsStore()
+    result = await db.stream(
+        cached_definitions_select(from_lang, to_lang, 0).execution_options(yield_per=SNAPSHOT_YIELD_PER)
+    )
+    async for source_text, cached_date, response_json, word_id in result:
+        store.add(source_text, cached_date.timestamp(), response_json, word_id)
+
+    pathlib.Path(settings.DEFINITIONS_SNAPSHOT_DIR).mkdir(parents=True, exist_ok=True)
+    snapshot_path = definitions_snapshot_path(from_lang, to_lang)
+    store.save(snapshot_path)
+    logger.info("Wrote %s definitions to the snapshot %s", store.nb_entries, snapshot_path)
+    return snapshot_path
+
+
+async def reload_definitions_cache(db: AsyncSession, from_lang: str, to_lang: str) -> DefinitionsStore:
+    cache_key = f"{from_lang}:{to_lang}"
+    if not cached_definitions[cache_key]:
+        snapshot = load_definitions_snapshot(from_lang, to_lang)
+        if snapshot:
+            # the snapshot was written by the nightly regeneration, so we only need what has changed since
+            cached_definitions[cache_key] = snapshot
+            return await update_cache(db, from_lang, to_lang, snapshot.max_timestamp)
     return await update_cache(db, from_lang, to_lang, 0)
 
 
@@ -35,57 +109,31 @@ async def ensure_cache_preloaded(db: AsyncSession, from_lang: str, to_lang: str)
         await reload_definitions_cache(db, from_lang, to_lang)
 
 
-async def update_cache(db: AsyncSession, from_lang: str, to_lang: str, cached_max_timestamp: int) -> TimestampedDict:
+async def update_cache(db: AsyncSession, from_lang: str, to_lang: str, cached_max_timestamp: int) -> DefinitionsStore:
     global cache_loading  # pylint: disable=W0603
     cache_key = f"{from_lang}:{to_lang}"
-    if not cached_definitions[cache_key] and cache_loading.get(cache_key):
+    store = cached_definitions[cache_key]
+    if not store and cache_loading.get(cache_key):
         raise Exception("Cache loading, please come again")
 
     cache_loading[cache_key] = True  # avoid trashing with a global flag to reduce the number of loads, saving the DB
 
-    if cached_max_timestamp == 0 and cached_definitions[cache_key]:
+    if cached_max_timestamp == 0 and store:
         logger.error("For some reason trying to reload cache when it is already loaded")
         return
 
-    result = await db.execute(
-        select(CachedDefinition)
-        .filter(
-            CachedDefinition.from_lang == from_lang,
-            CachedDefinition.to_lang == to_lang,
-            CachedDefinition.cached_date >= datetime.datetime.utcfromtimestamp(cached_max_timestamp),
-        )
-        .order_by("cached_date")
-    )
-    new_cache = defaultdict(TimestampedDict)
-    for cached_entry in result.scalars().all():
-        prev_dict = (
-            new_cache.get(cached_entry.source_text.lower())
-            or cached_definitions[cache_key][cached_entry.source_text.lower()]
-            or (0, None)
-        )[1] or {}
-        prev_dict[cached_entry.source_text] = (
-            cached_entry.cached_date.timestamp(),
-            cached_entry.response_json,
-            cached_entry.word_id,
-        )
-        # FIXME: is this necessary? i need for them to be in timestamped order, so
-        # my guess is that I need to delete and readd, so that the order is that the most recent is always
-        # the last one
-        new_cache.pop(cached_entry.source_text.lower(), None)
-        new_cache[cached_entry.source_text.lower()] = (
-            cached_entry.cached_date.timestamp(),
-            prev_dict,
-        )
+    result = await db.execute(cached_definitions_select(from_lang, to_lang, cached_max_timestamp))
+    was_loaded = bool(store)
+    nb_new = 0
+    for source_text, cached_date, response_json, word_id in result:
+        store.add(source_text, cached_date.timestamp(), response_json, word_id)
+        if was_loaded:
+            decoded_definitions.invalidate(word_id)
+        nb_new += 1
 
-    if cached_definitions[cache_key] and new_cache:
-        logger.warning(
-            "The new_cache is not empty for ts %s, len %s, new_cache[:100] %s",
-            cached_max_timestamp,
-            len(new_cache),
-            str(new_cache)[:1000],
-        )
-    cached_definitions[cache_key] = cached_definitions[cache_key] | new_cache
-    return cached_definitions[cache_key]
+    if was_loaded and nb_new:
+        logger.warning("The cache update is not empty for ts %s, nb entries %s", cached_max_timestamp, nb_new)
+    return store
 
 
 def ordered_defs(all_defs: TimestampedDict, oword: str, word: str) -> list[Tuple[float, str, int]]:
@@ -125,6 +173,44 @@ def all_def_entries(manager: EnrichmentManager, oword: str, word: str):
     return lval[1] | oval[1]
 
 
+async def definition_json(db: AsyncSession, manager: EnrichmentManager, w: str) -> tuple[BingApiLookup, str]:
+    # TODO: decide whether this is right
+    # create a fake token - here we are searching for all forms, so lemma and word are the same
+    token = {"w": w, "pos": "NN", "l": w}
+    # this will create the ref entry in the DB if not present
+    # WARNING! Do NOT move
+    default_definition = clean_definitions(await manager.default().get_standardised_defs(db, token))
+    fallback_definition = clean_definitions(await manager.default().get_standardised_fallback_defs(db, token))
+
+    result = await db.execute(
+        select(BingApiLookup).filter_by(source_text=w, from_lang=manager.from_lang, to_lang=manager.to_lang)
+    )
+    bing_word = result.scalar_one()
+    json_definition = {
+        "w": w,
+        "id": bing_word.id,
+        "defs": {
+            manager.default().name(): default_definition,
+            manager.default().fallback_name(): fallback_definition,
+        },
+        "syns": await manager.default().pos_synonyms(db, token),
+    }
+
+    sound = await manager.transliterator().transliterate(db, w)
+    for x in manager.secondary():
+        if not sound or len(hanzi_chars.findall(sound)) != 0:
+            sound = await x.sound_for(db, token)
+        json_definition["defs"][x.name()] = clean_definitions(await x.get_standardised_defs(db, token))
+
+    json_definition["p"] = " ".join("?" * len(w)) if len(hanzi_chars.findall(sound)) != 0 else sound
+
+    json_definition["metadata"] = {}
+    for meta in manager.metadata():
+        json_definition["metadata"][meta.name()] = await meta.meta_for_word(db, w)
+
+    return bing_word, json.dumps(json_definition, separators=(",", ":"))
+
+
 async def definitions(  # pylint: disable=R0914
     db: AsyncSession, manager: EnrichmentManager, otoken: Token, refresh: bool = False
 ):  # noqa:C901  # pylint: disable=R0912
@@ -157,15 +243,9 @@ async def definitions(  # pylint: disable=R0914
         CachedDefinition.to_lang == manager.to_lang,
     )
 
-    try:
-        # list(dict) appears to be O(n)
-        # cached_max_timestamp = list(cached_definitions[f"{manager.from_lang}:{manager.to_lang}"].values())[-1]["ts"]
-
-        # this next(reversed(dict.values())) appears to be O(1)-ish
-        cached_max_timestamp = next(reversed(cached_definitions[f"{manager.from_lang}:{manager.to_lang}"].values()))[0]
-    except StopIteration:
+    cached_max_timestamp = cached_definitions[f"{manager.from_lang}:{manager.to_lang}"].max_timestamp
+    if not cached_max_timestamp:
         logger.warning("Loading cache from scratch, it is completely empty")
-        cached_max_timestamp = 0
 
     cached_entries = (await db.execute(select(CachedDefinition).filter(filter_exp))).scalars().all()
     if not refresh:
@@ -175,41 +255,7 @@ async def definitions(  # pylint: disable=R0914
     logger.debug("Found %s element in db for %s : %s, still need %s", cached_entries, word, oword, to_get)
     if to_get:
         for w in to_get:
-            # TODO: decide whether this is right
-            # create a fake token - here we are searching for all forms, so lemma and word are the same
-            token = {"w": w, "pos": "NN", "l": w}
-            # this will create the ref entry in the DB if not present
-            # WARNING! Do NOT move
-            default_definition = clean_definitions(await manager.default().get_standardised_defs(db, token))
-            fallback_definition = clean_definitions(await manager.default().get_standardised_fallback_defs(db, token))
-
-            result = await db.execute(
-                select(BingApiLookup).filter_by(source_text=w, from_lang=manager.from_lang, to_lang=manager.to_lang)
-            )
-            bing_word = result.scalar_one()
-            json_definition = {
-                "w": w,
-                "id": bing_word.id,
-                "defs": {
-                    manager.default().name(): default_definition,
-                    manager.default().fallback_name(): fallback_definition,
-                },
-                "syns": await manager.default().pos_synonyms(db, token),
-            }
-
-            sound = await manager.transliterator().transliterate(db, w)
-            for x in manager.secondary():
-                if not sound or len(hanzi_chars.findall(sound)) != 0:
-                    sound = await x.sound_for(db, token)
-                json_definition["defs"][x.name()] = clean_definitions(await x.get_standardised_defs(db, token))
-
-            json_definition["p"] = " ".join("?", len(w)) if len(hanzi_chars.findall(sound)) != 0 else sound
-
-            json_definition["metadata"] = {}
-            for meta in manager.metadata():
-                json_definition["metadata"][meta.name()] = await meta.meta_for_word(db, w)
-
-            definition_object = json.dumps(json_definition, separators=(",", ":"))
+            bing_word, definition_object = await definition_json(db, manager, w)
             cached_entry = None
             for ce in cached_entries:
                 # FIXME: find out why these expire...
@@ -258,3 +304,89 @@ async def definitions(  # pylint: disable=R0914
 
     return all_def_entries(manager, oword, word)
     # return json.loads(cached_definitions[f"{manager.from_lang}:{manager.to_lang}"][word][1])
+
+
+def cached_definitions_many(
+    manager: EnrichmentManager, tokens: Iterable[Token]
+) -> dict[tuple[str, str], dict[str, TimeStampedDef]]:
+    """
+    The `all_def_entries` for each `(orig_text, lemma)` of the tokens that already have all their forms in the
+    in-memory cache, without going to the DB. The others are left out, for `definitions` or `definitions_many`.
+    """
+    found = {}
+    for token in tokens:
+        oword, word = orig_text(token), lemma(token)
+        if not word or (oword, word) in found:
+            continue
+        all_defs = all_def_entries(manager, oword, word)
+        if all(w in all_defs for w in (oword, word, oword.lower(), word.lower())):
+            found[(oword, word)] = all_defs
+    return found
+
+
+async def definitions_many(
+    db: AsyncSession, manager: EnrichmentManager, tokens: Iterable[Token]
+) -> dict[tuple[str, str], dict[str, TimeStampedDef]]:
+    """
+    Batch version of `definitions` for all the tokens of a model. Surface forms and lemmas are deduplicated, hits
+    come from the in-memory cache, misses are checked in the DB with a single query, and any missing entries are
+    looked up concurrently (with at most ENRICH_MAX_SESSIONS_PER_MODEL sessions) then created with a single insert,
+    commit and cache refresh.
+
+    Returns the `all_def_entries` for each `(orig_text, lemma)` of the tokens.
+    """
+    lookups = {(orig_text(token), lemma(token)) for token in tokens if lemma(token)}
+
+    to_get = set()
+    for oword, word in lookups:
+        all_defs = all_def_entries(manager, oword, word)
+        to_get |= {w for w in (oword, word, oword.lower(), word.lower()) if w not in all_defs}
+
+    if to_get:
+        cached_max_timestamp = cached_definitions[f"{manager.from_lang}:{manager.to_lang}"].max_timestamp
+        if not cached_max_timestamp:
+            logger.warning("Loading cache from scratch, it is completely empty")
+
+        for block in batched(sorted(to_get), DEFINITIONS_MANY_BATCH_SIZE):
+            result = await db.execute(
+                select(CachedDefinition.source_text).filter(
+                    CachedDefinition.source_text.in_(block),
+                    CachedDefinition.from_lang == manager.from_lang,
+                    CachedDefinition.to_lang == manager.to_lang,
+                )
+            )
+            to_get.difference_update(result.scalars().all())
+        logger.debug("Creating %s definitions for %s lookups", len(to_get), len(lookups))
+
+        # don't keep a transaction open over the (external) lookups
+        await db.commit()
+
+        async def lookup(sessions: SessionPool, w: str) -> dict:
+            async with sessions.session() as lookup_db:
+                bing_word, definition_object = await definition_json(lookup_db, manager, w)
+                await lookup_db.commit()
+            return {
+                "word_id": bing_word.id,
+                "source_text": w,
+                "from_lang": manager.from_lang,
+                "to_lang": manager.to_lang,
+                "response_json": definition_object,
+            }
+
+        async with SessionPool(settings.ENRICH_MAX_SESSIONS_PER_MODEL) as sessions:
+            rows = await asyncio.gather(*(lookup(sessions, w) for w in sorted(to_get)))
+        if rows:
+            # stamped now rather than with the server default, the start of the transaction, so that the entries
+            # can't be older than those already picked up by the cache updates and exports
+            cached_date = datetime.datetime.now(datetime.timezone.utc)
+            for row in rows:
+                row["cached_date"] = cached_date
+            for block in batched(rows, DEFINITIONS_MANY_BATCH_SIZE):
+                # entries created in the meanwhile by another process are just as good as ours, so we keep theirs
+                stmt = postgresql.insert(CachedDefinition).values(list(block))
+                await db.execute(stmt.on_conflict_do_nothing(index_elements=["source_text", "from_lang", "to_lang"]))
+            await db.commit()
+
+        await update_cache(db, manager.from_lang, manager.to_lang, cached_max_timestamp)
+
+    return {(oword, word): all_def_entries(manager, oword, word) for oword, word in lookups}
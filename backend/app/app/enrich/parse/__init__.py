@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import json
 import logging
 from abc import ABC, abstractmethod
 
-from aiohttp_retry import ExponentialRetry, RetryClient
+from aiohttp_retry import ExponentialRetry
+from app.enrich.http_clients import backend_limiter, http_client
 from app.etypes import Model
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_BATCH_CHARS = 20000
+
 
 class ParseProvider(ABC):
     def __init__(self, config):
@@ -26,6 +30,18 @@ class ParseProvider(ABC):
         Take input, parse (or get done externally) and send back marked up in json format
         """
 
+    async def parse_many(
+        self,
+        texts: list[str],
+        provider_parameters: str = None,
+        max_attempts: int = 5,
+        max_wait_between_attempts: int = 300,
+    ) -> list[Model]:
+        """
+        Parse each of the texts, as with `parse`. Providers that can parse several texts in one go should override
+        """
+        return [await self.parse(text, provider_parameters, max_attempts, max_wait_between_attempts) for text in texts]
+
 
 class HTTPCoreNLPProvider(ParseProvider):
     # override ParseProvider
@@ -38,10 +54,83 @@ class HTTPCoreNLPProvider(ParseProvider):
     ) -> Model:
         # the max_timeout option is horribly named, it is the wait between attempts, not timeout at all...
         retry_options = ExponentialRetry(attempts=max_attempts, max_timeout=max_wait_between_attempts)
-        async with RetryClient(raise_for_status=False, retry_options=retry_options) as client:
-            logger.debug("Starting HTTPCoreNLPProvider aparse of: %s", text)
-            params = {"properties": provider_parameters or self._config["params"]}
-            async with client.post(self._config["base_url"], data=text, params=params) as response:
-                response.raise_for_status()
-                logger.debug("Finished getting model from CoreNLP via http")
-                return await response.json()
+        client = http_client(self._config["base_url"])
+        logger.debug("Starting HTTPCoreNLPProvider aparse of: %s", text)
+        params = {"properties": provider_parameters or self._config["params"]}
+        async with (
+            backend_limiter(self._config["base_url"]).slot(len(text)),
+            client.post(self._config["base_url"], data=text, params=params, retry_options=retry_options) as response,
+        ):
+            response.raise_for_status()
+            logger.debug("Finished getting model from CoreNLP via http")
+            return await response.json()
+
+    # override ParseProvider
+    async def parse_many(
+        self,
+        texts: list[str],
+        provider_parameters: str = None,
+        max_attempts: int = 5,
+        max_wait_between_attempts: int = 300,
+    ) -> list[Model]:
+        # the texts are sent as lines of a single document, each line break being a sentence break, in batches of
+        # up to max_batch_chars, and the sentences are then split back out by their character offsets
+        properties = json.loads(provider_parameters or self._config["params"])
+        properties["ssplit.newlineIsSentenceBreak"] = "always"
+        properties = json.dumps(properties)
+        max_batch_chars = self._config.get("max_batch_chars", DEFAULT_MAX_BATCH_CHARS)
+
+        models = []
+        batch = []
+        batch_chars = 0
+        for text in texts:
+            if batch and batch_chars + len(text) + 1 > max_batch_chars:
+                models += await self._parse_batch(batch, properties, max_attempts, max_wait_between_attempts)
+                batch = []
+                batch_chars = 0
+            batch.append(text)
+            batch_chars += len(text) + 1
+        if batch:
+            models += await self._parse_batch(batch, properties, max_attempts, max_wait_between_attempts)
+        return models
+
+    async def _parse_batch(
+        self, texts: list[str], properties: str, max_attempts: int, max_wait_between_attempts: int
+    ) -> list[Model]:
+        if len(texts) == 1:
+            return [await self.parse(texts[0], None, max_attempts, max_wait_between_attempts)]
+
+        # newlines in a text are replaced by (same length) spaces so the only sentence breaks they add are ours
+        document = "\n".join(text.replace("\r", " ").replace("\n", " ") for text in texts)
+        model = await self.parse(document, properties, max_attempts, max_wait_between_attempts)
+
+        # CoreNLP character offsets are in UTF-16 code units
+        bounds = []
+        start = 0
+        for text in texts:
+            end = start + len(text.encode("utf-16-le")) // 2
+            bounds.append((start, end))
+            start = end + 1
+
+        models = [{"sentences": []} for _ in texts]
+        i = 0
+        for sentence in model["sentences"]:
+            tokens = sentence["tokens"]
+            if not tokens:
+                continue
+            # offsets past the end of the document (a parser quirk) stay with the last text rather than overrunning
+            while i < len(bounds) - 1 and tokens[0]["characterOffsetBegin"] >= bounds[i][1] + 1:
+                i += 1
+            start, end = bounds[i]
+            for token in tokens:
+                token["characterOffsetBegin"] -= start
+                token["characterOffsetEnd"] -= start
+            # the whitespace around the texts includes the line breaks that were added between them
+            first, last = tokens[0], tokens[-1]
+            if first["characterOffsetBegin"] < len(first.get("before", "")):
+                first["before"] = first["before"][len(first["before"]) - first["characterOffsetBegin"] :]  # noqa: E203
+            if end - start - last["characterOffsetEnd"] < len(last.get("after", "")):
+                last["after"] = last["after"][: end - start - last["characterOffsetEnd"]]
+            sentence["index"] = len(models[i]["sentences"])
+            models[i]["sentences"].append(sentence)
+        return models
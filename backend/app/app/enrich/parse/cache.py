@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib
+import logging
+import os
+import time
+import zlib
+from collections import OrderedDict
+
+import orjson as json
+from app.enrich.parse import ParseProvider
+from app.etypes import Model
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_MEMORY_ENTRIES = 2000
+PARSE_CACHE_MEMORY_BYTES = 64 * 1024 * 1024  # of serialised models
+PARSE_CACHE_FILE_SUFFIX = ".json.z"
+PARSE_CACHE_LOG_EVERY = 1000  # lookups
+
+
+class CachedParseProvider(ParseProvider):
+    """
+    Wraps any other `ParseProvider` with a cache of its models keyed by a hash of the text, the provider parameters
+    and the `version` of the wrapped parser (to change whenever the parser or its models change), so the same text
+    is only ever sent to the (expensive) parser once. Models from `parse_many` are cached separately from those of
+    `parse`, as a batch can split sentences and attribute whitespace differently.
+
+    Recently used models are kept serialised in an in-memory LRU, and all models in (zlib compressed) files
+    under `path`, shared by all the processes that have it mounted. The files are evicted by `prune_parse_cache`.
+    Callers modify the models they get, so a new copy is deserialised for every hit.
+
+    Config: {"classname": <wrapped ParseProvider>, "config": <its config>, "path": <cache dir>, "version": <str>}
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        module_name, class_name = config["classname"].rsplit(".", 1)
+        self._parser: ParseProvider = getattr(importlib.import_module(module_name), class_name)(config["config"])
+        self._version = f'{config["classname"]}:{config.get("version", "")}'
+        self._path = config["path"]
+        os.makedirs(self._path, exist_ok=True)
+        self._memory: OrderedDict[str, tuple[bytes, float]] = OrderedDict()  # key -> (model json, parse secs)
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def _key(self, text: str, provider_parameters: str | None, batched: bool = False) -> str:
+        params = provider_parameters or self._config["config"].get("params") or ""
+        version = f"{self._version}:many" if batched else self._version
+        return hashlib.sha256("\0".join((version, params, text)).encode("utf8")).hexdigest()
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self._path, key[:2], key + PARSE_CACHE_FILE_SUFFIX)
+
+    def _remember(self, key: str, serialised: bytes, parse_secs: float) -> None:
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[0])
+        self._memory[key] = (serialised, parse_secs)
+        self._memory_bytes += len(serialised)
+        while len(self._memory) > PARSE_CACHE_MEMORY_ENTRIES or self._memory_bytes > PARSE_CACHE_MEMORY_BYTES:
+            self._memory_bytes -= len(self._memory.popitem(last=False)[1][0])
+
+    def _read_file(self, key: str) -> tuple[bytes, float] | None:
+        path = self._file_path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            os.utime(path)  # so recently used entries aren't pruned
+        except FileNotFoundError:
+            return None
+        try:
+            parse_secs, serialised = data.split(b"\n", 1)
+            return zlib.decompress(serialised), float(parse_secs)
+        except (ValueError, zlib.error):
+            logger.warning("Ignoring corrupt parse cache file %s", path)
+            return None
+
+    def _write_file(self, key: str, serialised: bytes, parse_secs: float) -> None:
+        path = self._file_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(f"{parse_secs:.6f}\n".encode("ascii") + zlib.compress(serialised))
+        os.replace(tmp_path, path)
+
+    async def _cached(self, key: str) -> Model | None:
+        if (self.memory_hits + self.disk_hits + self.misses + 1) % PARSE_CACHE_LOG_EVERY == 0:
+            logger.info("Parse cache stats for %s: %s", self._version, self.stats())
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            serialised, parse_secs = self._memory[key]
+            self.memory_hits += 1
+            self.seconds_saved += parse_secs
+            return json.loads(serialised)
+
+        cached = await asyncio.to_thread(self._read_file, key)
+        if cached:
+            serialised, parse_secs = cached
+            self._remember(key, serialised, parse_secs)
+            self.disk_hits += 1
+            self.seconds_saved += parse_secs
+            return json.loads(serialised)
+
+        self.misses += 1
+        return None
+
+    async def _store(self, key: str, model: Model, parse_secs: float) -> None:
+        serialised = json.dumps(model)
+        self._remember(key, serialised, parse_secs)
+        await asyncio.to_thread(self._write_file, key, serialised, parse_secs)
+
+    # override ParseProvider
+    async def parse(
+        self,
+        text: str,
+        provider_parameters: str = None,
+        max_attempts: int = 5,
+        max_wait_between_attempts: int = 300,
+    ) -> Model:
+        key = self._key(text, provider_parameters)
+        model = await self._cached(key)
+        if model is not None:
+            return model
+
+        start = time.perf_counter()
+        model = await self._parser.parse(text, provider_parameters, max_attempts, max_wait_between_attempts)
+        await self._store(key, model, time.perf_counter() - start)
+        return model
+
+    # override ParseProvider
+    async def parse_many(
+        self,
+        texts: list[str],
+        provider_parameters: str = None,
+        max_attempts: int = 5,
+        max_wait_between_attempts: int = 300,
+    ) -> list[Model]:
+        keys = [self._key(text, provider_parameters, batched=True) for text in texts]
+        models = [await self._cached(key) for key in keys]
+        missing = [i for i, model in enumerate(models) if model is None]
+        if not missing:
+            return models
+
+        start = time.perf_counter()
+        parsed = await self._parser.parse_many(
+            [texts[i] for i in missing], provider_parameters, max_attempts, max_wait_between_attempts
+        )
+        # the time of the batch is shared out by length, which is close enough for the savings stats
+        parse_secs = time.perf_counter() - start
+        nb_chars = sum(len(texts[i]) for i in missing) or 1
+        for i, model in zip(missing, parsed):
+            await self._store(keys[i], model, parse_secs * len(texts[i]) / nb_chars)
+            models[i] = model
+        return models
+
+
+def prune_parse_cache(path: str, max_age_secs: float) -> int:
+    """Delete the cached models under `path` that haven't been used for `max_age_secs`"""
+    nb_pruned = 0
+    oldest = time.time() - max_age_secs
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            if filename.endswith(PARSE_CACHE_FILE_SUFFIX) and os.stat(filepath).st_mtime < oldest:
+                os.remove(filepath)
+                nb_pruned += 1
+    return nb_pruned
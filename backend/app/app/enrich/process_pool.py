@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """
+    The process-wide pool for CPU-bound enrichment work, created on first use. Workers are spawned rather than
+    forked, as the parent has running threads (kafka, sqlite writers, etc.), so the functions and their arguments
+    must be picklable and the modules they are in importable without side-effects.
+    """
+    global _executor  # pylint: disable=W0603
+    if _executor is None:
+        logger.info("Starting enrichment process pool with %s workers", settings.ENRICH_PROCESS_POOL_WORKERS)
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.ENRICH_PROCESS_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def run_in_process(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(process_pool(), fn, *args)
+
+
+def shutdown_process_pool() -> None:
+    global _executor  # pylint: disable=W0603
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SQLITE_WRITER_QUEUE_SIZE = 8  # statements, each normally with a buffer of up to FLUSH_BUFFER_SIZE rows
+
+
+class SqliteWriter:
+    """
+    Runs all the statements for a sqlite db in a dedicated thread, fed through a bounded queue, so that several
+    coroutines can fetch their data concurrently and send it to the same db without ever blocking the event loop on
+    sqlite I/O. The db is only a temporary export, so it is written without a journal or syncs.
+
+    If a statement fails (or the db can't be opened), the following ones are dropped and the error is raised by the
+    following `execute`s and by `close`.
+    """
+
+    def __init__(self, path: str, maxsize: int = SQLITE_WRITER_QUEUE_SIZE) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._error: Exception | None = None
+        self._thread = threading.Thread(target=self._run, args=(path,), name=f"sqlite-writer-{path}", daemon=True)
+        self._thread.start()
+
+    def _run(self, path: str) -> None:
+        try:
+            con = sqlite3.connect(path)
+        except Exception as ex:  # pylint: disable=W0703
+            logger.exception("Error opening sqlite db %s", path)
+            self._error = ex
+            return
+        try:
+            con.execute("PRAGMA journal_mode=OFF;")
+            con.execute("PRAGMA synchronous=OFF;")
+            while (item := self._queue.get()) is not None:
+                if self._error:
+                    continue
+                sql, rows = item
+                try:
+                    if rows is None:
+                        con.execute(sql)
+                    else:
+                        con.executemany(sql, rows)
+                except Exception as ex:  # pylint: disable=W0703
+                    logger.exception("Error writing to sqlite db %s", path)
+                    self._error = ex
+            if not self._error:
+                con.commit()
+        except Exception as ex:  # pylint: disable=W0703
+            logger.exception("Error writing to sqlite db %s", path)
+            self._error = ex
+        finally:
+            con.close()
+
+    def _put_while_running(self, item: tuple[str, list | None] | None) -> None:
+        # if the thread has died then nothing will ever make room in a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    async def _put(self, item: tuple[str, list | None] | None) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            await asyncio.to_thread(self._put_while_running, item)
+
+    def _raise_error(self) -> None:
+        if self._error:
+            raise self._error
+
+    async def execute(self, sql: str) -> None:
+        self._raise_error()
+        await self._put((sql, None))
+
+    async def executemany(self, sql: str, rows: list) -> None:
+        self._raise_error()
+        await self._put((sql, rows))
+
+    async def close(self) -> None:
+        """Wait for all the statements to be run and committed"""
+        await self._put(None)
+        await asyncio.to_thread(self._thread.join)
+        self._raise_error()
@@ -4,10 +4,17 @@ from __future__ import annotations
 
 import logging
 
+import mode
 from app.core.config import settings
 from app.data.importer.common import process_content, process_import, process_list, process_qag
+from app.db.session import async_session
 from app.enrich import data
 from app.enrich.cache import regenerate_character_jsons_multi, regenerate_definitions_jsons_multi, regenerate_sqlite
+from app.enrich.db_chunks import prune_chunks
+from app.enrich.http_clients import close_http_clients, start_http_clients
+from app.enrich.models import write_definitions_snapshot
+from app.enrich.parse.cache import prune_parse_cache
+from app.enrich.process_pool import shutdown_process_pool
 from app.schemas.cache import DataType, RegenerationType
 from app.schemas.msg import Msg
 from app.worker.faustus import app, content_process_topic, import_process_topic, list_process_topic, qag_process_topic
@@ -20,6 +27,21 @@ for name, pair in settings.LANG_PAIRS.items():
     data.managers[name] = data.EnrichmentManager(name, pair)
 
 
+@app.service
+class HTTPClientsService(mode.Service):
+    async def on_start(self) -> None:
+        await start_http_clients()
+
+    async def on_stop(self) -> None:
+        await close_http_clients()
+
+
+@app.service
+class ProcessPoolService(mode.Service):
+    async def on_stop(self) -> None:
+        shutdown_process_pool()
+
+
 # faust -A app.fworker send @import_process_topic '{"type": "import", "id": "21430d94-2d09-4552-8a3c-4d4ad03d8475"}'
 @app.agent(import_process_topic)
 async def import_process(imports):
@@ -57,6 +79,18 @@ async def regenerate_all():
     await regenerate(RegenerationType(data_type=DataType.all))
 
 
+@app.crontab("0 3 * * *")
+async def prune_db_chunks():
+    nb_pruned = prune_chunks(settings.DB_CHUNKS_DIR, settings.DB_CHUNKS_MAX_AGE_DAYS * 24 * 60 * 60)
+    logger.info("Pruned %s unused sqlite db chunks", nb_pruned)
+
+
+@app.crontab("30 3 * * *")
+async def prune_parse_caches():
+    nb_pruned = prune_parse_cache(settings.PARSE_CACHE_DIR, settings.PARSE_CACHE_MAX_AGE_DAYS * 24 * 60 * 60)
+    logger.info("Pruned %s unused cached parses", nb_pruned)
+
+
 async def regenerate_dbs() -> Msg:
     logger.info("Attempting to regenerate sqlite dbs")
 
@@ -71,6 +105,18 @@ async def regenerate_dbs() -> Msg:
     return {"msg": "success"}
 
 
+async def regenerate_snapshots() -> Msg:
+    logger.info("Attempting to regenerate definitions snapshots")
+    async with async_session() as db:
+        for manager in data.managers.values():
+            logger.info(f"Starting snapshot regen for {manager.from_lang} to {manager.to_lang}")
+            await write_definitions_snapshot(db, manager.from_lang, manager.to_lang)
+
+    logger.info("Finished regenerating definitions snapshots")
+
+    return {"msg": "success"}
+
+
 async def regenerate(regen_type: RegenerationType) -> Msg:
     logger.info(f"Attempting to regenerate caches: {regen_type.data_type=}, {regen_type.fakelimit=}")
     if regen_type.data_type in [DataType.all, DataType.definitions]:
@@ -82,6 +128,8 @@ async def regenerate(regen_type: RegenerationType) -> Msg:
         regenerate_character_jsons_multi()
     if regen_type.data_type in [DataType.all, DataType.sqlite]:
         await regenerate_dbs()
+    if regen_type.data_type in [DataType.all, DataType.snapshots]:
+        await regenerate_snapshots()
 
     logger.info("Finished regenerating caches")
 
@@ -11,6 +11,8 @@ from app.core.config import settings
 from app.data.asgi import TranscrobesGraphQL
 from app.data.context import get_broadcast
 from app.enrich import data
+from app.enrich.http_clients import close_http_clients, start_http_clients
+from app.enrich.process_pool import shutdown_process_pool
 from app.perdomain import get_content_response
 from fastapi import APIRouter, FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
@@ -27,12 +29,16 @@ app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/o
 @app.on_event("startup")
 async def startup_event():
     await aioproducer.start()
+    await start_http_clients()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await aioproducer.stop()
     await (await get_broadcast()).disconnect()
+    await close_http_clients()
+    # started on first use, e.g. by the content endpoints writing the data files of older imports
+    shutdown_process_pool()
 
 
 @app.exception_handler(RequestValidationError)
@@ -1,13 +1,21 @@
 from app.data.models import ActivityTypes
 from app.db.base_class import StatsBase
-from sqlalchemy import BigInteger, Column, Float, Identity, Integer, SmallInteger, String
+from sqlalchemy import BigInteger, Column, Float, Index, Integer, Sequence, SmallInteger, String
+
+# The event tables are partitioned by month of the event, see app.data.stats.partitions. Partitioned tables can't
+# have identity columns (before pg17) and their primary keys must include the partition key
 
 
 class UserActivity(StatsBase):
-    aid = Column(Integer, Identity(), primary_key=True)
+    __table_args__ = (
+        Index("ix_useractivity_user_id_activity_start", "user_id", "activity_start"),
+        {"postgresql_partition_by": "RANGE (activity_start)"},
+    )
+
+    aid = Column(Integer, Sequence("useractivity_aid_seq"), primary_key=True)
     user_id = Column(Integer, nullable=False)
     activity_type = Column(SmallInteger, default=ActivityTypes.DASHBOARD, nullable=False)
-    activity_start = Column(BigInteger, nullable=False)
+    activity_start = Column(BigInteger, primary_key=True)  # in ms
     activity_end = Column(BigInteger, nullable=False)
     data = Column(String(2000), nullable=True)
 
@@ -34,10 +42,15 @@ class UserWord(StatsBase):
 
 
 class ContentModelRead(StatsBase):
-    aid = Column(Integer, Identity(), primary_key=True)
+    __table_args__ = (
+        Index("ix_contentmodelread_user_id_read_at", "user_id", "read_at"),
+        {"postgresql_partition_by": "RANGE (read_at)"},
+    )
+
+    aid = Column(Integer, Sequence("contentmodelread_aid_seq"), primary_key=True)
     user_id = Column(Integer, primary_key=True)
     content_id = Column(String(36))
     href = Column(String(500))
     model_id = Column(BigInteger, nullable=False)
-    read_at = Column(Float, default=0)
+    read_at = Column(Float, default=0, primary_key=True)  # in secs
     word_count = Column(Integer, default=0)
@@ -151,5 +151,29 @@ async def gather_with_concurrency(n, *tasks):
     return await asyncio.gather(*(sem_task(task) for task in tasks))
 
 
+async def as_completed_with_concurrency(n, *tasks):
+    """
+    As `gather_with_concurrency`, but yields the results as they come in rather than all at the end. Tasks that
+    haven't finished are cancelled if the consumer stops iterating
+    """
+    semaphore = asyncio.Semaphore(n)
+
+    async def sem_task(task):
+        try:
+            async with semaphore:
+                return await task
+        finally:
+            if asyncio.iscoroutine(task):
+                task.close()  # those cancelled while queued were never started
+
+    running = [asyncio.ensure_future(sem_task(task)) for task in tasks]
+    try:
+        for finished in asyncio.as_completed(running):
+            yield await finished
+    finally:
+        for task in running:
+            task.cancel()
+
+
 def clean_broadcaster_string(original):
     return str(original).strip("'").strip('"')
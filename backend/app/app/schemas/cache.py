@@ -11,6 +11,7 @@ class DataType(str, Enum):
     sqlite = "sqlite"
     definitions = "definitions"
     characters = "characters"
+    snapshots = "snapshots"
     all = "all"
 
 
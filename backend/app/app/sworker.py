@@ -3,6 +3,7 @@
 import asyncio
 import logging
 import logging.config
+import multiprocessing
 import os
 
 # fmt: off
@@ -17,16 +18,22 @@ if sys.version_info >= (3, 12, 0):
 import time
 import traceback
 from datetime import datetime
+from itertools import batched
 
 import orjson
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener
+from aiokafka.admin import AIOKafkaAdminClient, NewPartitions, NewTopic
+from aiokafka.coordinator.assignors.range import RangePartitionAssignor
+from aiokafka.errors import CommitFailedError
 from app.api.api_v1 import types
 from app.core.config import settings
-from app.data.importer.common import MCQ_QAG_OUTFILE_SUFFIX
+from app.data.importer.common import MCQ_QAG_OUTFILE_SUFFIX, qag_trigger_model_ids
 from app.data.models import ActivityTypes
-from app.data.stats import push_user_stats_update_to_clients
+from app.data.stats import push_user_stats_update_to_clients, stats_notifier
+from app.data.stats.partitions import maintain_event_partitions_forever
 from app.db.session import async_stats_session
 from app.models.stats import ContentModelRead, UserActivity, UserDay, UserWord
+from app.models.user import absolute_resources_path
 from app.schemas.files import ProcessData
 from app.stats import (
     ACTION_EVENT_TOPIC_NAME,
@@ -44,6 +51,7 @@ logging.config.dictConfig(settings.LOGGING)
 logger = logging.getLogger(__name__)
 
 CONSUMER_GROUP_ID = "tcstats"
+MAX_ROWS_PER_STATEMENT = 5000  # postgres has a limit of 65535 parameters per statement
 STATS_TOPICS_TO_CONSUME = [
     VOCAB_EVENT_TOPIC_NAME,
     ACTION_EVENT_TOPIC_NAME,
@@ -57,22 +65,6 @@ def get_event_dates(tstamp):
     return tstamp / 1000.0 or time.time()
 
 
-async def send_updates(word_updates, day_updates, update_ids, include_success=False):
-    async with async_stats_session() as db:
-        if len(word_updates) > 0:
-            stmt = send_word_updates(word_updates)
-            await db.execute(stmt)
-        if len(day_updates) > 0:
-            stmt_day = send_day_updates(day_updates, include_success)
-            await db.execute(stmt_day)
-        await db.commit()
-
-    if len(day_updates) > 0:
-        await push_user_stats_update_to_clients(update_ids, types.camel_to_snake(types.DayModelStats.__name__)),
-    if len(word_updates) > 0:
-        await push_user_stats_update_to_clients(update_ids, types.camel_to_snake(types.WordModelStats.__name__)),
-
-
 def activity_from_url(origurl: str) -> ActivityTypes:
     url = origurl.strip().removeprefix("https://").removeprefix("http://")
     internal = False
@@ -131,89 +123,17 @@ def activity_from_url(origurl: str) -> ActivityTypes:
     return ActivityTypes.UNKNOWN
 
 
-async def activity_event(events):
-    if not events:
-        logger.warning("Empty activity events received")
-        return
-    logger.info(f"{len(events)} activity events received")
-    activities = []
-    for event in events:
-        activities.append(
-            {
-                "user_id": event["user_id"],
-                "activity_type": activity_from_url(event["data"] or "").value,
-                "activity_start": int(event["start"]),
-                "activity_end": int(event["end"]),
-                "data": event["data"],
-            }
-        )
-    stmt = postgresql.insert(UserActivity).values(activities)
-    async with async_stats_session() as db:
-        await db.execute(stmt)
-        await db.commit()
-
-    logger.info(f"{len(events)} activity events saved")
-
-
-async def action_event(events, tstamp):
-    if not events:
-        logger.warning("Empty action events received")
-        return
-    logger.info(f"{len(events)} action events received")
-
-    update_ids = set()
-    day_updates = {}
-    word_updates = {}
-    now = get_event_dates(tstamp)
-    today = int(datetime.fromtimestamp(now).strftime("%Y%m%d"))
-    for event in events:
-        user_id = event["user_id"]
-        update_ids.add(user_id)
-        day_key = f"{user_id}_{today}"
-        if day_key not in day_updates:
-            day_updates[day_key] = {"user_id": user_id, "day": today, "nb_seen": 0, "nb_checked": 0, "updated_at": now}
-        day = day_updates[day_key]
-
-        target_word_original = event["target_word"]
-        target_word = target_word_original.lower()
-
-        word_key = f"{user_id}_{target_word}"
-        if word_key not in word_updates:
-            word_updates[word_key] = {
-                "user_id": user_id,
-                "graph": target_word,
-                "nb_seen": 0,
-                "nb_checked": 0,
-                "nb_seen_since_last_check": 0,
-                "updated_at": now,
-            }
-        vord = word_updates[word_key]
-
-        vord["nb_seen"] += 1
-        vord["last_seen"] = now
-        vord["last_checked"] = now
-        vord["nb_seen_since_last_check"] = 0
-        vord["nb_checked"] += 1
-        day["nb_seen"] += 1
-        day["nb_checked"] += 1
-
-    await send_updates(word_updates, day_updates, list(update_ids))
-    logger.info(f"Actions sent to statsdb for user_ids {list(update_ids)}")
-
-
-def send_word_updates(word_updates):
-    stmt = postgresql.insert(UserWord).values(list(word_updates.values()))
+def send_word_updates(word_rows):
+    stmt = postgresql.insert(UserWord).values(list(word_rows))
     update_dict = dict(
         nb_seen=UserWord.nb_seen + stmt.excluded.nb_seen,
         last_seen=case((stmt.excluded.last_seen > 0, stmt.excluded.last_seen), else_=UserWord.last_seen),
         nb_checked=UserWord.nb_checked + stmt.excluded.nb_checked,
         last_checked=case((stmt.excluded.last_checked > 0, stmt.excluded.last_checked), else_=UserWord.last_checked),
+        # if the word was checked in the update then it has the number seen since then, else the number to add
         nb_seen_since_last_check=case(
-            (
-                stmt.excluded.nb_seen_since_last_check > 0,
-                UserWord.nb_seen_since_last_check + stmt.excluded.nb_seen_since_last_check,
-            ),
-            else_=0,
+            (stmt.excluded.last_checked > 0, stmt.excluded.nb_seen_since_last_check),
+            else_=UserWord.nb_seen_since_last_check + stmt.excluded.nb_seen_since_last_check,
         ),
         updated_at=stmt.excluded.updated_at,
     )
@@ -224,8 +144,8 @@ def send_word_updates(word_updates):
     return stmt
 
 
-def send_day_updates(day_updates, include_success):
-    stmt = postgresql.insert(UserDay).values(list(day_updates.values()))
+def send_day_updates(day_rows, include_success):
+    stmt = postgresql.insert(UserDay).values(list(day_rows))
     update_dict = dict(
         nb_seen=UserDay.nb_seen + stmt.excluded.nb_seen,
         nb_checked=UserDay.nb_checked + stmt.excluded.nb_checked,
@@ -241,172 +161,273 @@ def send_day_updates(day_updates, include_success):
     return stmt
 
 
-async def vocab_event(events, tstamp):
-    if not events:
-        logger.warning("Empty vocab events received")
-        return
-    logger.info(f"{len(events)} Vocab events received")
-    update_ids = set()
-    word_updates = {}
-    day_updates = {}
-
-    now = get_event_dates(tstamp)
-    today = int(datetime.fromtimestamp(now).strftime("%Y%m%d"))
-    for event in events:
-        user_id = event["user_id"]
-        update_ids.add(user_id)
-        day_key = f"{user_id}_{today}"
-        if day_key not in day_updates:
-            day_updates[day_key] = {"user_id": user_id, "day": today, "nb_seen": 0, "nb_checked": 0, "updated_at": now}
-        day = day_updates[day_key]
-        for k_original, v in event["data"].items():
-            k = k_original.lower()
-            word_key = f"{user_id}_{k}"
-            if word_key not in word_updates:
-                word_updates[word_key] = {
-                    "user_id": user_id,
-                    "graph": k,
-                    "nb_seen": 0,
-                    "nb_checked": 0,
-                    "nb_seen_since_last_check": 0,
-                    "updated_at": now,
-                }
-            vord = word_updates[word_key]
-            vord["nb_seen"] += v[0]
-            vord["last_seen"] = now
-            day["nb_seen"] += v[0]
-            if v[1] > 0:
-                vord["last_checked"] = now
-                vord["nb_seen_since_last_check"] = 0
-                vord["nb_checked"] += v[1]
-                day["nb_checked"] += v[1]
-            else:
-                vord["nb_seen_since_last_check"] += v[0]
-
-    await send_updates(word_updates, day_updates, list(update_ids))
-    logger.info(f"Vocabs sent to statsdb for user_ids {list(update_ids)}")
-
-
-async def card_event(events, tstamp):
-    if not events:
-        logger.warning("Empty card events received")
-        return
-    logger.info(f"{len(events)} Card events received")
-
-    update_ids = set()
-    day_updates = {}
-    word_updates = {}
-    now = get_event_dates(tstamp)
-    today = int(datetime.fromtimestamp(now).strftime("%Y%m%d"))
-
-    for event in events:
-        user_id = event["user_id"]
-        update_ids.add(user_id)
-        day_key = f"{user_id}_{today}"
-        if day_key not in day_updates:
-            day_updates[day_key] = {
+class StatsWindow:
+    """
+    The events of a window of messages, with the word and day deltas of all of them merged in memory (in the order
+    they were received), so the whole window is written with a single statement per table and a single commit
+    """
+
+    def __init__(self):
+        self.update_ids = set()
+        self.word_updates = {}
+        self.day_updates = {}
+        self.activities = []
+        self.model_reads = []
+        self.last_reads = []
+
+    def day(self, user_id, now):
+        self.update_ids.add(user_id)
+        today = int(datetime.fromtimestamp(now).strftime("%Y%m%d"))
+        if (user_id, today) not in self.day_updates:
+            self.day_updates[(user_id, today)] = {
                 "user_id": user_id,
                 "day": today,
                 "nb_failures": 0,
                 "nb_success": 0,
                 "nb_seen": 0,
                 "nb_checked": 0,
-                "updated_at": now,
             }
-        day = day_updates[day_key]
-
-        target_word_original = event["target_word"]
-        target_word = target_word_original.lower()
+        day = self.day_updates[(user_id, today)]
+        day["updated_at"] = now
+        return day
 
-        word_key = f"{user_id}_{target_word}"
-        if word_key not in word_updates:
-            word_updates[word_key] = {
+    def word(self, user_id, graph, now):
+        if (user_id, graph) not in self.word_updates:
+            self.word_updates[(user_id, graph)] = {
                 "user_id": user_id,
-                "graph": target_word,
+                "graph": graph,
                 "nb_seen": 0,
+                "last_seen": 0,
                 "nb_checked": 0,
+                "last_checked": 0,
                 "nb_seen_since_last_check": 0,
-                "updated_at": now,
             }
-        vord = word_updates[word_key]
+        vord = self.word_updates[(user_id, graph)]
+        vord["updated_at"] = now
+        return vord
+
+    def add_activity_events(self, events):
+        for event in events:
+            self.activities.append(
+                {
+                    "user_id": event["user_id"],
+                    "activity_type": activity_from_url(event["data"] or "").value,
+                    "activity_start": int(event["start"]),
+                    "activity_end": int(event["end"]),
+                    "data": event["data"],
+                }
+            )
 
-        vord["nb_seen"] += 1
-        vord["last_seen"] = now
-        day["nb_seen"] += 1
+    def add_action_events(self, events, tstamp):
+        now = get_event_dates(tstamp)
+        for event in events:
+            day = self.day(event["user_id"], now)
+            vord = self.word(event["user_id"], event["target_word"].lower(), now)
 
-        if event["grade"] < 3:  # FIXME: use the constant
-            vord["nb_checked"] += 1
+            vord["nb_seen"] += 1
+            vord["last_seen"] = now
             vord["last_checked"] = now
             vord["nb_seen_since_last_check"] = 0
-            day["nb_failures"] += 1
+            vord["nb_checked"] += 1
+            day["nb_seen"] += 1
             day["nb_checked"] += 1
+
+    def add_vocab_events(self, events, tstamp):
+        now = get_event_dates(tstamp)
+        for event in events:
+            day = self.day(event["user_id"], now)
+            for k_original, v in event["data"].items():
+                vord = self.word(event["user_id"], k_original.lower(), now)
+                vord["nb_seen"] += v[0]
+                vord["last_seen"] = now
+                day["nb_seen"] += v[0]
+                if v[1] > 0:
+                    vord["last_checked"] = now
+                    vord["nb_seen_since_last_check"] = 0
+                    vord["nb_checked"] += v[1]
+                    day["nb_checked"] += v[1]
+                else:
+                    vord["nb_seen_since_last_check"] += v[0]
+
+    def add_card_events(self, events, tstamp):
+        now = get_event_dates(tstamp)
+        for event in events:
+            day = self.day(event["user_id"], now)
+            vord = self.word(event["user_id"], event["target_word"].lower(), now)
+
+            vord["nb_seen"] += 1
+            vord["last_seen"] = now
+            day["nb_seen"] += 1
+
+            if event["grade"] < 3:  # FIXME: use the constant
+                vord["nb_checked"] += 1
+                vord["last_checked"] = now
+                vord["nb_seen_since_last_check"] = 0
+                day["nb_failures"] += 1
+                day["nb_checked"] += 1
+            else:
+                day["nb_success"] += 1
+                vord["nb_seen_since_last_check"] += 1
+
+    def add_read_events(self, events):
+        for event in events:
+            mr = {
+                "user_id": event["user_id"],
+                "content_id": event["content_id"],
+                "href": event["href"],
+                "model_id": event["model_id"],
+                "read_at": event["read_at"],
+            }
+
+            self.model_reads.append(mr)
+            if event["read_at"] > time.time() - 60:
+                self.last_reads.append(mr)
+
+    def add(self, topic, events, tstamp) -> bool:
+        if not events:
+            logger.warning(f"Empty {topic} events received")
+        elif topic == ACTIVITY_EVENT_TOPIC_NAME:
+            self.add_activity_events(events)
+        elif topic == VOCAB_EVENT_TOPIC_NAME:
+            self.add_vocab_events(events, tstamp)
+        elif topic == ACTION_EVENT_TOPIC_NAME:
+            self.add_action_events(events, tstamp)
+        elif topic == CARD_EVENT_TOPIC_NAME:
+            self.add_card_events(events, tstamp)
+        elif topic == READ_EVENT_TOPIC_NAME:
+            self.add_read_events(events)
         else:
-            day["nb_success"] += 1
-            vord["nb_seen_since_last_check"] += 1
+            return False
+        return True
+
+    def merge(self, other: "StatsWindow") -> None:
+        """Merge in the events of `other`, as if they had been added to this window after its own"""
+        self.update_ids |= other.update_ids
+        for key, day in other.day_updates.items():
+            merged = self.day_updates.setdefault(key, day)
+            if merged is not day:
+                for counter in ("nb_failures", "nb_success", "nb_seen", "nb_checked"):
+                    merged[counter] += day[counter]
+                merged["updated_at"] = day["updated_at"]
+        for key, vord in other.word_updates.items():
+            merged = self.word_updates.setdefault(key, vord)
+            if merged is vord:
+                continue
+            merged["nb_seen"] += vord["nb_seen"]
+            merged["nb_checked"] += vord["nb_checked"]
+            merged["last_seen"] = vord["last_seen"] or merged["last_seen"]
+            if vord["last_checked"]:
+                merged["last_checked"] = vord["last_checked"]
+                merged["nb_seen_since_last_check"] = vord["nb_seen_since_last_check"]
+            else:
+                merged["nb_seen_since_last_check"] += vord["nb_seen_since_last_check"]
+            merged["updated_at"] = vord["updated_at"]
+        self.activities += other.activities
+        self.model_reads += other.model_reads
+        self.last_reads += other.last_reads
+
+    async def save(self, session_maker=async_stats_session):
+        statements = []
+        for block in batched(list(self.word_updates.values()), MAX_ROWS_PER_STATEMENT):
+            statements.append(send_word_updates(block))
+        for block in batched(list(self.day_updates.values()), MAX_ROWS_PER_STATEMENT):
+            statements.append(send_day_updates(block, True))
+        for block in batched(self.activities, MAX_ROWS_PER_STATEMENT):
+            statements.append(postgresql.insert(UserActivity).values(block))
+        for block in batched(self.model_reads, MAX_ROWS_PER_STATEMENT):
+            statements.append(postgresql.insert(ContentModelRead).values(block))
+        if not statements:
+            return
+
+        async with session_maker() as db:
+            for stmt in statements:
+                await db.execute(stmt)
+            await db.commit()
+        logger.info(
+            f"Saved {len(self.word_updates)} word, {len(self.day_updates)} day, {len(self.activities)} activity "
+            f"and {len(self.model_reads)} read updates for user_ids {list(self.update_ids)}"
+        )
 
-    await send_updates(word_updates, day_updates, list(update_ids), True)
-    logger.info(f"Card events sent to statsdb for user_ids {list(update_ids)}")
+    async def notify(self):
+        if self.day_updates:
+            await push_user_stats_update_to_clients(
+                list(self.update_ids), types.camel_to_snake(types.DayModelStats.__name__)
+            )
+        if self.word_updates:
+            await push_user_stats_update_to_clients(
+                list(self.update_ids), types.camel_to_snake(types.WordModelStats.__name__)
+            )
+        if self.last_reads:
+            await trigger_qags(self.last_reads)
 
 
 async def run_qag(id):
     file_event = ProcessData(type="mcq", id=id)
-    logger.log(f"{id} should now be sent to kafka")
+    logger.info(f"{id} should now be sent to kafka")
     await qag_process_topic.send(value=file_event)
 
 
-def model_strings(chapter_path: str) -> set[str]:
-    if not os.path.exists(chapter_path):
-        return None
-    output = set()
-    with open(chapter_path, "r") as f:
-        qags = orjson.loads(f.read())
-        for qag in qags:
-            # FIXME: use a const for the "-"
-            output.add(qag["modelIds"].split("-")[-1])
-    return output
+class QagTriggerIndex:
+    """
+    The ids of the models that trigger a QAG when read, per MCQ file (so per user, content and href). A file only
+    gets parsed when first looked up or when its mtime has changed, and that is only checked every `recheck_secs`,
+    so looking up recent read events is a set lookup. MCQ files are only written once by the importer, so a file
+    that is missing or gets written is noticed within `recheck_secs`.
+    """
+
+    def __init__(self, recheck_secs: float = 60, max_files: int = 10000):
+        self.recheck_secs = recheck_secs
+        self.max_files = max_files
+        # path -> (mtime_ns or None when missing, monotonic time of the last check, trigger model ids)
+        self._files: dict[str, tuple[int | None, float, set[str]]] = {}
+
+    @staticmethod
+    def mcq_path(user_id, content_id, href) -> str:
+        return absolute_resources_path(int(user_id), f"{content_id}/{href}{MCQ_QAG_OUTFILE_SUFFIX}")
+
+    @staticmethod
+    def _read(path: str) -> set[str]:
+        try:
+            with open(path, "rb") as f:
+                return qag_trigger_model_ids(orjson.loads(f.read())["qags"])
+        except FileNotFoundError:
+            return set()
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            logger.exception(f"Invalid MCQ file {path}")
+            return set()
+
+    def triggers(self, path: str, now: float | None = None) -> set[str]:
+        now = time.monotonic() if now is None else now
+        entry = self._files.get(path)
+        if entry and now - entry[1] < self.recheck_secs:
+            return entry[2]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if entry and entry[0] == mtime:
+            model_ids = entry[2]
+        else:
+            model_ids = self._read(path) if mtime is not None else set()
 
+        # keep the most recently checked files, dropping the oldest when there are too many
+        self._files.pop(path, None)
+        if len(self._files) >= self.max_files:
+            del self._files[next(iter(self._files))]
+        self._files[path] = (mtime, now, model_ids)
+        return model_ids
 
-async def read_event(events):
-    if not events:
-        logger.warning("Empty read events received")
-        return
-    logger.info(f"{len(events)} Read events received")
-
-    model_reads = []
-    last_read = []
-    for event in events:
-        mr = {
-            "user_id": event["user_id"],
-            "content_id": event["content_id"],
-            "href": event["href"],
-            "model_id": event["model_id"],
-            "read_at": event["read_at"],
-        }
 
-        model_reads.append(mr)
-        if event["read_at"] > time.time() - 60:
-            last_read.append(mr)
+qag_trigger_index = QagTriggerIndex()
 
-    stmt = postgresql.insert(ContentModelRead).values(model_reads)
-    async with async_stats_session() as db:
-        await db.execute(stmt)
-        await db.commit()
 
+async def trigger_qags(last_read, index: QagTriggerIndex = qag_trigger_index):
     # are there any models that are the last for a given qag and were read within the last minute?
     # - if so, send them to the qag worker
-    pots = {}
     to_run = []
     for event in last_read:
-        mcq_path = os.path.join(
-            settings.MEDIA_ROOT,
-            event["user_id"],
-            "resources",
-            event["content_id"],
-            event["href"] + MCQ_QAG_OUTFILE_SUFFIX,
-        )
-        if os.path.exists(mcq_path):
-            pots[mcq_path] = model_strings(mcq_path)
-        if event["model_id"] in pots[mcq_path]:
+        mcq_path = index.mcq_path(event["user_id"], event["content_id"], event["href"])
+        if str(event["model_id"]) in index.triggers(mcq_path):
             to_run.append(event)
     if len(to_run) > 0:
         newlist = sorted(to_run, key=lambda d: d["read_at"], reverse=True)
@@ -414,58 +435,202 @@ async def read_event(events):
         # await run_qag(event["content_id"], event["href"], event["model_id"])
         await run_qag(f'{event["user_id"]}:{event["content_id"]}/{event["href"]}:{event["model_id"]}')
 
-    logger.info(f"{len(events)} read events saved")
+
+async def get_window(consumer, window_ms, max_records):
+    """
+    Wait (up to `window_ms`) for messages, then keep getting them until `window_ms` after the first ones arrived or
+    until there are `max_records`, whichever comes first
+    """
+    messages = []
+    deadline = None
+    while len(messages) < max_records:
+        timeout_ms = window_ms if deadline is None else max(0, int((deadline - time.monotonic()) * 1000))
+        batches = await consumer.getmany(timeout_ms=timeout_ms, max_records=max_records - len(messages))
+        for partition_messages in batches.values():
+            messages += partition_messages
+        if not messages:
+            break
+        if deadline is None:
+            deadline = time.monotonic() + window_ms / 1000
+        elif time.monotonic() >= deadline:
+            break
+    return messages
+
+
+class CommitBeforeRevoke(ConsumerRebalanceListener):
+    """
+    Makes a rebalance wait for the window being consumed to be saved and its offsets committed before the partitions
+    are revoked, rather than the commit failing and the new owners of the partitions counting the window again
+    """
+
+    def __init__(self, window_lock: asyncio.Lock):
+        self.window_lock = window_lock
+
+    async def on_partitions_revoked(self, revoked):
+        async with self.window_lock:
+            logger.info(f"Revoking partitions {revoked}")
+
+    async def on_partitions_assigned(self, assigned):
+        logger.info(f"Assigned partitions {assigned}")
+
+
+async def consume(
+    consumer,
+    window_ms=settings.KAFKA_STATS_BATCH_WINDOW_MS,
+    max_records=settings.KAFKA_MAX_POLL_RECORDS,
+    session_maker=async_stats_session,
+    notify=True,
+    max_windows=None,
+    window_lock: asyncio.Lock | None = None,
+):
+    """
+    Consume windows of messages, merging each window into a `StatsWindow` that is saved in a single transaction.
+    Offsets are only committed once that has been committed, so a crash means the window gets processed again.
+    `window_lock` is held from getting a window until its offsets are committed, for `CommitBeforeRevoke`.
+    """
+    window_lock = window_lock or asyncio.Lock()
+    nb_windows = 0
+    while max_windows is None or nb_windows < max_windows:
+        async with window_lock:
+            messages = await get_window(consumer, window_ms, max_records)
+            if not messages:
+                continue
+            window = StatsWindow()
+            for msg in messages:
+                logger.debug(
+                    "{}:{:d}:{:d}: key={} value={} timestamp_ms={}".format(
+                        msg.topic, msg.partition, msg.offset, msg.key, msg.value, msg.timestamp
+                    )
+                )
+                # each message goes through a window of its own first, so a bad event can't leave it half applied
+                message_window = StatsWindow()
+                try:
+                    if not message_window.add(msg.topic, orjson.loads(msg.value), msg.timestamp):
+                        logger.warning(f"Received unknown message: {msg.topic=}, {msg.value=}, {msg.timestamp=}")
+                except Exception:  # pylint: disable=W0703
+                    # only the bad message is skipped, rather than the whole window failing and being replayed forever
+                    logger.exception(f"Received invalid message: {msg.topic=}, {msg.value=}, {msg.timestamp=}")
+                else:
+                    window.merge(message_window)
+
+            await window.save(session_maker)
+            try:
+                await consumer.commit()
+            except CommitFailedError:
+                # the group rebalanced without us (e.g. a session timeout), so the window will be consumed again
+                logger.exception(f"Failed to commit the offsets of a saved window of {len(messages)} messages")
+        logger.info(f"Processed a window of {len(messages)} messages")
+        if notify:
+            await window.notify()
+        nb_windows += 1
+
+
+async def ensure_topics() -> bool:
+    """
+    Create the stats topics that don't exist yet with STATS_TOPICS_PARTITIONS partitions, so that there is something
+    for each of the consumers to own, and give the others as many partitions as the largest, so that a user's events
+    are in the same partition of every topic. Returns whether the topics all have the same number of partitions.
+    """
+    admin = AIOKafkaAdminClient(bootstrap_servers=settings.KAFKA_BROKER)
+    await admin.start()
+    try:
+        existing = await admin.list_topics()
+        missing = [topic for topic in STATS_TOPICS_TO_CONSUME if topic not in existing]
+        if missing:
+            logger.info(f"Creating topics {missing} with {settings.STATS_TOPICS_PARTITIONS} partitions")
+            await admin.create_topics(
+                [
+                    NewTopic(topic, settings.STATS_TOPICS_PARTITIONS, settings.STATS_TOPICS_REPLICATION_FACTOR)
+                    for topic in missing
+                ]
+            )
+        nb_partitions = {
+            topic["topic"]: len(topic["partitions"]) for topic in await admin.describe_topics(STATS_TOPICS_TO_CONSUME)
+        }
+        target = max(nb_partitions.values())
+        smaller = {topic: NewPartitions(target) for topic, nb in nb_partitions.items() if nb < target}
+        if smaller:
+            # this moves some users of those topics to other partitions, so their messages in flight might be
+            # processed out of order, but only this once, rather than their events always being split between consumers
+            logger.warning(f"Increasing the partitions of {list(smaller)} from {nb_partitions} to {target}")
+            await admin.create_partitions(smaller)
+        return True
+    except Exception:  # pylint: disable=W0703
+        # most likely a topic created in the meantime by a producer, with the broker's defaults, fixed on the next start
+        logger.exception("Failed to create or repartition the stats topics")
+        return False
+    finally:
+        await admin.close()
 
 
-async def main():
+async def run_consumer(maintain_partitions=True):
+    window_lock = asyncio.Lock()
     consumer = AIOKafkaConsumer(
-        *STATS_TOPICS_TO_CONSUME,
         bootstrap_servers=settings.KAFKA_BROKER,
         group_id=CONSUMER_GROUP_ID,
         auto_offset_reset="earliest",
+        enable_auto_commit=False,
+        max_poll_records=settings.KAFKA_MAX_POLL_RECORDS,
+        # gives each consumer the same partitions of every topic, where the default round robin spreads them
+        partition_assignment_strategy=(RangePartitionAssignor,),
     )
+    consumer.subscribe(STATS_TOPICS_TO_CONSUME, listener=CommitBeforeRevoke(window_lock))
 
     await consumer.start()
+    # only one of the consumer processes takes care of the event partitions
+    maintenance = asyncio.create_task(maintain_event_partitions_forever()) if maintain_partitions else None
     try:
-        async for msg in consumer:
-            if msg is None:
-                logging.warning("Got a None message")
-                continue
-            logger.debug(
-                "{}:{:d}:{:d}: key={} value={} timestamp_ms={}".format(
-                    msg.topic, msg.partition, msg.offset, msg.key, msg.value, msg.timestamp
+        for topic in STATS_TOPICS_TO_CONSUME:
+            nb_partitions = len(consumer.partitions_for_topic(topic) or [])
+            if nb_partitions < settings.STATS_WORKER_CONSUMERS:
+                logger.warning(
+                    f"{topic} only has {nb_partitions} partitions for {settings.STATS_WORKER_CONSUMERS} consumers, "
+                    "some will be idle"
                 )
-            )
-            try:
-                if msg.topic == ACTIVITY_EVENT_TOPIC_NAME:
-                    logger.info(f"Received activity_event_topic message: {msg.timestamp}")
-                    # await activity_event(orjson.loads(msg.value), msg.timestamp)
-                    await activity_event(orjson.loads(msg.value))
-                elif msg.topic == VOCAB_EVENT_TOPIC_NAME:
-                    logger.info(f"Received vocab_event_topic message: {msg.timestamp}")
-                    await vocab_event(orjson.loads(msg.value), msg.timestamp)
-                elif msg.topic == ACTION_EVENT_TOPIC_NAME:
-                    logger.info(f"Received action_event_topic message: {msg.timestamp} ")
-                    await action_event(orjson.loads(msg.value), msg.timestamp)
-                elif msg.topic == CARD_EVENT_TOPIC_NAME:
-                    logger.info(f"Received card_event_topic message: {msg.timestamp} ")
-                    await card_event(orjson.loads(msg.value), msg.timestamp)
-                elif msg.topic == READ_EVENT_TOPIC_NAME:
-                    logger.info(f"Received read_event_topic message: {msg.timestamp} ")
-                    await read_event(orjson.loads(msg.value))
-                else:
-                    logger.warning(f"Received unknown message: {msg.topic=}, {msg.value=}, {msg.timestamp=}")
-                    continue
-            except orjson.JSONDecodeError as e:
-                logger.warning(f"Received invalid message: {msg.topic=}, {msg.value=}, {msg.timestamp=}")
-                logger.error(f"Error processing message: {e}")
-                traceback.print_exc()
+        await consume(consumer, window_lock=window_lock)
     except Exception as e:
         logger.error(f"Error processing message: {e}")
         traceback.print_exc()
     finally:
+        if maintenance:
+            maintenance.cancel()
+        await stats_notifier.flush()
         await consumer.stop()
 
 
+def consumer_process(maintain_partitions=True):
+    asyncio.run(run_consumer(maintain_partitions))
+
+
+def main():
+    # events are keyed by user, so each user's events of a topic are in a single partition, which is the same one for
+    # every topic when they have the same number of partitions. All the consumers are in the same group and the range
+    # assignor gives each of them the same partitions of every topic, so the events of a user are always processed in
+    # order and by a single consumer, and the aggregates of the consumers can never conflict.
+    same_partitions = asyncio.run(ensure_topics())
+    if settings.STATS_WORKER_CONSUMERS <= 1:
+        consumer_process()
+        return
+    if not same_partitions:
+        logger.error("The stats topics might not have the same number of partitions, only running a single consumer")
+        consumer_process()
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=consumer_process, args=(i == 0,), daemon=True)
+        for i in range(settings.STATS_WORKER_CONSUMERS)
+    ]
+    for process in processes:
+        process.start()
+    # if one dies then stop everything, and let the orchestrator restart the worker
+    while all(process.is_alive() for process in processes):
+        time.sleep(settings.KAFKA_STATS_LOOP_SLEEP_SECS)
+    logger.error("A stats consumer process died, stopping")
+    for process in processes:
+        process.terminate()
+    sys.exit(1)
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from app import enrich
+from app.api.api_v1.endpoints import enrich as enrich_endpoints
+from app.db.session import SessionPool
+from app.enrich import Enricher, models
+
+pytestmark = pytest.mark.asyncio
+
+USER = SimpleNamespace(lang_pair="zh-Hans:en", translation_providers=[])
+
+
+class FakeSession:
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeEnricher(Enricher):
+    def needs_enriching(self, token):
+        return True
+
+    async def _add_transliterations(self, db, sentence, transliterator):
+        pass
+
+    async def _add_slim_transliterations(self, db, sentence, transliterator):
+        pass
+
+    def _set_best_guess(self, sentence, token, token_definitions, available_def_providers):
+        pass
+
+    def _set_slim_best_guess(self, sentence, token, token_definitions, phone, available_def_providers):
+        pass
+
+    def _cleaned_sentence(self, sentence):
+        pass
+
+    def get_simple_pos(self, token):
+        pass
+
+    def normalise_punctuation(self, token):
+        pass
+
+    def clean_text(self, text, remove_whitespace=False):
+        return text
+
+
+class FakeParser:
+    """One sentence per line, one token per word"""
+
+    async def parse(self, text):
+        return {
+            "sentences": [
+                {"tokens": [{"originalText": w, "lemma": w, "pos": "NN", "after": " "} for w in line.split()]}
+                for line in text.splitlines()
+            ]
+        }
+
+
+def definition(word):
+    return {word: (0.0, json.dumps({"id": len(word), "p": ""}), len(word))}
+
+
+async def records(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+async def test_enrich_json_stream_sends_sentences_before_the_slow_lookups(monkeypatch) -> None:
+    enricher = FakeEnricher({})
+    manager = SimpleNamespace(enricher=lambda: enricher, parser=FakeParser)
+    monkeypatch.setattr(enrich_endpoints, "managers", SimpleNamespace(get=lambda lang_pair: manager))
+    monkeypatch.setattr(enrich, "SessionPool", lambda size: SessionPool(size, FakeSession))
+    # everything but "slow" is in the in-memory cache, and "slow" is only found once the other sentences are out
+    monkeypatch.setattr(
+        models, "all_def_entries", lambda manager, oword, word: {} if word == "slow" else definition(word)
+    )
+    sent = asyncio.Event()
+
+    async def definitions(db, manager, token):
+        await sent.wait()
+        return definition(token["l"])
+
+    monkeypatch.setattr(models, "definitions", definitions)
+
+    response = await enrich_endpoints.enrich_json_stream(
+        enrich_endpoints.InfoRequest(data="a cached sentence\nslow one\nlast"), current_user=USER
+    )
+    lines = response.body_iterator
+    first = [json.loads(await asyncio.wait_for(lines.__anext__(), 1)) for _ in range(2)]
+    sent.set()
+    rest = [json.loads(line) async for line in lines]
+
+    assert sorted(record["i"] for record in first) == [0, 2]
+    assert [record.get("i") for record in rest] == [1, None]
+    assert [token["id"] for token in rest[0]["s"]["t"]] == [4, 3]
+    assert "id" in rest[-1]
+
+
+async def test_enrich_html_to_json_stream_record_order(monkeypatch) -> None:
+    async def enrich_html_fragment(text, manager):
+        return "<p>html</p>", {1: "slow model", 2: "fast model"}
+
+    async def enriched(timestamp, delay):
+        await asyncio.sleep(delay)
+        return {timestamp: {"s": timestamp}}
+
+    analysed = []
+
+    async def html_analysis(models):
+        analysed.extend(models)
+        return "analysis"
+
+    monkeypatch.setattr(enrich_endpoints, "managers", SimpleNamespace(get=lambda lang_pair: None))
+    monkeypatch.setattr(enrich_endpoints, "enrich_html_fragment", enrich_html_fragment)
+    monkeypatch.setattr(
+        enrich_endpoints, "html_model_futures", lambda slim_models, manager, user: [enriched(1, 0.05), enriched(2, 0)]
+    )
+    monkeypatch.setattr(enrich_endpoints, "html_analysis", html_analysis)
+
+    response = await enrich_endpoints.enrich_html_to_json_stream(
+        enrich_endpoints.InfoRequest(data="<p>html</p>"), current_user=USER
+    )
+
+    assert await records(response) == [
+        {"html": "<p>html</p>"},
+        {"models": {"2": {"s": 2}}},
+        {"models": {"1": {"s": 1}}},
+        {"analysis": "analysis"},
+    ]
+    assert analysed == [{"s": 2}, {"s": 1}]
@@ -0,0 +1,39 @@
+from app.cache.decoded import DECODED_SIZE_FACTOR, DecodedDefinitionsCache
+
+
+def test_lru_by_entries() -> None:
+    cache = DecodedDefinitionsCache(max_entries=2)
+    cache.put((1, 10.0, ("mst",)), "one", 10)
+    cache.put((2, 10.0, ("mst",)), "two", 10)
+    assert cache.get((1, 10.0, ("mst",))) == "one"
+    cache.put((3, 10.0, ("mst",)), "three", 10)
+
+    assert len(cache) == 2
+    assert cache.get((2, 10.0, ("mst",))) is None
+    assert cache.get((1, 10.0, ("mst",))) == "one"
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_lru_by_bytes() -> None:
+    cache = DecodedDefinitionsCache(max_bytes=100 * DECODED_SIZE_FACTOR)
+    cache.put((1, 10.0, ("mst",)), "one", 60)
+    cache.put((2, 10.0, ("mst",)), "two", 60)
+    cache.put((3, 10.0, ("mst",)), "too big", 101)
+
+    assert cache.get((1, 10.0, ("mst",))) is None
+    assert cache.get((2, 10.0, ("mst",))) == "two"
+    assert cache.get((3, 10.0, ("mst",))) is None
+    assert cache.nb_bytes == 60 * DECODED_SIZE_FACTOR
+
+
+def test_invalidate_word_id() -> None:
+    cache = DecodedDefinitionsCache()
+    cache.put((1, 10.0, ("mst",)), "one", 10)
+    cache.put((1, 10.0, ("mst", "fbk")), "one fbk", 10)
+    cache.put((2, 10.0, ("mst",)), "two", 10)
+    cache.invalidate(1)
+
+    assert len(cache) == 1
+    assert cache.get((1, 10.0, ("mst", "fbk"))) is None
+    assert cache.get((2, 10.0, ("mst",))) == "two"
+    assert cache.nb_bytes == 10 * DECODED_SIZE_FACTOR
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from app.cache.definitions import ZDICT_SAMPLE_ENTRIES, DefinitionsStore, SnapshotFormatException
+
+
+def definition_json(word: str, word_id: int, gloss: str = "a gloss") -> str:
+    return json.dumps({"w": word, "id": word_id, "defs": {"mst": {"NOUN": [{"nt": gloss, "cf": 0.5}]}}})
+
+
+def test_get_groups_by_lowercased_graph() -> None:
+    store = DefinitionsStore()
+    store.add("Apple", 10.0, definition_json("Apple", 1), 1)
+    store.add("apple", 20.0, definition_json("apple", 2), 2)
+
+    assert len(store) == 1
+    ts, defs = store.get("apple")
+    assert ts == 20.0
+    assert list(defs.keys()) == ["Apple", "apple"]
+    assert defs["Apple"] == (10.0, definition_json("Apple", 1), 1)
+    assert store.get("Apple") is None
+    assert store.get("pear", (0, {})) == (0, {})
+
+
+def test_word_id_and_max_timestamp() -> None:
+    store = DefinitionsStore()
+    assert not store
+    assert store.max_timestamp == 0
+    store.add("你好", 5.0, definition_json("你好", 42), 42)
+
+    assert store
+    assert store.word_id("你好") == 42
+    assert store.word_id("再见") is None
+    assert store.max_timestamp == 5.0
+
+
+def test_update_replaces_entry() -> None:
+    store = DefinitionsStore()
+    store.add("cat", 1.0, definition_json("cat", 3, "feline"), 3)
+    store.add("cat", 2.0, definition_json("cat", 3, "moggy"), 3)
+
+    assert store.nb_entries == 1
+    assert store.get("cat")[1]["cat"] == (2.0, definition_json("cat", 3, "moggy"), 3)
+
+
+def test_payloads_survive_compression() -> None:
+    store = DefinitionsStore()
+    words = [f"word{i}" for i in range(ZDICT_SAMPLE_ENTRIES * 3)]
+    for i, w in enumerate(words):
+        store.add(w, float(i), definition_json(w, i), i)
+    # rewrite some entries so that the buffer gets compacted
+    for i, w in enumerate(words):
+        store.add(w, float(i + len(words)), definition_json(w, i, "updated"), i)
+
+    for i, w in enumerate(words):
+        assert store.get(w)[1][w] == (float(i + len(words)), definition_json(w, i, "updated"), i)
+    assert store.payload_bytes < sum(len(definition_json(w, i, "updated")) for i, w in enumerate(words))
+
+
+def test_snapshot_roundtrip(tmp_path) -> None:
+    store = DefinitionsStore()
+    words = [f"Word{i}" for i in range(ZDICT_SAMPLE_ENTRIES * 2)]
+    for i, w in enumerate(words):
+        store.add(w, float(i), definition_json(w, i), i)
+    snapshot_path = str(tmp_path / "zh-Hans:en.definitions")
+    store.save(snapshot_path)
+
+    loaded = DefinitionsStore.load(snapshot_path)
+    assert len(loaded) == len(store)
+    assert loaded.max_timestamp == store.max_timestamp
+    for w in words:
+        assert loaded.get(w.lower()) == store.get(w.lower())
+
+    # entries added after loading are held in memory, and can replace the read-only snapshot entries
+    loaded.add("Word0", 100.0, definition_json("Word0", 0, "updated"), 0)
+    loaded.add("new", 101.0, definition_json("new", 999), 999)
+    assert loaded.get("word0")[1]["Word0"] == (100.0, definition_json("Word0", 0, "updated"), 0)
+    assert loaded.word_id("new") == 999
+    assert loaded.nb_entries == len(words) + 1
+
+
+def test_load_rejects_other_files(tmp_path) -> None:
+    not_a_snapshot = tmp_path / "other"
+    not_a_snapshot.write_bytes(b"\0" * 64)
+    with pytest.raises(SnapshotFormatException):
+        DefinitionsStore.load(str(not_a_snapshot))
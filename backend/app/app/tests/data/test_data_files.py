@@ -0,0 +1,42 @@
+import gzip
+import json
+import os
+
+from app.data.data_files import GZIP_SUFFIX, accepts_gzip, data_files_stale, write_data_files
+from app.data.models import DATA_JS_SUFFIX, DATA_JSON_SUFFIX, ENRICH_JSON_SUFFIX, PARSE_JSON_SUFFIX
+
+PARSE = {"1": {"s": [{"t": [{"l": "好", "pos": "VA"}, {"l": "。", "pos": "PU"}]}]}}
+ENRICH = {"1": {"s": [{"l1": "Good.", "t": [{"id": 12, "bg": "good"}, {}]}]}}
+MERGED = {
+    "1": {"s": [{"l1": "Good.", "t": [{"l": "好", "pos": "VA", "id": 12, "bg": "good"}, {"l": "。", "pos": "PU"}]}]}
+}
+
+
+def test_write_data_files(tmp_path) -> None:
+    base_path = os.path.join(tmp_path, "chapter.xhtml")
+    for suffix, content in ((PARSE_JSON_SUFFIX, PARSE), (ENRICH_JSON_SUFFIX, ENRICH)):
+        with open(f"{base_path}{suffix}", "w", encoding="utf8") as f:
+            json.dump(content, f)
+    assert data_files_stale(base_path, f"{base_path}{DATA_JSON_SUFFIX}")
+
+    write_data_files(base_path)
+
+    assert not data_files_stale(base_path, f"{base_path}{DATA_JSON_SUFFIX}")
+    with open(f"{base_path}{DATA_JSON_SUFFIX}", encoding="utf8") as f:
+        assert json.load(f) == MERGED
+    with gzip.open(f"{base_path}{DATA_JS_SUFFIX}{GZIP_SUFFIX}", "rt", encoding="utf8") as f:
+        content = f.read()
+    assert content.startswith("var transcrobesModel = ") and content.endswith(";")
+    assert json.loads(content.removeprefix("var transcrobesModel = ").removesuffix(";")) == MERGED
+
+
+def test_accepts_gzip() -> None:
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, GZIP;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip(None)
+    assert not accepts_gzip("br, deflate")
+    assert not accepts_gzip("gzip;q=0, br")
+    assert not accepts_gzip("gzip; q=0.000")
+    assert not accepts_gzip("*, gzip;q=0")
+    assert not accepts_gzip("identity, *;q=0")
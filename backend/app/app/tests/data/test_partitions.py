@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from app.data.stats.partitions import create_partition_sql, create_partition_statements, expired_partitions
+
+
+def test_partition_bounds_are_in_the_units_of_the_column() -> None:
+    december = datetime(2023, 12, 1, tzinfo=timezone.utc)
+    assert create_partition_sql("useractivity", december) == (
+        "CREATE TABLE IF NOT EXISTS useractivity_p202312 PARTITION OF useractivity "
+        "FOR VALUES FROM (1701388800000) TO (1704067200000)"
+    )
+    assert "FROM (1701388800) TO (1704067200)" in create_partition_sql("contentmodelread", december)
+
+
+def test_events_in_the_default_partition_are_moved_to_the_new_one() -> None:
+    december = datetime(2023, 12, 1, tzinfo=timezone.utc)
+    create_temp, move_out, create, move_in = create_partition_statements("contentmodelread", december)
+
+    assert create_temp.startswith("CREATE TEMPORARY TABLE contentmodelread_p202312_moved (LIKE contentmodelread)")
+    assert "DELETE FROM contentmodelread_default WHERE read_at >= 1701388800 AND read_at < 1704067200" in move_out
+    assert create == create_partition_sql("contentmodelread", december)
+    assert move_in == "INSERT INTO contentmodelread SELECT * FROM contentmodelread_p202312_moved"
+
+
+def test_only_partitions_entirely_older_than_the_retention_expire() -> None:
+    partitions = ["useractivity_default", "useractivity_p202311", "useractivity_p202312", "useractivity_p202401"]
+    now = datetime(2024, 2, 15, tzinfo=timezone.utc)
+
+    assert expired_partitions("useractivity", partitions, now, 0) == []
+    assert expired_partitions("useractivity", partitions, now, 2) == ["useractivity_p202311"]
+    assert expired_partitions("useractivity", partitions, now, 1) == ["useractivity_p202311", "useractivity_p202312"]
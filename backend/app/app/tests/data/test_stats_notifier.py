@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from app.data import stats
+from app.data.stats import StatsNotifier
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeBroadcast:
+    def __init__(self):
+        self.published = []
+
+    async def publish_many(self, events):
+        self.published.append(events)
+
+
+async def test_notifications_are_coalesced_into_one_publish(monkeypatch) -> None:
+    broadcast = FakeBroadcast()
+
+    async def get_broadcast():
+        return broadcast
+
+    monkeypatch.setattr(stats, "get_broadcast", get_broadcast)
+    notifier = StatsNotifier(0.01)
+    notifier.notify([1, 2], "day_model_stats")
+    notifier.notify([2], "day_model_stats")
+    notifier.notify([2], "word_model_stats")
+    assert not broadcast.published
+
+    await asyncio.sleep(0.05)
+    assert broadcast.published == [
+        [("changed1", "day_model_stats"), ("changed2", "day_model_stats"), ("changed2", "word_model_stats")]
+    ]
+
+    notifier.notify([3], "day_model_stats")
+    flush_later = notifier._flush_task
+    await notifier.flush()
+    assert broadcast.published[-1] == [("changed3", "day_model_stats")]
+    # the delayed flush is cancelled rather than left pending, and the next notification starts a new one
+    assert notifier._flush_task is None
+    await asyncio.sleep(0.05)
+    assert flush_later.cancelled()
+    assert len(broadcast.published) == 2
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from app.db.session import SessionPool
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeSession:
+    def __init__(self, opened: list):
+        self.closed = False
+        self.rolled_back = False
+        opened.append(self)
+
+    async def rollback(self):
+        self.rolled_back = True
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_sessions_are_bounded_and_reused() -> None:
+    opened = []
+    in_use = 0
+    peak = 0
+
+    async def use(sessions: SessionPool):
+        nonlocal in_use, peak
+        async with sessions.session():
+            in_use += 1
+            peak = max(peak, in_use)
+            await asyncio.sleep(0.001)
+            in_use -= 1
+
+    async with SessionPool(2, maker=lambda: FakeSession(opened)) as sessions:
+        await asyncio.gather(*(use(sessions) for _ in range(20)))
+
+    assert peak == 2
+    assert len(opened) == 2
+    assert all(db.closed for db in opened)
+
+
+async def test_failed_session_is_rolled_back() -> None:
+    opened = []
+    async with SessionPool(1, maker=lambda: FakeSession(opened)) as sessions:
+        with pytest.raises(ValueError):
+            async with sessions.session():
+                raise ValueError()
+        async with sessions.session() as db:
+            assert db is opened[0]
+    assert opened[0].rolled_back
@@ -0,0 +1,31 @@
+import pytest
+from app.en.lemmatize import RuleLemmatizer
+
+pytestmark = pytest.mark.asyncio
+
+HEADWORDS = "not note hat hate us use writ write plan plane rat rate hop hope car care sing box wish go city stop run"
+
+
+class FakeDictionary:
+    def __init__(self, config):
+        self.dico = {headword: [{"definitions": []}] for headword in HEADWORDS.split()}
+        self.dico["be"] = [{"definitions": [], "infls": [[{"hw": "was"}], [{"hw": "Were"}]]}]
+
+
+async def lemmas(words: str) -> str:
+    lemmatizer = RuleLemmatizer({"dictionary": {"classname": f"{__name__}.FakeDictionary", "config": {}}})
+    return " ".join([(await lemmatizer.lemmatize(word)).pop() for word in words.split()])
+
+
+async def test_stem_e_is_kept() -> None:
+    words = "notes hates uses writes planes rates noted hoped used caring hoping"
+    assert await lemmas(words) == "note hate use write plane rate note hope use care hope"
+
+
+async def test_regular_inflections() -> None:
+    words = "Boxes wishes goes cities stopped running hopped singing hats"
+    assert await lemmas(words) == "box wish go city stop run hop sing hat"
+
+
+async def test_irregular_headword_and_unknown_words() -> None:
+    assert await lemmas("were care xyzzies") == "be care xyzzies"
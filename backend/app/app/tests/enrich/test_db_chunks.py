@@ -0,0 +1,52 @@
+import os
+import random
+
+from app.enrich.db_chunks import CHUNK_MAX_PAGES, CHUNK_MIN_PAGES, CHUNK_PAGE_SIZE, prune_chunks, write_chunks
+
+
+def random_pages(rng: random.Random, nb_pages: int) -> list[bytes]:
+    return [rng.randbytes(CHUNK_PAGE_SIZE) for _ in range(nb_pages)]
+
+
+def write_file(path: str, pages: list[bytes]) -> str:
+    with open(path, "wb") as fh:
+        fh.write(b"".join(pages))
+    return path
+
+
+def test_chunks_reassemble_and_respect_sizes(tmp_path) -> None:
+    pages = random_pages(random.Random(1), 1000)
+    chunks_dir = tmp_path / "chunks"
+    chunks_dir.mkdir()
+    names = write_chunks(write_file(str(tmp_path / "tc.db"), pages), str(chunks_dir))
+
+    sizes = [os.path.getsize(chunks_dir / name) for name in names]
+    assert all(CHUNK_MIN_PAGES * CHUNK_PAGE_SIZE <= size <= CHUNK_MAX_PAGES * CHUNK_PAGE_SIZE for size in sizes[:-1])
+    assert b"".join((chunks_dir / name).read_bytes() for name in names) == b"".join(pages)
+
+
+def test_changed_pages_only_change_their_chunks(tmp_path) -> None:
+    rng = random.Random(2)
+    pages = random_pages(rng, 1000)
+    chunks_dir = tmp_path / "chunks"
+    chunks_dir.mkdir()
+    base_names = write_chunks(write_file(str(tmp_path / "base.db"), pages), str(chunks_dir))
+
+    personal = list(pages)
+    personal[500] = rng.randbytes(CHUNK_PAGE_SIZE)
+    personal += random_pages(rng, 10)
+    personal_names = write_chunks(write_file(str(tmp_path / "personal.db"), personal), str(chunks_dir))
+
+    assert len(set(personal_names) - set(base_names)) <= 4
+    assert len(os.listdir(chunks_dir)) == len(set(base_names) | set(personal_names))
+
+
+def test_prune_chunks(tmp_path) -> None:
+    chunks_dir = tmp_path / "chunks"
+    chunks_dir.mkdir()
+    names = write_chunks(write_file(str(tmp_path / "tc.db"), random_pages(random.Random(3), 100)), str(chunks_dir))
+    os.utime(chunks_dir / names[0], (0, 0))
+
+    assert prune_chunks(str(chunks_dir), 60) == 1
+    assert sorted(os.listdir(chunks_dir)) == sorted(set(names[1:]))
+    assert prune_chunks(str(tmp_path / "missing"), 60) == 0
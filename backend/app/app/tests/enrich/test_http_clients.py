@@ -0,0 +1,72 @@
+import asyncio
+
+import aiohttp
+import pytest
+from app.enrich.http_clients import AdaptiveLimiter, configured_backends
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_configured_backends() -> None:
+    config = {
+        "parse": {"classname": "x", "config": {"config": {"base_url": "http://corenlp:9001"}}},
+        "secondary": [{"config": {"api_host": "api.example.com"}}, {"config": {}}],
+    }
+    assert configured_backends(config) == {"http://corenlp:9001", "api.example.com"}
+
+
+async def test_waiting_requests_get_slots_in_order() -> None:
+    limiter = AdaptiveLimiter("test", initial=1, max_limit=1)
+    await limiter.acquire()
+    order = []
+
+    async def request(name):
+        await limiter.acquire()
+        order.append(name)
+        limiter.release()
+
+    waiting = [asyncio.create_task(request("first"))]
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(request("cancelled"))
+    waiting.append(asyncio.create_task(request("second")))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    limiter.release()
+    await asyncio.gather(*waiting)
+
+    assert order == ["first", "second"]
+    assert limiter.inflight == 0
+
+
+async def test_limit_adapts_to_latency_and_errors() -> None:
+    limiter = AdaptiveLimiter("test", initial=4, max_limit=10)
+    for _ in range(50):
+        limiter.inflight = int(limiter.limit)
+        limiter.on_success(0.1)
+    assert limiter.limit == 10
+
+    limiter.on_success(10)
+    assert limiter.limit == 9
+
+    limiter.inflight = 0
+    with pytest.raises(aiohttp.ClientResponseError):
+        async with limiter.slot():
+            raise aiohttp.ClientResponseError(None, (), status=503)
+    assert int(limiter.limit) == 6
+    assert limiter.inflight == 0
+
+
+async def test_large_requests_dont_shrink_the_limit_for_small_ones() -> None:
+    limiter = AdaptiveLimiter("test", initial=4, max_limit=10)
+    for _ in range(50):
+        limiter.inflight = int(limiter.limit)
+        limiter.on_success(0.01, size=5)
+    assert limiter.limit == 10
+
+    for _ in range(5):
+        limiter.on_success(2, size=20000)
+    assert limiter.limit == 10
+
+    limiter.on_success(1, size=5)
+    assert limiter.limit == 9
+    assert limiter.size_class(3) == limiter.size_class(0) != limiter.size_class(4)
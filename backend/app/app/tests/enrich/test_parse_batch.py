@@ -0,0 +1,77 @@
+import json
+import re
+
+import pytest
+from app.enrich.parse import HTTPCoreNLPProvider
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeCoreNLPProvider(HTTPCoreNLPProvider):
+    """Splits sentences on line breaks and tokens on spaces, with (UTF-16) offsets, like CoreNLP"""
+
+    documents = []
+
+    async def parse(self, text, provider_parameters=None, max_attempts=5, max_wait_between_attempts=300):
+        FakeCoreNLPProvider.documents.append((text, json.loads(provider_parameters or self._config["params"])))
+        tokens = []
+        for match in re.finditer(r"[^\s]+", text):
+            tokens.append(
+                {
+                    "word": match.group(0),
+                    "characterOffsetBegin": len(text[: match.start()].encode("utf-16-le")) // 2,
+                    "characterOffsetEnd": len(text[: match.end()].encode("utf-16-le")) // 2,
+                    "span": match.span(),
+                }
+            )
+        sentences = [[]]
+        for i, token in enumerate(tokens):
+            start = tokens[i - 1]["span"][1] if i else 0
+            end = tokens[i + 1]["span"][0] if i + 1 < len(tokens) else len(text)
+            token["before"] = text[start : token["span"][0]]
+            token["after"] = text[token["span"][1] : end]
+            sentences[-1].append(token)
+            if "\n" in token["after"] and i + 1 < len(tokens):
+                sentences.append([])
+        for token in tokens:
+            del token["span"]
+        return {"sentences": [{"index": i, "tokens": s} for i, s in enumerate(sentences)]}
+
+
+def provider(max_batch_chars=1000) -> FakeCoreNLPProvider:
+    FakeCoreNLPProvider.documents = []
+    return FakeCoreNLPProvider({"base_url": "", "params": '{"annotators":"lemma"}', "max_batch_chars": max_batch_chars})
+
+
+async def test_batch_matches_single_parses() -> None:
+    texts = [" 你好 世界 ", "𠀀 two\nlines", "last one"]
+    parser = provider()
+    batched = await parser.parse_many(texts)
+
+    assert len(FakeCoreNLPProvider.documents) == 1
+    assert FakeCoreNLPProvider.documents[0][1]["ssplit.newlineIsSentenceBreak"] == "always"
+    assert batched == [await parser.parse(text.replace("\n", " ")) for text in texts]
+
+
+async def test_batches_limited_by_chars() -> None:
+    parser = provider(max_batch_chars=12)
+    models = await parser.parse_many(["aaaa", "bbbb", "cccc", "dddddddddddddddd"])
+
+    assert [doc for doc, _props in FakeCoreNLPProvider.documents] == ["aaaa\nbbbb", "cccc", "dddddddddddddddd"]
+    assert [m["sentences"][0]["tokens"][0]["word"] for m in models] == ["aaaa", "bbbb", "cccc", "dddddddddddddddd"]
+
+
+async def test_offsets_past_the_end_stay_with_the_last_text() -> None:
+    class OverrunningProvider(FakeCoreNLPProvider):
+        async def parse(self, text, provider_parameters=None, max_attempts=5, max_wait_between_attempts=300):
+            model = await super().parse(text, provider_parameters, max_attempts, max_wait_between_attempts)
+            for token in model["sentences"][-1]["tokens"]:
+                token["characterOffsetBegin"] += 100
+                token["characterOffsetEnd"] += 100
+            return model
+
+    parser = OverrunningProvider({"base_url": "", "params": '{"annotators":"lemma"}', "max_batch_chars": 1000})
+    models = await parser.parse_many(["first", "second"])
+
+    assert [len(m["sentences"]) for m in models] == [1, 1]
+    assert models[1]["sentences"][0]["tokens"][0]["word"] == "second"
@@ -0,0 +1,81 @@
+import pytest
+from app.enrich.parse import ParseProvider
+from app.enrich.parse.cache import CachedParseProvider, prune_parse_cache
+
+pytestmark = pytest.mark.asyncio
+
+
+class CountingParseProvider(ParseProvider):
+    nb_calls = 0
+
+    async def parse(self, text, provider_parameters=None, max_attempts=5, max_wait_between_attempts=300):
+        CountingParseProvider.nb_calls += 1
+        return {"sentences": [{"tokens": [{"word": w} for w in text.split()]}], "params": provider_parameters}
+
+
+def cached_provider(path, version="1") -> CachedParseProvider:
+    return CachedParseProvider(
+        {
+            "classname": f"{__name__}.CountingParseProvider",
+            "config": {"params": "default"},
+            "path": str(path),
+            "version": version,
+        }
+    )
+
+
+async def test_memory_and_disk_tiers(tmp_path) -> None:
+    CountingParseProvider.nb_calls = 0
+    provider = cached_provider(tmp_path)
+    model = await provider.parse("the same text")
+    model["sentences"][0]["tokens"][0]["def"] = "modified by the caller"
+
+    assert await provider.parse("the same text") == {
+        "sentences": [{"tokens": [{"word": "the"}, {"word": "same"}, {"word": "text"}]}],
+        "params": None,
+    }
+    assert await cached_provider(tmp_path).parse("the same text") == await provider.parse("the same text")
+    assert CountingParseProvider.nb_calls == 1
+    assert provider.stats()["memory_hits"] == 2
+    assert provider.stats()["misses"] == 1
+
+
+async def test_key_includes_parameters_and_version(tmp_path) -> None:
+    CountingParseProvider.nb_calls = 0
+    provider = cached_provider(tmp_path)
+    await provider.parse("text")
+    await provider.parse("text", provider_parameters="other")
+    await cached_provider(tmp_path, version="2").parse("text")
+
+    assert CountingParseProvider.nb_calls == 3
+
+
+async def test_prune(tmp_path) -> None:
+    provider = cached_provider(tmp_path / "zh")
+    await provider.parse("text")
+
+    assert prune_parse_cache(str(tmp_path), 60) == 0
+    assert prune_parse_cache(str(tmp_path), -1) == 1
+    assert prune_parse_cache(str(tmp_path / "missing"), 60) == 0
+
+
+async def test_parse_many_only_parses_misses(tmp_path) -> None:
+    CountingParseProvider.nb_calls = 0
+    provider = cached_provider(tmp_path)
+    await provider.parse_many(["cached text"])
+    models = await provider.parse_many(["new text", "cached text", "other new text"])
+
+    assert [len(model["sentences"][0]["tokens"]) for model in models] == [2, 2, 3]
+    assert CountingParseProvider.nb_calls == 3
+    assert provider.stats()["memory_hits"] == 1
+
+
+async def test_batch_and_single_parses_are_cached_separately(tmp_path) -> None:
+    CountingParseProvider.nb_calls = 0
+    provider = cached_provider(tmp_path)
+    await provider.parse("text")
+    await provider.parse_many(["text"])
+    await provider.parse("text")
+    await provider.parse_many(["text"])
+
+    assert CountingParseProvider.nb_calls == 2
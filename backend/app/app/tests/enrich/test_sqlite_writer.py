@@ -0,0 +1,47 @@
+import contextlib
+import sqlite3
+
+import pytest
+from app.enrich.sqlite_writer import SqliteWriter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_writes_are_committed_in_order(tmp_path) -> None:
+    path = str(tmp_path / "tc.db")
+    writer = SqliteWriter(path, maxsize=1)
+    await writer.execute("CREATE TABLE words (id INTEGER, graph TEXT)")
+    for i in range(10):
+        await writer.executemany("INSERT INTO words VALUES (?, ?)", [(i * 100 + j, f"w{i}") for j in range(100)])
+    await writer.execute("CREATE UNIQUE INDEX idx_words_id ON words(id)")
+    await writer.close()
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT count(*), count(DISTINCT graph) FROM words").fetchone() == (1000, 10)
+    assert con.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == [("idx_words_id",)]
+    con.close()
+
+
+async def test_close_raises_the_first_error(tmp_path) -> None:
+    path = str(tmp_path / "tc.db")
+    writer = SqliteWriter(path)
+    await writer.execute("CREATE TABLE words (id INTEGER)")
+    await writer.execute("INSERT INTO missing VALUES (1)")
+    with contextlib.suppress(sqlite3.OperationalError):
+        # raised as soon as the writer thread has hit the error
+        await writer.executemany("INSERT INTO words VALUES (?)", [(1,)])
+    with pytest.raises(sqlite3.OperationalError):
+        await writer.close()
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT count(*) FROM words").fetchone() == (0,)
+    con.close()
+
+
+async def test_a_db_that_cant_be_opened_fails_the_writes_rather_than_blocking(tmp_path) -> None:
+    writer = SqliteWriter(str(tmp_path / "missing" / "tc.db"), maxsize=1)
+    with pytest.raises(sqlite3.OperationalError):
+        for _ in range(5):
+            await writer.execute("CREATE TABLE words (id INTEGER)")
+    with pytest.raises(sqlite3.OperationalError):
+        await writer.close()
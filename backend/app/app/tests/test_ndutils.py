@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from app.ndutils import as_completed_with_concurrency
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_as_completed_yields_as_results_come_in() -> None:
+    running = 0
+    max_running = 0
+
+    async def job(name, delay):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(delay)
+        running -= 1
+        return name
+
+    results = [
+        result
+        async for result in as_completed_with_concurrency(2, job("slow", 0.05), job("fast", 0), job("last", 0.01))
+    ]
+
+    assert results == ["fast", "last", "slow"]
+    assert max_running == 2
+
+
+async def test_as_completed_cancels_the_rest_when_the_consumer_stops() -> None:
+    started = []
+    cancelled = []
+
+    async def job(name, delay):
+        started.append(name)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        return name
+
+    results = as_completed_with_concurrency(1, job("fast", 0), job("slow", 10), job("never", 10))
+    assert await results.__anext__() == "fast"
+    await results.aclose()
+    await asyncio.sleep(0)
+
+    # the job that was running when the consumer stopped is cancelled, and the ones still queued never start
+    assert "never" not in started
+    assert cancelled == started[1:]
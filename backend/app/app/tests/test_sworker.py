@@ -0,0 +1,114 @@
+import os
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from aiokafka.errors import CommitFailedError
+from app.stats import CARD_EVENT_TOPIC_NAME, VOCAB_EVENT_TOPIC_NAME
+from app.sworker import QagTriggerIndex, StatsWindow, consume
+
+
+def test_window_merges_events_in_order() -> None:
+    window = StatsWindow()
+    window.add(VOCAB_EVENT_TOPIC_NAME, [{"user_id": 1, "data": {"好": [2, 0], "Hello": [1, 1]}}], 1_700_000_000_000)
+    window.add(CARD_EVENT_TOPIC_NAME, [{"user_id": 1, "target_word": "好", "grade": 1}], 1_700_000_001_000)
+    window.add(VOCAB_EVENT_TOPIC_NAME, [{"user_id": 1, "data": {"好": [3, 0]}}], 1_700_000_002_000)
+
+    assert len(window.day_updates) == 1
+    (day,) = window.day_updates.values()
+    assert (day["nb_seen"], day["nb_checked"], day["nb_failures"], day["nb_success"]) == (7, 2, 1, 0)
+
+    hao = window.word_updates[(1, "好")]
+    assert (hao["nb_seen"], hao["nb_checked"]) == (6, 1)
+    # checked by the failed card, then seen 3 times
+    assert (hao["last_checked"], hao["nb_seen_since_last_check"]) == (1_700_000_001, 3)
+    assert hao["last_seen"] == hao["updated_at"] == 1_700_000_002
+    assert window.word_updates[(1, "hello")]["nb_checked"] == 1
+    assert window.update_ids == {1}
+
+
+def test_merged_windows_match_adding_in_order() -> None:
+    messages = [
+        (VOCAB_EVENT_TOPIC_NAME, [{"user_id": 1, "data": {"好": [2, 0], "Hello": [1, 1]}}], 1_700_000_000_000),
+        (CARD_EVENT_TOPIC_NAME, [{"user_id": 1, "target_word": "好", "grade": 1}], 1_700_000_001_000),
+        (VOCAB_EVENT_TOPIC_NAME, [{"user_id": 1, "data": {"好": [3, 0], "hello": [2, 0]}}], 1_700_000_002_000),
+        (CARD_EVENT_TOPIC_NAME, [{"user_id": 2, "target_word": "好", "grade": 4}], 1_700_000_003_000),
+    ]
+    in_order = StatsWindow()
+    merged = StatsWindow()
+    for topic, events, tstamp in messages:
+        in_order.add(topic, events, tstamp)
+        message_window = StatsWindow()
+        message_window.add(topic, events, tstamp)
+        merged.merge(message_window)
+
+    assert merged.word_updates == in_order.word_updates
+    assert merged.day_updates == in_order.day_updates
+    assert merged.update_ids == in_order.update_ids == {1, 2}
+
+
+def test_qag_trigger_index_only_reads_files_that_changed(tmp_path) -> None:
+    path = str(tmp_path / "1.xhtml.mcqa.json")
+    index = QagTriggerIndex(recheck_secs=10)
+    assert index.triggers(path, now=0) == set()
+
+    with open(path, "wb") as f:
+        f.write(orjson.dumps({"file": "1.xhtml.parse.json", "qags": [{"modelIds": "1-2-3"}, {"modelIds": "7"}]}))
+    # the missing file is only checked again after recheck_secs
+    assert index.triggers(path, now=5) == set()
+    assert index.triggers(path, now=10) == {"3", "7"}
+
+    os.remove(path)
+    assert index.triggers(path, now=15) == {"3", "7"}
+    assert index.triggers(path, now=20) == set()
+
+
+class FakeSession:
+    def __init__(self, executed):
+        self.executed = executed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        self.executed.append(stmt)
+
+    async def commit(self):
+        pass
+
+
+class RebalancedConsumer:
+    def __init__(self, values):
+        self.messages = [
+            SimpleNamespace(topic=VOCAB_EVENT_TOPIC_NAME, partition=0, offset=i, key=None, value=v, timestamp=1)
+            for i, v in enumerate(values)
+        ]
+
+    async def getmany(self, timeout_ms, max_records):
+        messages, self.messages = self.messages, []
+        return {0: messages} if messages else {}
+
+    async def commit(self):
+        raise CommitFailedError("rebalanced")
+
+
+@pytest.mark.asyncio
+async def test_bad_messages_and_failed_commits_dont_stop_the_consumer() -> None:
+    consumer = RebalancedConsumer(
+        [
+            orjson.dumps([{"user_id": 1, "data": {"好": [1, 0]}}]),
+            orjson.dumps([{"user_id": 1}]),
+            # the good event of a message with a bad one isn't applied either
+            orjson.dumps([{"user_id": 1, "data": {"好": [4, 0]}}, {"user_id": 1}]),
+            b"not json",
+            orjson.dumps([{"user_id": 1, "data": {"好": [2, 0]}}]),
+        ]
+    )
+    executed = []
+    await consume(consumer, 0, 10, lambda: FakeSession(executed), notify=False, max_windows=1)
+
+    (word_rows,) = [stmt.compile().params for stmt in executed if "userword" in str(stmt)]
+    assert word_rows["nb_seen_m0"] == 3
@@ -0,0 +1,35 @@
+import pytest
+from app.zhhans.parse import MaxMatchParseProvider
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeDictionary:
+    def __init__(self, config):
+        self.dico = {
+            "我们": [{"definitions": [["", "pr.", "we"]]}],
+            "喜欢": [{"definitions": [["", "v.", "to like"]]}],
+            "中国": [{"definitions": []}],
+            "中国人": [{"phone": "[zhong1 guo2 ren2]", "definitions": ["Chinese person"]}],
+        }
+
+
+def provider() -> MaxMatchParseProvider:
+    return MaxMatchParseProvider({"dictionaries": [{"classname": f"{__name__}.FakeDictionary", "config": {}}]})
+
+
+async def test_longest_dictionary_words() -> None:
+    assert provider().segment("我们喜欢中国人民") == ["我们", "喜欢", "中国人", "民"]
+
+
+async def test_corenlp_shaped_model() -> None:
+    model = await provider().parse("我们喜欢 2 个𠀀。\n中国人 like")
+    sentences = [[(t["word"], t["pos"], t["characterOffsetBegin"]) for t in s["tokens"]] for s in model["sentences"]]
+
+    assert sentences == [
+        [("我们", "PN", 0), ("喜欢", "VV", 2), ("2", "CD", 5), ("个", "NN", 7), ("𠀀", "FW", 8), ("。", "PU", 10)],
+        [("中国人", "NN", 12), ("like", "FW", 16)],
+    ]
+    first = model["sentences"][0]["tokens"]
+    assert (first[1]["after"], first[2]["before"], first[-1]["after"]) == (" ", " ", "\n")
+    assert all(t["lemma"] == t["originalText"] == t["word"] for s in model["sentences"] for t in s["tokens"])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import importlib
+import logging
+import re
+import unicodedata
+
+from app.enrich.parse import ParseProvider
+from app.etypes import Model
+from app.unicode_ranges import CHINESE_CHARACTERS, CJK_RADICALS_SUPPLEMENT, KANGXI_RADICALS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORD_LENGTH = 10
+DEFAULT_POS = "NN"  # for words that are only in dictionaries without POS, and for unknown characters
+SENTENCE_ENDS = frozenset("。！？!?…；;")
+
+# the most likely Chinese Treebank tag for each ABC POS, the reverse of ZH_TB_POS_TO_ABC_POS with a choice
+# made where several tags map to the same ABC POS
+ABC_POS_TO_ZH_TB_POS = {
+    "adv.": "AD",
+    "a.m.": "AS",
+    "attr.": "JJ",
+    "conj.": "CC",
+    "intj.": "IJ",
+    "m.": "M",
+    "n.": "NN",
+    "num.": "CD",
+    "on.": "ON",
+    "pr.": "PN",
+    "s.v.": "VA",
+    "suf.": "ETC",
+    "v.": "VV",
+}
+
+TOKENS_RE = re.compile(
+    r"(?P<space>\s+)"
+    rf"|(?P<han>[{KANGXI_RADICALS}{CJK_RADICALS_SUPPLEMENT}{CHINESE_CHARACTERS}]+)"
+    r"|(?P<number>\d+(?:[.,]\d+)*)"
+    r"|(?P<latin>[^\W\d_]+)"
+    r"|(?P<other>.)"
+)
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+class MaxMatchParseProvider(ParseProvider):
+    """
+    In-process segmenter for zh-Hans, doing a forward maximum match of runs of Chinese characters against the
+    words of the configured dictionaries, for when going through CoreNLP is too slow. Words get the POS of their
+    first dictionary definition that has one, so they are only as good as that for best guesses.
+
+    Returns the same json as CoreNLP (with the `lemma` annotator) so it can be used wherever it is.
+
+    Config: {"dictionaries": [{"classname": <PersistenceProvider>, "config": <its config>}, ...],
+             "max_word_length": <int>}
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._max_word_length = config.get("max_word_length", DEFAULT_MAX_WORD_LENGTH)
+        self._words: dict[str, str] = {}  # word -> TB POS
+        for dictionary in config["dictionaries"]:
+            module_name, class_name = dictionary["classname"].rsplit(".", 1)
+            provider = getattr(importlib.import_module(module_name), class_name)(
+                {**dictionary["config"], "inmem": True}
+            )
+            for word, entries in provider.dico.items():
+                if self._words.get(word, DEFAULT_POS) == DEFAULT_POS:
+                    self._words[word] = self._entries_pos(entries)
+        logger.info("Loaded %s words for max-match segmentation", len(self._words))
+
+    @staticmethod
+    def _entries_pos(entries) -> str:
+        for entry in entries:
+            for definition in entry.get("definitions", []):
+                if isinstance(definition, list) and definition[1] in ABC_POS_TO_ZH_TB_POS:
+                    return ABC_POS_TO_ZH_TB_POS[definition[1]]
+        return DEFAULT_POS
+
+    def segment(self, chars: str) -> list[str]:
+        words = []
+        start = 0
+        while start < len(chars):
+            end = min(len(chars), start + self._max_word_length)
+            while end > start + 1 and chars[start:end] not in self._words:
+                end -= 1
+            words.append(chars[start:end])
+            start = end
+        return words
+
+    def _words_with_pos(self, text: str):
+        for match in TOKENS_RE.finditer(text):
+            kind, value = match.lastgroup, match.group()
+            if kind == "space":
+                yield value, None
+            elif kind == "han":
+                for word in self.segment(value):
+                    yield word, self._words.get(word, DEFAULT_POS)
+            elif kind == "number":
+                yield value, "CD"
+            elif kind == "latin":
+                yield value, "FW"
+            else:
+                yield value, "PU" if unicodedata.category(value)[0] in "PS" else DEFAULT_POS
+
+    # override ParseProvider
+    async def parse(
+        self,
+        text: str,
+        provider_parameters: str = None,
+        max_attempts: int = 5,
+        max_wait_between_attempts: int = 300,
+    ) -> Model:
+        sentences = []
+        tokens = []
+        token = None
+        offset = 0  # in UTF-16 code units, like CoreNLP
+        whitespace = ""
+        for word, pos in self._words_with_pos(text):
+            length = _utf16_len(word)
+            if pos is None:
+                if token:
+                    token["after"] = word
+                if tokens and "\n" in word:  # as with CoreNLP's ssplit.newlineIsSentenceBreak
+                    sentences.append(tokens)
+                    tokens = []
+                whitespace = word
+                offset += length
+                continue
+
+            token = {
+                "index": len(tokens) + 1,
+                "word": word,
+                "originalText": word,
+                "lemma": word,
+                "characterOffsetBegin": offset,
+                "characterOffsetEnd": offset + length,
+                "pos": pos,
+                "before": whitespace,
+                "after": "",
+            }
+            tokens.append(token)
+            whitespace = ""
+            offset += length
+            if word in SENTENCE_ENDS:
+                sentences.append(tokens)
+                tokens = []
+        if tokens:
+            sentences.append(tokens)
+
+        return {"sentences": [{"index": i, "tokens": sentence} for i, sentence in enumerate(sentences)]}
@@ -16,7 +16,6 @@ export async function installRxdb(dbConfig: DBParameters, progressCallback: (pro
   return await getDb(dbConfig, progressCallback, () => {}, true);
   // await unloadDatabaseFromMemory();
 }
-const BLOCK_SIZE = 10_485_760;
 const PAGE_SIZE = 32768;
 const FILE_ID = 0xdeadbeef;
 
@@ -40,9 +39,8 @@ export async function installDbFromParts(userData: UserState, progressCallback:
       isFinished: false,
       message: { phrase: "database.datafile", options: { datafile: partName } },
     });
-    const partNo = parseInt(partName.replace("tc.db.", "").replace(".part", ""));
     return {
-      partNo,
+      partName,
       ab,
     };
   };
@@ -50,8 +48,11 @@ export async function installDbFromParts(userData: UserState, progressCallback:
   const data = await fetchPlus(new URL("/api/v1/enrich/dbexports.json", userData.baseUrl), undefined, 3, false, "json");
   const onFinally: any[] = [];
   try {
-    const allBuffers = await asyncPoolAllBuffers(2, data, entryBlock);
-    allBuffers.sort((a, b) => a.partNo - b.partNo);
+    // the db is the concatenation of the parts in the order of the list. Parts are named by the hash of their
+    // content and have different sizes, so the same part can be in the list more than once but is only downloaded once
+    const partNames: string[] = data;
+    const allBuffers = await asyncPoolAllBuffers(2, [...new Set(partNames)], entryBlock);
+    const buffers = new Map(allBuffers.map(({ partName, ab }) => [partName, ab]));
 
     const vfs = new IDBBatchAtomicVFS(`/${TCDB_FILENAME}`);
     await vfs.isReady;
@@ -72,13 +73,15 @@ export async function installDbFromParts(userData: UserState, progressCallback:
     await vfs.xFileControl(FILE_ID, SQLite.SQLITE_FCNTL_BEGIN_ATOMIC_WRITE, ignored);
     await check(vfs.xTruncate(FILE_ID, 0));
 
-    for (const { partNo, ab } of allBuffers) {
+    let blockStart = 0;
+    for (const partName of partNames) {
+      const ab = buffers.get(partName)!;
       if (ab.byteLength % PAGE_SIZE !== 0) throw new Error("The little file is not a multiple of the page size");
-      const blockStart = partNo * BLOCK_SIZE;
-      console.log("Importing the buffer", partNo, ab.byteLength, blockStart);
+      console.log("Importing the buffer", partName, ab.byteLength, blockStart);
       for (let i = 0; i < ab.byteLength; i += PAGE_SIZE) {
         result += await vfs.xWrite(FILE_ID, new Uint8Array(ab.slice(i, i + PAGE_SIZE)), blockStart + i);
       }
+      blockStart += ab.byteLength;
     }
     await vfs.xFileControl(FILE_ID, SQLite.SQLITE_FCNTL_COMMIT_ATOMIC_WRITE, ignored);
     await vfs.xFileControl(FILE_ID, SQLite.SQLITE_FCNTL_SYNC, ignored);
@@ -18,7 +18,7 @@ export function getImportFileStorage(): Promise<IDBFileStorage> {
 export async function asyncPoolAllBuffers(
   poolLimit: number,
   array: string[],
-  iteratorFn: (generator: string) => Promise<{ partNo: number; ab: ArrayBuffer }>,
+  iteratorFn: (generator: string) => Promise<{ partName: string; ab: ArrayBuffer }>,
 ) {
   const results: any[] = [];
   for await (const result of asyncPool(poolLimit, array, iteratorFn)) {
@@ -11,7 +11,6 @@ import * as VFS from "wa-sqlite";
 
 export const DATA_SOURCE = "SQLITE_INSTALL_WORKER";
 
-const BLOCK_SIZE = 10_485_760;
 const FILE_ID = 0xdeadbeef;
 
 async function installDbFromParts(userData: UserState) {
@@ -29,6 +28,10 @@ async function installDbFromParts(userData: UserState) {
     VFS.SQLITE_OPEN_CREATE | VFS.SQLITE_OPEN_READWRITE | VFS.SQLITE_OPEN_MAIN_DB,
     new DataView(new ArrayBuffer(8)),
   );
+  // the db is the concatenation of the parts in the order of the list. Parts are named by the hash of their
+  // content and have different sizes, so the same part can be in the list more than once but is only downloaded once
+  const partNames: string[] = data;
+  const parts = new Map<string, Uint8Array>();
   const entryBlock = async (partName: string) => {
     progressCallback({
       source: DATA_SOURCE,
@@ -36,23 +39,26 @@ async function installDbFromParts(userData: UserState) {
       message: { phrase: "database.datafile", options: { datafile: partName } },
     });
 
-    const partNo = parseInt(partName.replace("tc.db.", "").replace(".part", ""));
-    return vfs.xWrite(
-      FILE_ID,
-      new Uint8Array(
-        await fetchPlus(
-          new URL(`/api/v1/enrich/dbexports/${partName}`, userData.baseUrl),
-          undefined,
-          3,
-          false,
-          "arrayBuffer",
-        ),
+    const part = new Uint8Array(
+      await fetchPlus(
+        new URL(`/api/v1/enrich/dbexports/${partName}`, userData.baseUrl),
+        undefined,
+        3,
+        false,
+        "arrayBuffer",
       ),
-      partNo * BLOCK_SIZE,
     );
+    parts.set(partName, part);
+    return part.byteLength;
   };
   try {
-    await asyncPoolAll(2, data, entryBlock);
+    await asyncPoolAll(2, [...new Set(partNames)], entryBlock);
+    let offset = 0;
+    for (const partName of partNames) {
+      const part = parts.get(partName)!;
+      vfs.xWrite(FILE_ID, part, offset);
+      offset += part.byteLength;
+    }
     vfs.xSync(FILE_ID, null);
     vfs.xClose(FILE_ID);
     await vfs.close();